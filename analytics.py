@@ -0,0 +1,191 @@
+import numpy as np
+import pandas as pd
+
+from ledger import EXIT_REASONS, TradeLedger
+
+
+def quarter_codes(dates) -> np.ndarray:
+    """Map dates to consecutive integer quarter codes (year * 4 + quarter index)."""
+    # Months since 1970 straight from datetime64, without building a DatetimeIndex
+    months = pd.DatetimeIndex(dates).to_numpy().astype('datetime64[M]').astype(np.int64)
+    return (1970 + months // 12) * 4 + (months % 12) // 3
+
+
+def _quarter_code(date) -> int:
+    period = pd.Period(date, freq='Q')
+    return period.year * 4 + period.quarter - 1
+
+
+def _quarter_index(first: int, n: int) -> pd.PeriodIndex:
+    """The PeriodIndex of n consecutive quarters starting at quarter code first."""
+    if n == 0:
+        return pd.PeriodIndex([], freq='Q')
+    return pd.period_range(start=pd.Period(year=first // 4, quarter=first % 4 + 1, freq='Q'),
+                           periods=n, freq='Q')
+
+
+def _group_sums(codes: np.ndarray, values: np.ndarray, n_groups: int):
+    """Per-group count and sum of the non-NaN values, plus the count of all rows, via bincount."""
+    finite = ~np.isnan(values)
+    rows = np.bincount(codes, minlength=n_groups)
+    counts = np.bincount(codes[finite], minlength=n_groups)
+    sums = np.bincount(codes[finite], weights=values[finite], minlength=n_groups)
+    return rows, counts, sums
+
+
+def quarterly_returns(trades, start=None, end=None, fill_value=-0.01) -> pd.Series:
+    """
+    Mean trade_return by exit quarter, as in the notebooks: only trades with
+    entry_date < exit_date count, and quarters in [start, end] without any trade get
+    fill_value. start/end default to the first/last exit quarter; trades exiting outside
+    the range are dropped. Pass fill_value=None to keep only the quarters with trades.
+    NaN returns are skipped in the mean, so a quarter whose trades all have NaN returns
+    gives NaN (as the notebooks' groupby mean does), not fill_value.
+
+    Parameters:
+        trades: A TradeLedger, a simulator trade DataFrame or a list of trade dicts.
+        start, end: Dates (or Periods) whose quarters bound the series, e.g. the first and
+            last accepted_date of the test period.
+
+    Returns:
+        A Series of quarterly returns indexed by quarter Period.
+    """
+    ledger = TradeLedger.from_frame(trades)
+    valid = ledger['entry_date'] < ledger['exit_date']
+    quarters = quarter_codes(ledger['exit_date'][valid])
+    returns = ledger['trade_return'][valid]
+
+    first = _quarter_code(start) if start is not None else (quarters.min() if len(quarters) else 0)
+    last = _quarter_code(end) if end is not None else (quarters.max() if len(quarters) else -1)
+    n_quarters = max(last - first + 1, 0)
+    in_range = (quarters >= first) & (quarters <= last)
+
+    rows, counts, sums = _group_sums(quarters[in_range] - first, returns[in_range], n_quarters)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = sums / counts
+    series = pd.Series(np.where(rows > 0, means, np.nan if fill_value is None else fill_value),
+                       index=_quarter_index(first, n_quarters), name='trade_return')
+    series.index.name = 'Quarter'
+    return series[rows > 0] if fill_value is None else series
+
+
+def annual_returns(quarterly: pd.Series) -> pd.Series:
+    """Compounded return of each calendar year of a quarterly return series."""
+    return (1 + quarterly).groupby(quarterly.index.year).prod() - 1
+
+
+def equity_curve(returns: pd.Series, initial: float = 1.0) -> pd.Series:
+    """Cumulative growth of `initial` over a periodic return series."""
+    return initial * (1 + returns).cumprod()
+
+
+def drawdown_series(equity: pd.Series) -> pd.Series:
+    """Relative distance of an equity curve below its running peak (0 at new highs)."""
+    peak = np.maximum.accumulate(equity.to_numpy(dtype=float))
+    return pd.Series((equity.to_numpy(dtype=float) - peak) / peak, index=equity.index, name='drawdown')
+
+
+def headline_metrics(quarterly_returns) -> dict:
+    """Annualized return, Sharpe ratio and maximum drawdown of a quarterly return series."""
+    quarterly_returns = np.asarray(quarterly_returns, dtype=float)
+    if len(quarterly_returns) == 0:
+        return {'annualized_return': np.nan, 'sharpe_ratio': np.nan, 'max_drawdown': np.nan}
+    cumulative = np.cumprod(1 + quarterly_returns)
+    peak = np.maximum.accumulate(cumulative)
+    std = quarterly_returns.std(ddof=1) if len(quarterly_returns) > 1 else np.nan
+    return {
+        'annualized_return': cumulative[-1] ** (4 / len(cumulative)) - 1,
+        'sharpe_ratio': quarterly_returns.mean() / std * np.sqrt(4),
+        'max_drawdown': ((cumulative - peak) / peak).min(),
+    }
+
+
+def performance_summary(trades, start=None, end=None, fill_value=-0.01) -> dict:
+    """
+    The notebooks' headline numbers for a trade ledger in one call: trade count, win rate,
+    mean trade return, number of quarters and the quarterly series' annualized return,
+    Sharpe ratio and maximum drawdown. start, end and fill_value as in quarterly_returns.
+    """
+    ledger = TradeLedger.from_frame(trades)
+    quarterly = quarterly_returns(ledger, start=start, end=end, fill_value=fill_value)
+    returns = ledger['trade_return']
+    finite = returns[~np.isnan(returns)]
+    return {
+        'n_trades': len(ledger),
+        'win_rate': (finite > 0).mean() if len(finite) else np.nan,
+        'mean_trade_return': finite.mean() if len(finite) else np.nan,
+        'n_quarters': len(quarterly),
+        **headline_metrics(quarterly),
+    }
+
+
+def _grouped_stats(codes: np.ndarray, ledger: TradeLedger, n_groups: int) -> dict:
+    """Count, share, mean/min/max return, win rate and mean holding period per group code."""
+    returns = ledger['trade_return']
+    rows, counts, sums = _group_sums(codes, returns, n_groups)
+    wins = np.bincount(codes, weights=returns > 0, minlength=n_groups)
+
+    # Unbuffered per-group min/max (fmin/fmax skip NaN); groups without values stay NaN
+    worst = np.full(n_groups, np.inf)
+    best = np.full(n_groups, -np.inf)
+    np.fmin.at(worst, codes, returns)
+    np.fmax.at(best, codes, returns)
+    worst[counts == 0] = np.nan
+    best[counts == 0] = np.nan
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        stats = {
+            'n_trades': rows,
+            'share': rows / max(len(codes), 1),
+            'mean_return': sums / counts,
+            'win_rate': wins / counts,
+            'best_return': best,
+            'worst_return': worst,
+        }
+        if 'hold_periods' in ledger.columns:
+            hold = ledger['hold_periods'].astype(float)
+            hold[hold < 0] = np.nan
+            _, hold_counts, hold_sums = _group_sums(codes, hold, n_groups)
+            stats['mean_hold_periods'] = hold_sums / hold_counts
+        if 'pnl' in ledger.columns:
+            _, _, pnl = _group_sums(codes, ledger['pnl'], n_groups)
+            stats['total_pnl'] = pnl
+    return stats
+
+
+def exit_reason_breakdown(trades) -> pd.DataFrame:
+    """
+    Per exit reason: number and share of trades, mean/best/worst trade return, win rate,
+    and the mean holding period and total pnl where the ledger has those columns.
+    Ledgers without exit reasons (the baseline simulator's) give an empty frame.
+    """
+    ledger = TradeLedger.from_frame(trades)
+    codes = ledger.exit_codes.astype(np.intp)
+    has_reason = codes >= 0
+    stats = _grouped_stats(codes[has_reason], ledger.take(has_reason), len(EXIT_REASONS))
+    breakdown = pd.DataFrame(stats, index=pd.Index(EXIT_REASONS, name='exit_reason'))
+    return breakdown[breakdown['n_trades'] > 0]
+
+
+def symbol_stats(trades) -> pd.DataFrame:
+    """
+    Per symbol: the exit_reason_breakdown statistics plus the compounded return of the
+    symbol's trades, sorted by symbol. One bincount pass per statistic, so it stays cheap
+    for ledgers with millions of trades.
+    """
+    ledger = TradeLedger.from_frame(trades)
+    codes = ledger.symbol_codes.astype(np.intp)
+    known = codes >= 0
+    subset = ledger.take(known)
+    codes = codes[known]
+    n_symbols = len(ledger.symbols)
+    stats = _grouped_stats(codes, subset, n_symbols)
+
+    returns = subset['trade_return']
+    finite = ~np.isnan(returns)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        log_growth = np.bincount(codes[finite], weights=np.log1p(returns[finite]), minlength=n_symbols)
+    stats['compounded_return'] = np.where(stats['n_trades'] > 0, np.expm1(log_growth), np.nan)
+
+    table = pd.DataFrame(stats, index=pd.Index(ledger.symbols, name='symbol_stock'))
+    return table[table['n_trades'] > 0].sort_index()
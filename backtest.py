@@ -1,14 +1,22 @@
+import heapq
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+
 import pandas as pd
 import numpy as np
 
-def simulate_trades_for_stock_baseline(stock_df, transaction_cost, slippage):
+from analytics import headline_metrics, quarter_codes
+from ledger import EXIT_REASONS, TradeLedger
+
+def simulate_trades_for_stock_baseline(stock_df, transaction_cost, slippage, ledger=None):
     """
     Baseline simulation:
       - Buy on signal 1 when no position is open.
       - Sell when signal turns 0.
       - Close any open trade at the end.
+    Trades are appended to ledger (a TradeLedger) if given, else to a new list of dicts.
     """
-    trades = []
+    trades = [] if ledger is None else ledger
     open_trade = None
     
     for i, row in stock_df.iterrows():
@@ -48,14 +56,15 @@ def simulate_trades_for_stock_baseline(stock_df, transaction_cost, slippage):
 
 def simulate_trades_for_stock_enhanced(stock_df, transaction_cost, slippage,
                                        stop_loss=-0.05, take_profit=0.10, max_hold_periods=4,
-                                       risk_per_trade=1000, account_balance=100000):
+                                       risk_per_trade=1000, account_balance=100000, ledger=None):
     """
     Enhanced simulation with risk management:
       - Buys on signal 1 and holds if signals remain positive.
       - Exits on stop-loss, take-profit, fundamentals deterioration, maximum holding period, or when the signal turns negative.
       - Position sizing is based on fixed risk per trade.
+    Trades are appended to ledger (a TradeLedger) if given, else to a new list of dicts.
     """
-    trades = []
+    trades = [] if ledger is None else ledger
     open_trade = None
     hold_periods = 0
     
@@ -191,3 +200,422 @@ def simulate_trades_for_stock_enhanced(stock_df, transaction_cost, slippage,
         })
 
     return trades
+
+
+def _panel_arrays(panel):
+    """
+    Sort the signal panel by (symbol_stock, accepted_date) and expose the columns
+    the simulators need as NumPy arrays.
+    """
+    panel = panel.sort_values(['symbol_stock', 'accepted_date'], kind='mergesort')
+    symbols = panel['symbol_stock'].to_numpy()
+    n = len(panel)
+
+    # Symbols are contiguous after the sort, so a block starts wherever the symbol changes
+    new_block = np.ones(n, dtype=bool)
+    new_block[1:] = symbols[1:] != symbols[:-1]
+    starts = np.flatnonzero(new_block)
+    ends = np.append(starts[1:], n)[:len(starts)] - 1
+    lengths = ends - starts + 1
+
+    return {
+        'n': n,
+        'symbol': symbols,
+        'date': panel['accepted_date'].to_numpy(),
+        'price': panel['Adj Close'].to_numpy(dtype=float),
+        'signal': panel['predicted_signal'].to_numpy(dtype=float),
+        'roe': panel['ROE'].to_numpy(dtype=float) if 'ROE' in panel.columns else None,
+        'is_start': new_block,
+        'sym_end': np.repeat(ends, lengths),
+        'max_len': int(lengths.max()) if n else 0,
+    }
+
+
+def simulate_trades_panel_baseline(panel, transaction_cost, slippage, as_ledger=False):
+    """
+    Vectorized equivalent of simulate_trades_for_stock_baseline over a whole panel.
+      - Rows are split into segments that end on a signal-0 row or at the end of a symbol.
+      - Each segment containing a signal 1 produces one trade from its first signal-1 row to its last row.
+    Returns the trade ledger as a DataFrame (a TradeLedger with as_ledger=True), ordered by
+    symbol and entry date.
+    """
+    arr = _panel_arrays(panel)
+    n = arr['n']
+    signal = arr['signal']
+    is_zero = signal == 0
+
+    # A new segment begins at every symbol start and on the row after a signal 0
+    seg_start = arr['is_start'].copy()
+    seg_start[1:] |= is_zero[:-1]
+    seg_id = np.cumsum(seg_start) - 1
+    seg_first = np.flatnonzero(seg_start)
+    seg_last = np.r_[seg_first[1:], n] - 1
+
+    ones = np.flatnonzero(signal == 1)
+    seg_of_one, first_pos = np.unique(seg_id[ones], return_index=True)
+    entry = ones[first_pos]
+    exit_ = seg_last[seg_of_one]
+
+    raw_return = arr['price'][exit_] / arr['price'][entry] - 1
+    ledger = TradeLedger.from_arrays(arr['symbol'][exit_], arr['date'][entry], arr['date'][exit_],
+                                     raw_return - 2 * (transaction_cost + slippage))
+    return ledger if as_ledger else ledger.to_frame()
+
+
+def _forward_paths(arr, candidates, window):
+    """
+    Build the (len(candidates), window) matrices of what happens k = 1..window rows
+    after each candidate entry: return since entry, signal, ROE-deterioration flag
+    and whether the row still belongs to the entry's symbol.
+    """
+    steps = np.arange(1, window + 1)
+    rows = candidates[:, None] + steps
+    in_symbol = rows <= arr['sym_end'][candidates][:, None]
+    rows = np.minimum(rows, arr['n'] - 1)
+
+    entry_price = arr['price'][candidates][:, None]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns = arr['price'][rows] / entry_price - 1
+    signal = arr['signal'][rows]
+    if arr['roe'] is None:
+        roe_drop = np.zeros(rows.shape, dtype=bool)
+    else:
+        with np.errstate(invalid='ignore'):
+            roe_drop = arr['roe'][rows] < 0.8 * arr['roe'][candidates][:, None]
+    return {'returns': returns, 'signal': signal, 'roe_drop': roe_drop,
+            'in_symbol': in_symbol, 'steps': steps}
+
+
+def _first_exits(arr, candidates, paths, stop_loss, take_profit, max_hold_periods):
+    """
+    Return the exit row and exit-reason code for every candidate entry, applying the
+    enhanced rules in the same priority order as simulate_trades_for_stock_enhanced.
+    """
+    with np.errstate(invalid='ignore'):
+        sltp = (paths['returns'] <= stop_loss) | (paths['returns'] >= take_profit)
+    fundamentals = (paths['signal'] == 1) & paths['roe_drop']
+    # hold_periods on the k-th row after entry is k + 1
+    max_hold = np.broadcast_to(paths['steps'] + 1 >= max_hold_periods, sltp.shape)
+    signal_change = paths['signal'] == 0
+
+    reasons = np.select([sltp, fundamentals, max_hold, signal_change], [0, 1, 2, 3], default=4)
+    exits_now = (reasons < 4) & paths['in_symbol']
+    has_exit = exits_now.any(axis=1)
+    # An empty window (no symbol has a second row) has no early exit: all trades run to end_of_data
+    first = exits_now.argmax(axis=1) if exits_now.shape[1] else np.zeros(len(candidates), dtype=int)
+
+    exit_rows = np.where(has_exit, candidates + first + 1, arr['sym_end'][candidates])
+    exit_codes = np.full(len(candidates), 4)
+    exit_codes[has_exit] = reasons[has_exit, first[has_exit]]
+    return exit_rows, exit_codes
+
+
+def _chain_trades(candidates, exit_rows):
+    """
+    Walk the candidate entries in order: after a trade exits, the next trade opens on
+    the first signal-1 row after the exit row. Returns positions into `candidates`.
+    """
+    next_pos = np.searchsorted(candidates, exit_rows, side='right').tolist()
+    taken = []
+    pos = 0
+    while pos < len(next_pos):
+        taken.append(pos)
+        pos = next_pos[pos]
+    return np.asarray(taken, dtype=int)
+
+
+def simulate_trades_panel_enhanced(panel, transaction_cost, slippage,
+                                   stop_loss=-0.05, take_profit=0.10, max_hold_periods=4,
+                                   risk_per_trade=1000, account_balance=100000,
+                                   chunk_size=65536, as_ledger=False):
+    """
+    Vectorized equivalent of simulate_trades_for_stock_enhanced over a whole panel.
+      - Exit rows are computed for every signal-1 row at once from forward return paths,
+        bounded by the maximum holding period and the symbol's last row.
+      - Trades are then chained entry -> exit -> next signal 1, which only loops over trades.
+    Returns the trade ledger as a DataFrame (a TradeLedger with as_ledger=True), ordered by
+    symbol and entry date.
+    """
+    arr = _panel_arrays(panel)
+    candidates = np.flatnonzero(arr['signal'] == 1)
+    window = max(min(max(max_hold_periods - 1, 1), arr['max_len'] - 1), 0)
+
+    exit_rows = np.empty(len(candidates), dtype=int)
+    exit_codes = np.empty(len(candidates), dtype=int)
+    for lo in range(0, len(candidates), chunk_size):
+        chunk = candidates[lo:lo + chunk_size]
+        paths = _forward_paths(arr, chunk, window)
+        exit_rows[lo:lo + chunk_size], exit_codes[lo:lo + chunk_size] = _first_exits(
+            arr, chunk, paths, stop_loss, take_profit, max_hold_periods)
+
+    taken = _chain_trades(candidates, exit_rows)
+    ledger = _build_enhanced_ledger(arr, candidates[taken], exit_rows[taken], exit_codes[taken],
+                                    transaction_cost, slippage, stop_loss, risk_per_trade)
+    return ledger if as_ledger else ledger.to_frame()
+
+
+def _build_enhanced_ledger(arr, entry, exit_, codes, transaction_cost, slippage,
+                           stop_loss, risk_per_trade):
+    """Assemble the enhanced trade ledger from entry rows, exit rows and exit-reason codes."""
+    entry_price = arr['price'][entry]
+    raw_return = arr['price'][exit_] / entry_price - 1
+    risk_per_share = entry_price * abs(stop_loss)
+    position_size = np.divide(risk_per_trade, risk_per_share,
+                              out=np.zeros(len(entry)), where=risk_per_share != 0)
+    return TradeLedger.from_arrays(arr['symbol'][entry], arr['date'][entry], arr['date'][exit_],
+                                   raw_return - 2 * (transaction_cost + slippage),
+                                   position_size=position_size, hold_periods=exit_ - entry + 1,
+                                   exit_reason=codes)
+
+
+SWEEP_DEFAULTS = {
+    'stop_loss': [-0.05],
+    'take_profit': [0.10],
+    'max_hold_periods': [4],
+    'transaction_cost': [0.005],
+    'slippage': [0.002],
+}
+
+_SWEEP_STATE = {}
+
+
+def _init_sweep_worker(arr, candidates, window, chunk_size, costs):
+    """Share the panel arrays with a sweep worker once instead of once per task."""
+    _SWEEP_STATE.update(arr=arr, candidates=candidates, window=window, chunk_size=chunk_size,
+                        costs=costs)
+
+
+def _sweep_exit_params(exit_params):
+    """
+    Evaluate a batch of (stop_loss, take_profit, max_hold_periods) combinations against
+    the shared panel. Forward paths are built once per chunk and reused by every
+    combination; each combination is then scored for every cost setting.
+    """
+    arr = _SWEEP_STATE['arr']
+    candidates = _SWEEP_STATE['candidates']
+    chunk_size = _SWEEP_STATE['chunk_size']
+    window = _SWEEP_STATE['window']
+
+    exits = [(np.empty(len(candidates), dtype=int), np.empty(len(candidates), dtype=int))
+             for _ in exit_params]
+    for lo in range(0, len(candidates), chunk_size):
+        chunk = candidates[lo:lo + chunk_size]
+        paths = _forward_paths(arr, chunk, window)
+        for (exit_rows, exit_codes), (stop_loss, take_profit, max_hold_periods) in zip(exits, exit_params):
+            exit_rows[lo:lo + chunk_size], exit_codes[lo:lo + chunk_size] = _first_exits(
+                arr, chunk, paths, stop_loss, take_profit, max_hold_periods)
+
+    quarters = quarter_codes(arr['date'])
+    first_quarter = quarters.min() if len(quarters) else 0
+    n_quarters = quarters.max() - first_quarter + 1 if len(quarters) else 0
+
+    results = []
+    for (exit_rows, exit_codes), params in zip(exits, exit_params):
+        taken = _chain_trades(candidates, exit_rows)
+        entry, exit_, codes = candidates[taken], exit_rows[taken], exit_codes[taken]
+        raw_return = arr['price'][exit_] / arr['price'][entry] - 1
+        reason_mix = np.bincount(codes, minlength=len(EXIT_REASONS)) / max(len(codes), 1)
+
+        # Same quarterly aggregation as the notebooks: trades held at least one period,
+        # averaged by exit quarter, quarters without trades filled with -1%
+        valid = arr['date'][entry] < arr['date'][exit_]
+        quarter_idx = quarters[exit_[valid]] - first_quarter
+        counts = np.bincount(quarter_idx, minlength=n_quarters)
+        sums = np.bincount(quarter_idx, weights=raw_return[valid], minlength=n_quarters)
+        traded = counts > 0
+        mean_raw = np.divide(sums, counts, out=np.zeros(n_quarters), where=traded)
+
+        for transaction_cost, slippage in _SWEEP_STATE['costs']:
+            quarterly = np.where(traded, mean_raw - 2 * (transaction_cost + slippage), -0.01)
+            metrics = headline_metrics(quarterly)
+            results.append({
+                'stop_loss': params[0],
+                'take_profit': params[1],
+                'max_hold_periods': params[2],
+                'transaction_cost': transaction_cost,
+                'slippage': slippage,
+                'n_trades': len(codes),
+                **metrics,
+                **{f'exit_{reason}': share for reason, share in zip(EXIT_REASONS, reason_mix)},
+            })
+    return results
+
+
+def sweep_enhanced_parameters(panel, param_grid, n_jobs=1, chunk_size=65536):
+    """
+    Evaluate every combination of an enhanced-simulation parameter grid in one batched pass.
+
+    Parameters:
+        panel: Signal panel with symbol_stock, accepted_date, Adj Close, predicted_signal (and ROE).
+        param_grid: Dict mapping any of stop_loss, take_profit, max_hold_periods,
+            transaction_cost and slippage to a list of values. Missing keys use SWEEP_DEFAULTS.
+        n_jobs: Number of worker processes; exit-rule combinations are split between them.
+        chunk_size: Number of candidate entries whose forward paths are held in memory at once.
+
+    Returns:
+        A DataFrame with one row per combination: the parameters, trade count, annualized
+        return, Sharpe ratio, maximum drawdown and the share of each exit reason.
+    """
+    unknown = set(param_grid) - set(SWEEP_DEFAULTS)
+    if unknown:
+        raise ValueError(f"Unknown sweep parameters: {sorted(unknown)}")
+    grid = {**SWEEP_DEFAULTS, **param_grid}
+
+    exit_params = list(itertools.product(grid['stop_loss'], grid['take_profit'], grid['max_hold_periods']))
+    costs = list(itertools.product(grid['transaction_cost'], grid['slippage']))
+
+    arr = _panel_arrays(panel)
+    candidates = np.flatnonzero(arr['signal'] == 1)
+    longest_hold = max(max(mh - 1, 1) for mh in grid['max_hold_periods'])
+    window = max(min(longest_hold, arr['max_len'] - 1), 0)
+    init_args = (arr, candidates, window, chunk_size, costs)
+
+    if n_jobs == 1:
+        _init_sweep_worker(*init_args)
+        results = _sweep_exit_params(exit_params)
+    else:
+        batches = [exit_params[i::n_jobs] for i in range(n_jobs) if exit_params[i::n_jobs]]
+        with ProcessPoolExecutor(max_workers=len(batches), initializer=_init_sweep_worker,
+                                 initargs=init_args) as pool:
+            results = [row for batch in pool.map(_sweep_exit_params, batches) for row in batch]
+
+    return pd.DataFrame(results).sort_values(
+        ['stop_loss', 'take_profit', 'max_hold_periods', 'transaction_cost', 'slippage']
+    ).reset_index(drop=True)
+
+
+def _exit_code(return_, signal, roe, entry_roe, hold_periods, stop_loss, take_profit, max_hold_periods):
+    """The enhanced simulator's exit rules for one held row, as an EXIT_REASONS code (None to keep holding)."""
+    if return_ <= stop_loss or return_ >= take_profit:
+        return 0
+    if signal == 1 and roe is not None and entry_roe is not None and roe < 0.8 * entry_roe:
+        return 1
+    if hold_periods >= max_hold_periods:
+        return 2
+    if signal == 0:
+        return 3
+    return None
+
+
+def simulate_portfolio(panel, transaction_cost, slippage,
+                       stop_loss=-0.05, take_profit=0.10, max_hold_periods=4,
+                       risk_per_trade=1000, account_balance=100000,
+                       max_open_positions=20, equity_freq='Q', as_ledger=False):
+    """
+    Event-driven portfolio simulation of the enhanced strategy with one shared cash balance.
+      - Every symbol's rows are merged into a single date-ordered event stream with a heap
+        keyed on each symbol's next date, so the cost is O(events log symbols).
+      - On each date, open positions are marked to market and checked against the enhanced
+        exit rules first; the freed cash is then available to that date's signal-1 entries.
+        A symbol with several rows on one date has them handled one after another in panel
+        order, as the per-stock simulator does.
+      - Positions are sized with the risk-per-trade rule of simulate_trades_for_stock_enhanced
+        (risk_per_trade / (entry price * |stop_loss|) shares). An entry is skipped when
+        max_open_positions are already held or the position costs more than the cash left.
+      - Entry and exit costs are charged on the position's entry value, matching trade_return.
+
+    With unlimited capital and positions the trade ledger equals the per-stock enhanced simulator's.
+
+    Returns:
+        A tuple of:
+          - The trade ledger ordered by exit, with the enhanced columns plus entry_value and pnl
+            (a TradeLedger with as_ledger=True).
+          - The equity curve: equity, cash, open_positions and cumulative entries_skipped at the
+            last event date of each equity_freq period ('D' for daily, 'Q' for quarterly).
+    """
+    arr = _panel_arrays(panel)
+    symbols, prices, signals = arr['symbol'], arr['price'].tolist(), arr['signal'].tolist()
+    roes = arr['roe'].tolist() if arr['roe'] is not None else None
+    sym_end = arr['sym_end'].tolist()
+    dates = pd.to_datetime(arr['date'])
+    date_keys = dates.asi8.tolist()
+    costs = 2 * (transaction_cost + slippage)
+
+    events = [(date_keys[row], row) for row in np.flatnonzero(arr['is_start']).tolist()]
+    heapq.heapify(events)
+
+    cash, market_value, skipped = float(account_balance), 0.0, 0
+    positions = {}
+    trades, curve = [], []
+
+    def close(row, position, code):
+        nonlocal cash, market_value
+        net_return = prices[row] / position['entry_price'] - 1 - costs
+        pnl = position['entry_value'] * net_return
+        cash += position['entry_value'] + pnl
+        market_value -= position['shares'] * position['last_price']
+        trades.append((position['entry_row'], row, net_return, position['shares'],
+                       position['hold_periods'], code, position['entry_value'], pnl))
+
+    while events:
+        date_key = events[0][0]
+        batch = []
+        while events and events[0][0] == date_key:
+            _, row = heapq.heappop(events)
+            batch.append(row)
+            if row < sym_end[row]:
+                heapq.heappush(events, (date_keys[row + 1], row + 1))
+
+        # A symbol's same-date rows are taken one per round, in panel order, so each of them
+        # sees the position left by the previous one as in the per-stock simulator
+        rounds, seen = [], {}
+        for row in batch:
+            k = seen[symbols[row]] = seen.get(symbols[row], -1) + 1
+            if k == len(rounds):
+                rounds.append([])
+            rounds[k].append(row)
+
+        for rows in rounds:
+            # Exits (and marking to market) before entries, so freed cash can be redeployed
+            exited = set()
+            for row in rows:
+                symbol = symbols[row]
+                position = positions.get(symbol)
+                if position is None:
+                    continue
+                market_value += position['shares'] * (prices[row] - position['last_price'])
+                position['last_price'] = prices[row]
+                position['hold_periods'] += 1
+                code = _exit_code(prices[row] / position['entry_price'] - 1, signals[row],
+                                  roes[row] if roes is not None else None, position['entry_roe'],
+                                  position['hold_periods'], stop_loss, take_profit, max_hold_periods)
+                if code is None and row == sym_end[row]:
+                    code = 4
+                if code is not None:
+                    close(row, positions.pop(symbol), code)
+                    exited.add(symbol)
+
+            for row in rows:
+                symbol = symbols[row]
+                if signals[row] != 1 or symbol in positions or symbol in exited:
+                    continue
+                risk_per_share = prices[row] * abs(stop_loss)
+                shares = risk_per_trade / risk_per_share if risk_per_share else 0
+                entry_value = shares * prices[row]
+                if len(positions) >= max_open_positions or not entry_value <= cash:
+                    skipped += 1
+                    continue
+                cash -= entry_value
+                market_value += entry_value
+                position = {'entry_row': row, 'entry_price': prices[row], 'shares': shares,
+                            'entry_value': entry_value, 'last_price': prices[row], 'hold_periods': 1,
+                            'entry_roe': roes[row] if roes is not None else None}
+                if row == sym_end[row]:
+                    close(row, position, 4)
+                else:
+                    positions[symbol] = position
+
+        curve.append((date_key, cash + market_value, cash, len(positions), skipped))
+
+    entry, exit_, net_return, shares, hold, codes, entry_value, pnl = (
+        np.array(col) for col in zip(*trades)) if trades else [np.array([], dtype=int)] * 8
+    ledger = TradeLedger.from_arrays(symbols[entry], arr['date'][entry], arr['date'][exit_],
+                                     net_return.astype(float), position_size=shares.astype(float),
+                                     hold_periods=hold.astype(int), exit_reason=codes.astype(int),
+                                     entry_value=entry_value.astype(float), pnl=pnl.astype(float))
+
+    curve = pd.DataFrame(curve, columns=['date', 'equity', 'cash', 'open_positions', 'entries_skipped'])
+    curve['date'] = pd.to_datetime(curve['date'])
+    equity_df = curve.groupby(curve['date'].dt.to_period(equity_freq)).last()
+    equity_df.index.name = 'period'
+    return (ledger if as_ledger else ledger.to_frame()), equity_df
@@ -0,0 +1,265 @@
+import argparse
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import pandas as pd
+import numpy as np
+
+from backtest import (
+    simulate_trades_for_stock_baseline,
+    simulate_trades_for_stock_enhanced,
+    simulate_trades_panel_baseline,
+    simulate_trades_panel_enhanced
+)
+from src.main import preprocess
+from src.online import OnlineFeatureStore
+from src.preprocessing import (
+    winsorize_columns,
+    feature_column_names,
+    load_financial_data,
+    load_sp500_data,
+    LAG_FEATURES
+)
+from src.profiling import StageProfiler
+from src.synthetic import generate_synthetic_data
+
+# Scale tiers as synthetic universe sizes, all over the same 100-quarter calendar.
+SCALE_TIERS = {
+    '1x': {'n_symbols': 50, 'n_quarters': 100},
+    '10x': {'n_symbols': 500, 'n_quarters': 100},
+    '100x': {'n_symbols': 5000, 'n_quarters': 100},
+}
+
+TRANSACTION_COST = 0.001
+SLIPPAGE = 0.002
+
+
+def _timings(func, repeats):
+    """Wall times of `repeats` calls to func(); the last call's return value is kept."""
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        value = func()
+        times.append(time.perf_counter() - start)
+    return times, value
+
+
+def _result(tier, benchmark, times):
+    return {
+        'tier': tier,
+        'benchmark': benchmark,
+        'n_symbols': SCALE_TIERS[tier]['n_symbols'],
+        'n_quarters': SCALE_TIERS[tier]['n_quarters'],
+        'repeats': len(times),
+        'best_s': min(times),
+        'median_s': float(np.median(times)),
+    }
+
+
+def _backtest_panel(final_df, seed):
+    """The backtest input the notebooks build: one row per filing with a 0/1 predicted signal."""
+    rng = np.random.default_rng(seed)
+    panel = final_df[['symbol_stock', 'accepted_date', 'Adj Close', 'ROE']].copy()
+    panel['predicted_signal'] = rng.binomial(1, 0.3, len(panel))
+    return panel.sort_values(['symbol_stock', 'accepted_date'])
+
+
+def _per_stock(simulate, panel):
+    """Run a per-stock simulator over every symbol, as the notebooks do."""
+    trades = []
+    for _, group in panel.groupby('symbol_stock'):
+        trades.extend(simulate(group, TRANSACTION_COST, SLIPPAGE))
+    return trades
+
+
+def _online_filings(data_dir, holdout=0.1):
+    """
+    An OnlineFeatureStore seeded with the earliest filings in data_dir, and the latest
+    `holdout` share of filings (in date order, as records) to feed it one at a time.
+    """
+    financial_df = load_financial_data(os.path.join(data_dir, 'merged_fullstock_data.csv'))
+    sp_df = load_sp500_data(os.path.join(data_dir, 'sp.csv'))
+    dates = pd.to_datetime(financial_df['acceptedDate'])
+    financial_df = financial_df.iloc[np.argsort(dates.to_numpy(), kind='mergesort')].reset_index(drop=True)
+    split = int(len(financial_df) * (1 - holdout))
+    store = OnlineFeatureStore.from_history(financial_df.iloc[:split], sp_df)
+    new = financial_df.iloc[split:].astype(object)
+    return store, new.where(new.notna(), None).to_dict(orient='records')
+
+
+def benchmark_online(tier, data_dir):
+    """Per-filing latency of OnlineFeatureStore.update, with p99 latency and throughput."""
+    store, filings = _online_filings(data_dir)
+    latencies = []
+    for filing in filings:
+        start = time.perf_counter()
+        store.update(filing)
+        latencies.append(time.perf_counter() - start)
+    result = _result(tier, 'online_update', latencies)
+    result['p99_s'] = float(np.percentile(latencies, 99))
+    result['throughput_per_s'] = len(latencies) / sum(latencies)
+    return result
+
+
+def benchmark_tier(tier, data_dir, repeats=3, seed=0):
+    """
+    Time preprocess(), each of its stages, winsorize_columns, the backtest simulators and
+    online feature updates on the synthetic data in data_dir. Returns one result dict per
+    benchmark; online_update's repeats are the individual filings.
+    """
+    results = []
+    times, final_df = _timings(lambda: preprocess(cache_dir=None, data_dir=data_dir), repeats)
+    results.append(_result(tier, 'preprocess', times))
+
+    stage_times = {}
+    for _ in range(repeats):
+        profiler = StageProfiler(track_memory=False)
+        preprocess(cache_dir=None, data_dir=data_dir, profiler=profiler)
+        for record in profiler.records:
+            stage_times.setdefault(record['stage'], []).append(record['wall_time_s'])
+    for stage, times in stage_times.items():
+        results.append(_result(tier, f'stage:{stage}', times))
+
+    columns = LAG_FEATURES + feature_column_names()
+    times, _ = _timings(lambda: winsorize_columns(final_df, columns), repeats)
+    results.append(_result(tier, 'winsorize_columns', times))
+
+    panel = _backtest_panel(final_df, seed)
+    simulators = {
+        'simulate_trades_for_stock_baseline': lambda: _per_stock(simulate_trades_for_stock_baseline, panel),
+        'simulate_trades_for_stock_enhanced': lambda: _per_stock(simulate_trades_for_stock_enhanced, panel),
+        'simulate_trades_panel_baseline': lambda: simulate_trades_panel_baseline(panel, TRANSACTION_COST, SLIPPAGE),
+        'simulate_trades_panel_enhanced': lambda: simulate_trades_panel_enhanced(panel, TRANSACTION_COST, SLIPPAGE),
+    }
+    for name, run in simulators.items():
+        times, _ = _timings(run, repeats)
+        results.append(_result(tier, name, times))
+
+    results.append(benchmark_online(tier, data_dir))
+    return results
+
+
+def run_benchmarks(tiers=('1x',), repeats=3, work_dir=None, seed=0) -> pd.DataFrame:
+    """
+    Generate the synthetic inputs for each tier (reused if work_dir already holds them)
+    and run benchmark_tier on them.
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for tier in tiers:
+            data_dir = os.path.join(work_dir or tmp_dir, f'{tier}_seed{seed}')
+            if not os.path.exists(os.path.join(data_dir, 'adjclose_stock.csv')):
+                generate_synthetic_data(data_dir, seed=seed, **SCALE_TIERS[tier])
+            results.extend(benchmark_tier(tier, data_dir, repeats=repeats, seed=seed))
+    return pd.DataFrame(results)
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment() -> dict:
+    """The fingerprint of this machine and environment that timings are only comparable within."""
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'machine': platform.node(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def append_history(results: pd.DataFrame, history_path: str):
+    """Append one run (results plus commit and environment) as a JSON line to history_path."""
+    run = {
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'commit': _git_commit(),
+        **environment(),
+        'results': results.to_dict(orient='records'),
+    }
+    with open(history_path, 'a') as f:
+        f.write(json.dumps(run) + '\n')
+
+
+def load_history(history_path: str) -> pd.DataFrame:
+    """
+    Every recorded result, one row per run and benchmark, oldest first, with the run's
+    environment() fields (None where an older run did not record one).
+    """
+    columns = ['timestamp', 'commit', *environment(), 'tier', 'benchmark', 'median_s']
+    if not os.path.exists(history_path):
+        return pd.DataFrame(columns=columns)
+    rows = []
+    with open(history_path) as f:
+        for line in f:
+            if line.strip():
+                run = json.loads(line)
+                fields = {key: run.get(key) for key in ['timestamp', 'commit', *environment()]}
+                rows.extend({**fields, **result} for result in run['results'])
+    return pd.DataFrame(rows, columns=None if rows else columns)
+
+
+def compare_to_history(results: pd.DataFrame, history: pd.DataFrame, tolerance=0.25, window=5,
+                       fingerprint: dict = None) -> pd.DataFrame:
+    """
+    Compare each benchmark's median time with the median of its last `window` recorded runs.
+
+    Only runs recorded with the same fingerprint (by default this machine's environment())
+    count, so timings from other machines or library versions never form the baseline.
+    A benchmark regresses when it is more than `tolerance` (as a fraction) slower than
+    that baseline; benchmarks without such history get a NaN baseline and never regress.
+    """
+    fingerprint = environment() if fingerprint is None else fingerprint
+    same = np.ones(len(history), dtype=bool)
+    for key, value in fingerprint.items():
+        same &= (history[key] == value).to_numpy() if key in history.columns else False
+    recent = history[same].groupby(['tier', 'benchmark']).tail(window)
+    baseline = recent.groupby(['tier', 'benchmark'])['median_s'].median().rename('baseline_s')
+    comparison = results[['tier', 'benchmark', 'median_s']].merge(
+        baseline.reset_index(), on=['tier', 'benchmark'], how='left')
+    comparison['ratio'] = comparison['median_s'] / comparison['baseline_s']
+    comparison['regression'] = comparison['ratio'] > 1 + tolerance
+    return comparison
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark preprocessing and backtesting on synthetic data.")
+    parser.add_argument('--tiers', nargs='+', default=['1x'], choices=list(SCALE_TIERS))
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--work-dir', default=None, help="Keep the generated data here between runs.")
+    parser.add_argument('--history', default='benchmark_history.jsonl')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    parser.add_argument('--window', type=int, default=5)
+    parser.add_argument('--no-record', action='store_true', help="Compare without appending to the history.")
+    args = parser.parse_args(argv)
+    logging.getLogger().setLevel(logging.WARNING)
+
+    results = run_benchmarks(args.tiers, repeats=args.repeats, work_dir=args.work_dir, seed=args.seed)
+    comparison = compare_to_history(results, load_history(args.history),
+                                    tolerance=args.tolerance, window=args.window)
+    print(comparison.to_string(index=False, float_format=lambda x: f"{x:.4f}"))
+    if not args.no_record:
+        append_history(results, args.history)
+
+    regressions = comparison[comparison['regression']]
+    if not regressions.empty:
+        print(f"\n{len(regressions)} benchmark(s) regressed by more than {args.tolerance:.0%}:")
+        print(regressions.to_string(index=False, float_format=lambda x: f"{x:.4f}"))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,327 @@
+import hashlib
+import json
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+import numpy as np
+from sklearn.feature_selection import mutual_info_classif
+from sklearn.metrics import check_scoring
+
+METHODS = ('shap', 'permutation', 'mutual_info')
+
+_IMPORTANCE_STATE = {}
+
+
+def model_fingerprint(model) -> str:
+    """Hash of a fitted model's pickled state: any refit or parameter change gives a new fingerprint."""
+    return hashlib.sha256(pickle.dumps(model, protocol=4)).hexdigest()
+
+
+def data_hash(X, y=None) -> str:
+    """Hash of a feature matrix (values and column names) and, if given, its labels."""
+    digest = hashlib.sha256(json.dumps(list(map(str, getattr(X, 'columns', [])))).encode())
+    digest.update(np.ascontiguousarray(np.asarray(X, dtype=float)).tobytes())
+    if y is not None:
+        # hash_array takes any label dtype (strings included), not only numeric labels
+        digest.update(pd.util.hash_array(np.asarray(y)).tobytes())
+    return digest.hexdigest()
+
+
+def stratified_sample(y, size, seed=None) -> np.ndarray:
+    """
+    Sorted positions of about `size` rows drawn without replacement, with every class of y
+    represented in proportion to its frequency (largest-remainder rounding).
+    Returns every row if size is None or not smaller than len(y).
+    """
+    y = np.asarray(y)
+    if size is None or size >= len(y):
+        return np.arange(len(y))
+    rng = np.random.default_rng(seed)
+    classes, codes, counts = np.unique(y, return_inverse=True, return_counts=True)
+    quota = counts * size / len(y)
+    take = np.floor(quota).astype(int)
+    take[np.argsort(take - quota, kind='mergesort')[:size - take.sum()]] += 1
+    rows = [rng.choice(np.flatnonzero(codes == k), size=n, replace=False) for k, n in enumerate(take)]
+    return np.sort(np.concatenate(rows))
+
+
+def _random_sample(n_rows, size, seed=None) -> np.ndarray:
+    """Sorted positions of `size` rows drawn uniformly without replacement (all rows if size is None)."""
+    if size is None or size >= n_rows:
+        return np.arange(n_rows)
+    return np.sort(np.random.default_rng(seed).choice(n_rows, size=size, replace=False))
+
+
+def _feature_names(X) -> list:
+    return [str(col) for col in X.columns] if isinstance(X, pd.DataFrame) else [f'x{j}' for j in range(X.shape[1])]
+
+
+def _model_input(model, values: np.ndarray, features: list):
+    """values as the model expects them: a DataFrame if it was fitted with feature names, else the array."""
+    if hasattr(model, 'feature_names_in_'):
+        return pd.DataFrame(values, columns=features)
+    return values
+
+
+def _importance_frame(features: list, importance, std, **extra) -> pd.DataFrame:
+    table = pd.DataFrame({'Feature': features, 'importance': importance, 'std': std, **extra})
+    return table.sort_values('importance', ascending=False, kind='mergesort').reset_index(drop=True)
+
+
+def _cached(cache_dir, payload: dict, compute) -> pd.DataFrame:
+    """
+    Return compute()'s table, stored in cache_dir as Parquet under a hash of payload
+    (model fingerprint, data hash and every parameter that changes the result).
+    """
+    if cache_dir is None:
+        return compute()
+    key = hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+    path = os.path.join(cache_dir, f"{payload['method']}-{key[:16]}.parquet")
+    if os.path.exists(path):
+        return pd.read_parquet(path)
+    table = compute()
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    table.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+    return table
+
+
+def _map(func, tasks, n_jobs, init_args):
+    """Run func over tasks in this process (n_jobs=1) or in a pool whose workers share init_args."""
+    if n_jobs == 1:
+        _init_importance_worker(*init_args)
+        return list(map(func, tasks))
+    with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_importance_worker,
+                             initargs=init_args) as pool:
+        return list(pool.map(func, tasks))
+
+
+def _init_importance_worker(*state):
+    """Share the model and data with a worker once instead of once per batch."""
+    _IMPORTANCE_STATE.clear()
+    _IMPORTANCE_STATE['state'] = state
+
+
+def _positive_shap(values) -> np.ndarray:
+    """SHAP values of the positive class from any of the layouts shap returns for classifiers."""
+    if isinstance(values, list):
+        return np.asarray(values[-1])
+    values = np.asarray(values)
+    return values[..., -1] if values.ndim == 3 else values
+
+
+def _make_explainer(model, background, features, explainer):
+    """The SHAP explainer for model and its kind: 'tree' (TreeExplainer) or 'agnostic' (on predict_proba)."""
+    try:
+        from shap import Explainer, TreeExplainer
+        from shap.maskers import Independent
+    except ImportError as e:
+        raise ImportError("SHAP importance requires the shap package") from e
+    if explainer in ('auto', 'tree'):
+        try:
+            if background is None:
+                return TreeExplainer(model), 'tree'
+            return TreeExplainer(model, data=_model_input(model, background, features),
+                                 feature_perturbation='interventional'), 'tree'
+        except Exception:
+            if explainer == 'tree':
+                raise
+    if background is None:
+        raise ValueError("Model-agnostic SHAP needs a background sample; set background_size")
+
+    def positive_proba(values):
+        return model.predict_proba(_model_input(model, values, features))[:, 1]
+    return Explainer(positive_proba, Independent(background, max_samples=len(background))), 'agnostic'
+
+
+def _shap_batch(rows):
+    """Sum and sum of squares of |SHAP| per feature over one row batch of the eval set."""
+    model, X_eval, background, features, explainer = _IMPORTANCE_STATE['state']
+    if 'explainer' not in _IMPORTANCE_STATE:
+        _IMPORTANCE_STATE['explainer'] = _make_explainer(model, background, features, explainer)
+    shap_explainer, kind = _IMPORTANCE_STATE['explainer']
+    block = X_eval[rows[0]:rows[1]]
+    if kind == 'tree':
+        values = shap_explainer.shap_values(_model_input(model, block, features), check_additivity=False)
+    else:
+        values = shap_explainer(block).values
+    magnitude = np.abs(_positive_shap(values))
+    return magnitude.sum(axis=0), (magnitude ** 2).sum(axis=0), len(magnitude)
+
+
+def shap_importance(model, X, y=None, background_size=100, eval_size=None, batch_rows=256,
+                    explainer='auto', n_jobs=1, seed=0, cache_dir=None) -> pd.DataFrame:
+    """
+    Mean |SHAP value| of the positive class per feature.
+
+    The background (the reference data of the explainer) and the explained eval set are
+    sampled from X: background_size rows uniformly, eval_size rows stratified on y (uniformly
+    without y). The eval rows are split into batches of batch_rows that n_jobs worker
+    processes explain independently; the per-feature sums are added up at the end, so the
+    result does not depend on n_jobs or batch_rows.
+
+    Parameters:
+        model: A fitted classifier. Tree models use shap.TreeExplainer (interventional with a
+            background, tree_path_dependent with background_size=None); other models fall back
+            to the model-agnostic explainer on predict_proba, which needs a background.
+        explainer: 'auto', 'tree' (fail instead of falling back) or 'agnostic'.
+        cache_dir: Directory of cached results, keyed by model fingerprint, data hash and parameters.
+
+    Returns:
+        A DataFrame of Feature, importance (mean |SHAP|) and std (of |SHAP| over the eval
+        rows), sorted by importance.
+    """
+    features = _feature_names(X)
+    values = np.asarray(X, dtype=float)
+    background_seed, eval_seed = np.random.SeedSequence(seed).spawn(2)
+    background = None if background_size is None else values[_random_sample(len(values), background_size, background_seed)]
+    rows = stratified_sample(y, eval_size, eval_seed) if y is not None else _random_sample(len(values), eval_size, eval_seed)
+    X_eval = values[rows]
+
+    def compute():
+        batches = [(lo, min(lo + batch_rows, len(X_eval))) for lo in range(0, len(X_eval), batch_rows)]
+        results = _map(_shap_batch, batches, n_jobs, (model, X_eval, background, features, explainer))
+        total = np.sum([r[0] for r in results], axis=0)
+        total_sq = np.sum([r[1] for r in results], axis=0)
+        n = sum(r[2] for r in results)
+        mean = total / n
+        std = np.sqrt(np.maximum(total_sq / n - mean ** 2, 0) * n / max(n - 1, 1))
+        return _importance_frame(features, mean, std)
+
+    payload = {'method': 'shap', 'model': model_fingerprint(model), 'data': data_hash(X, y),
+               'background_size': background_size, 'eval_size': eval_size, 'explainer': explainer, 'seed': seed}
+    return _cached(cache_dir, payload, compute)
+
+
+def _permutation_batch(task):
+    """Score drops of n_repeats shuffles of each feature in one feature batch."""
+    model, X_eval, y_eval, features, scoring, baseline, n_repeats = _IMPORTANCE_STATE['state']
+    scorer = check_scoring(model, scoring=scoring)
+    permuted = X_eval.copy()
+    drops = []
+    for j, seed in task:
+        rng = np.random.default_rng(seed)
+        column = X_eval[:, j]
+        scores = []
+        for _ in range(n_repeats):
+            permuted[:, j] = column[rng.permutation(len(column))]
+            scores.append(scorer(model, _model_input(model, permuted, features), y_eval))
+        permuted[:, j] = column
+        drops.append(baseline - np.asarray(scores))
+    return drops
+
+
+def permutation_importance(model, X, y, scoring=None, n_repeats=5, eval_size=None, batch_features=None,
+                           n_jobs=1, seed=0, cache_dir=None) -> pd.DataFrame:
+    """
+    Drop in score when a feature's values are shuffled, as sklearn.inspection.permutation_importance.
+
+    The eval set is a stratified sample of eval_size rows (all rows by default). The features
+    are split into batches of batch_features (default: spread evenly over n_jobs) that worker
+    processes shuffle and score independently. Every feature's shuffles come from its own
+    child seed, so the result only depends on seed - not on n_jobs or the batching.
+
+    Parameters:
+        scoring: Any sklearn scoring name or scorer; None uses the model's score method (accuracy).
+
+    Returns:
+        A DataFrame of Feature, importance (mean drop over repeats) and std, sorted by importance.
+    """
+    features = _feature_names(X)
+    eval_seed, shuffle_seed = np.random.SeedSequence(seed).spawn(2)
+    rows = stratified_sample(y, eval_size, eval_seed)
+    X_eval = np.asarray(X, dtype=float)[rows]
+    y_eval = np.asarray(y)[rows]
+
+    def compute():
+        baseline = check_scoring(model, scoring=scoring)(model, _model_input(model, X_eval, features), y_eval)
+        tasks = list(enumerate(shuffle_seed.spawn(len(features))))
+        size = batch_features or max(-(-len(tasks) // n_jobs), 1)
+        batches = [tasks[lo:lo + size] for lo in range(0, len(tasks), size)]
+        init_args = (model, X_eval, y_eval, features, scoring, baseline, n_repeats)
+        drops = np.array([d for batch in _map(_permutation_batch, batches, n_jobs, init_args) for d in batch])
+        return _importance_frame(features, drops.mean(axis=1), drops.std(axis=1))
+
+    payload = {'method': 'permutation', 'model': model_fingerprint(model), 'data': data_hash(X, y),
+               'scoring': scoring, 'n_repeats': n_repeats, 'eval_size': eval_size, 'seed': seed}
+    return _cached(cache_dir, payload, compute)
+
+
+def mutual_information(X, y, eval_size=None, n_jobs=1, seed=42, cache_dir=None) -> pd.DataFrame:
+    """
+    mutual_info_classif of each feature with y, as in only-fin-srvcs.ipynb (random_state=42),
+    on a stratified sample of eval_size rows and with its n_jobs features computed in parallel.
+
+    Returns:
+        A DataFrame of Feature, importance (mutual information) and std (NaN), sorted by importance.
+    """
+    features = _feature_names(X)
+    rows = stratified_sample(y, eval_size, seed)
+
+    def compute():
+        scores = mutual_info_classif(np.asarray(X, dtype=float)[rows], np.asarray(y)[rows],
+                                     random_state=seed, n_jobs=n_jobs)
+        return _importance_frame(features, scores, np.nan)
+
+    payload = {'method': 'mutual_info', 'data': data_hash(X, y), 'eval_size': eval_size, 'seed': seed}
+    return _cached(cache_dir, payload, compute)
+
+
+def _run_method(method, model, X, y, **kwargs) -> pd.DataFrame:
+    if method == 'shap':
+        return shap_importance(model, X, y, **kwargs)
+    if method == 'permutation':
+        return permutation_importance(model, X, y, **kwargs)
+    if method == 'mutual_info':
+        return mutual_information(X, y, **kwargs)
+    raise ValueError(f"Unknown importance method {method!r}; expected one of {list(METHODS)}")
+
+
+def subsampled_importance(method, model, X, y, n_subsamples=5, sample_size=1000, seed=0,
+                          confidence=0.95, **kwargs) -> pd.DataFrame:
+    """
+    Error bars for an importance method: run it on n_subsamples independent stratified
+    samples of sample_size rows and summarize the spread. Smaller samples are faster but
+    give wider intervals; every subsample run is cached on its own.
+
+    Parameters:
+        method: One of METHODS.
+        kwargs: Passed to the method (n_jobs, cache_dir, n_repeats, background_size, ...).
+
+    Returns:
+        A DataFrame of Feature, importance (mean over subsamples), std (over subsamples), the
+        percentile confidence interval ci_lower/ci_upper and n_subsamples, sorted by importance.
+    """
+    features = _feature_names(X)
+    runs = []
+    for child in np.random.SeedSequence(seed).spawn(n_subsamples):
+        sample_seed, method_seed = (int(s.generate_state(1)[0]) for s in child.spawn(2))
+        rows = stratified_sample(y, sample_size, sample_seed)
+        X_sub = X.iloc[rows] if isinstance(X, pd.DataFrame) else np.asarray(X)[rows]
+        table = _run_method(method, model, X_sub, np.asarray(y)[rows], seed=method_seed, **kwargs)
+        runs.append(table.set_index('Feature')['importance'].reindex(features).to_numpy())
+
+    runs = np.array(runs)
+    tail = (1 - confidence) / 2 * 100
+    return _importance_frame(features, runs.mean(axis=0),
+                             runs.std(axis=0, ddof=1) if len(runs) > 1 else np.nan,
+                             ci_lower=np.percentile(runs, tail, axis=0),
+                             ci_upper=np.percentile(runs, 100 - tail, axis=0),
+                             n_subsamples=len(runs))
+
+
+def importance_table(model, X, y, methods=METHODS, n_jobs=1, cache_dir=None, **method_kwargs) -> pd.DataFrame:
+    """
+    One column per method (mean |SHAP|, permutation drop, mutual information), indexed by
+    Feature. method_kwargs maps a method name to extra keyword arguments for it, e.g.
+    shap={'eval_size': 2000}.
+    """
+    columns = {}
+    for method in methods:
+        table = _run_method(method, model, X, y, n_jobs=n_jobs, cache_dir=cache_dir,
+                            **method_kwargs.get(method, {}))
+        columns[method] = table.set_index('Feature')['importance']
+    return pd.DataFrame(columns).reindex(_feature_names(X))
@@ -0,0 +1,213 @@
+import numpy as np
+import pandas as pd
+
+EXIT_REASONS = np.array(['stop_loss/take_profit', 'fundamentals_change', 'max_hold_period',
+                         'signal_change', 'end_of_data'], dtype=object)
+
+# Optional columns after symbol_stock/entry_date/exit_date/trade_return, with their
+# storage dtype and the value used for trades that do not set them
+_OPTIONAL = {
+    'position_size': (np.float64, np.nan),
+    'hold_periods': (np.int64, -1),
+    'exit_reason': (np.int8, -1),
+    'entry_value': (np.float64, np.nan),
+    'pnl': (np.float64, np.nan),
+}
+_REASON_CODE = {reason: code for code, reason in enumerate(EXIT_REASONS)}
+
+
+def _reason_codes(values) -> np.ndarray:
+    """EXIT_REASONS codes (int8, -1 for missing) from reason strings or integer codes."""
+    values = np.asarray(values)
+    if values.dtype.kind in 'iu':
+        return values.astype(np.int8)
+    codes = pd.Categorical(values, categories=EXIT_REASONS).codes
+    unknown = (codes < 0) & pd.notna(values)
+    if unknown.any():
+        raise ValueError(f"Unknown exit reasons: {sorted(set(values[unknown]))}")
+    return codes.astype(np.int8)
+
+
+class TradeLedger:
+    """
+    Columnar trade ledger: one NumPy array per column instead of a list of trade dicts.
+
+    Symbols are stored as int32 codes into `symbols` and exit reasons as int8 codes into
+    EXIT_REASONS, so a trade costs about 40 bytes however many trades the ledger holds.
+    The per-stock simulators append() trade dicts one at a time (the arrays grow
+    geometrically); the panel simulators build a ledger from whole arrays with from_arrays().
+    to_frame() returns exactly the DataFrame the simulators returned before.
+
+    Attributes:
+        columns: The ledger's columns, in the order trades defined them.
+        symbols: Symbol names; symbol_codes index into them.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self.columns = ['symbol_stock', 'entry_date', 'exit_date', 'trade_return']
+        self.symbols = []
+        self._symbol_code = {}
+        self._n = 0
+        self._data = {
+            'symbol_stock': np.empty(capacity, dtype=np.int32),
+            'entry_date': np.empty(capacity, dtype='datetime64[ns]'),
+            'exit_date': np.empty(capacity, dtype='datetime64[ns]'),
+            'trade_return': np.empty(capacity, dtype=np.float64),
+        }
+
+    def __len__(self):
+        return self._n
+
+    def _add_column(self, name: str):
+        dtype, missing = _OPTIONAL[name]
+        self._data[name] = np.full(len(self._data['trade_return']), missing, dtype=dtype)
+        self.columns.append(name)
+
+    def _reserve(self, n: int):
+        """Make room for n more trades, doubling the capacity when it runs out."""
+        capacity = len(self._data['trade_return'])
+        if self._n + n <= capacity:
+            return
+        capacity = max(2 * capacity, self._n + n)
+        for name, values in self._data.items():
+            grown = np.full(capacity, _OPTIONAL[name][1], dtype=values.dtype) if name in _OPTIONAL \
+                else np.empty(capacity, dtype=values.dtype)
+            grown[:self._n] = values[:self._n]
+            self._data[name] = grown
+
+    def _codes(self, symbols) -> np.ndarray:
+        """Symbol codes of an array of symbols, registering new symbols in order of appearance."""
+        codes, uniques = pd.factorize(np.asarray(symbols, dtype=object))
+        mapping = np.array([self._symbol_code.setdefault(symbol, len(self._symbol_code))
+                            for symbol in uniques] + [-1], dtype=np.int32)
+        self.symbols = list(self._symbol_code)
+        return mapping[codes]
+
+    def append(self, trade: dict):
+        """Add one trade given as a simulator trade dict (exit_reason as a string)."""
+        self._reserve(1)
+        i = self._n
+        symbol = trade['symbol_stock']
+        code = self._symbol_code.get(symbol, -1)
+        if code < 0 and not pd.isna(symbol):
+            code = self._symbol_code[symbol] = len(self.symbols)
+            self.symbols.append(symbol)
+        self._data['symbol_stock'][i] = code
+        self._data['entry_date'][i] = pd.Timestamp(trade['entry_date']).to_datetime64()
+        self._data['exit_date'][i] = pd.Timestamp(trade['exit_date']).to_datetime64()
+        self._data['trade_return'][i] = trade['trade_return']
+        for name, value in trade.items():
+            if name in ('symbol_stock', 'entry_date', 'exit_date', 'trade_return'):
+                continue
+            if name not in _OPTIONAL:
+                raise ValueError(f"Unknown ledger column: {name}")
+            if name not in self._data:
+                self._add_column(name)
+            if name == 'exit_reason' and value is not None:
+                value = _REASON_CODE[value]
+            self._data[name][i] = _OPTIONAL[name][1] if value is None else value
+        self._n += 1
+
+    def extend(self, symbol_stock, entry_date, exit_date, trade_return, **optional):
+        """
+        Add many trades from equal-length arrays. optional takes any of position_size,
+        hold_periods, exit_reason (strings or EXIT_REASONS codes), entry_value and pnl.
+        """
+        unknown = set(optional) - set(_OPTIONAL)
+        if unknown:
+            raise ValueError(f"Unknown ledger columns: {sorted(unknown)}")
+        n = len(trade_return)
+        self._reserve(n)
+        rows = slice(self._n, self._n + n)
+        self._data['symbol_stock'][rows] = self._codes(symbol_stock)
+        self._data['entry_date'][rows] = pd.to_datetime(entry_date).to_numpy(dtype='datetime64[ns]')
+        self._data['exit_date'][rows] = pd.to_datetime(exit_date).to_numpy(dtype='datetime64[ns]')
+        self._data['trade_return'][rows] = trade_return
+        for name in _OPTIONAL:
+            if name not in optional:
+                continue
+            if name not in self._data:
+                self._add_column(name)
+            values = optional[name]
+            self._data[name][rows] = _reason_codes(values) if name == 'exit_reason' else values
+        self._n += n
+        return self
+
+    @classmethod
+    def from_arrays(cls, symbol_stock, entry_date, exit_date, trade_return, **optional) -> 'TradeLedger':
+        """A ledger holding exactly the given column arrays (see extend)."""
+        return cls(capacity=len(trade_return)).extend(symbol_stock, entry_date, exit_date,
+                                                      trade_return, **optional)
+
+    @classmethod
+    def from_frame(cls, trades_df: pd.DataFrame) -> 'TradeLedger':
+        """A ledger from a simulator trade DataFrame (or the list of trade dicts it came from)."""
+        if isinstance(trades_df, TradeLedger):
+            return trades_df
+        if not isinstance(trades_df, pd.DataFrame):
+            ledger = cls()
+            for trade in trades_df:
+                ledger.append(trade)
+            return ledger
+        optional = {name: trades_df[name].to_numpy() for name in trades_df.columns if name in _OPTIONAL}
+        if 'exit_reason' in optional:
+            optional['exit_reason'] = _reason_codes(optional['exit_reason'].astype(object))
+        return cls.from_arrays(trades_df['symbol_stock'].to_numpy(), trades_df['entry_date'],
+                               trades_df['exit_date'], trades_df['trade_return'].to_numpy(dtype=float),
+                               **optional)
+
+    @classmethod
+    def concat(cls, ledgers: list) -> 'TradeLedger':
+        """One ledger with the trades of every ledger, in order."""
+        ledgers = list(ledgers)
+        combined = cls(capacity=sum(len(ledger) for ledger in ledgers))
+        for ledger in ledgers:
+            combined.extend(ledger.symbol_names(), ledger['entry_date'], ledger['exit_date'],
+                            ledger['trade_return'], **{name: ledger[name] for name in ledger.columns
+                                                       if name in _OPTIONAL})
+        return combined
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        """A column's stored values (a view): codes for symbol_stock and exit_reason."""
+        return self._data[name][:self._n]
+
+    @property
+    def symbol_codes(self) -> np.ndarray:
+        return self['symbol_stock']
+
+    @property
+    def exit_codes(self) -> np.ndarray:
+        """EXIT_REASONS codes (-1 where the trade has no exit reason)."""
+        if 'exit_reason' not in self._data:
+            return np.full(self._n, -1, dtype=np.int8)
+        return self['exit_reason']
+
+    def symbol_names(self) -> np.ndarray:
+        return np.asarray(self.symbols + [None], dtype=object)[self.symbol_codes]
+
+    def take(self, rows) -> 'TradeLedger':
+        """A new ledger with the trades selected by a boolean mask or index array."""
+        subset = TradeLedger(capacity=0)
+        subset.columns = list(self.columns)
+        subset.symbols = list(self.symbols)
+        subset._symbol_code = dict(self._symbol_code)
+        subset._data = {name: self[name][rows] for name in self._data}
+        subset._n = len(subset._data['trade_return'])
+        return subset
+
+    def to_frame(self, categorical: bool = False) -> pd.DataFrame:
+        """
+        The ledger as the simulators' trade DataFrame. With categorical=True symbol_stock and
+        exit_reason are returned as Categoricals built from the stored codes (no string copy).
+        """
+        frame = {}
+        for name in self.columns:
+            values = self[name]
+            if name == 'symbol_stock':
+                values = (pd.Categorical.from_codes(values, categories=self.symbols) if categorical
+                          else self.symbol_names())
+            elif name == 'exit_reason':
+                values = (pd.Categorical.from_codes(values, categories=EXIT_REASONS) if categorical
+                          else np.append(EXIT_REASONS, None)[values])
+            frame[name] = values.copy() if isinstance(values, np.ndarray) else values
+        return pd.DataFrame(frame)
@@ -0,0 +1,148 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+import numpy as np
+
+
+def _block_sizes(n_iterations, block_size):
+    """Split n_iterations into consecutive blocks of at most block_size iterations."""
+    full, rest = divmod(n_iterations, block_size)
+    return [block_size] * full + ([rest] if rest else [])
+
+
+def _block_seeds(seed, n_blocks):
+    """
+    One independent child seed per block, so the draws only depend on the seed and the
+    block size - never on how the blocks are spread over worker processes.
+    """
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    return seed.spawn(n_blocks)
+
+
+def _outer_block(values, n_draws, seed):
+    """Resample the quarterly returns n_draws times and compute the annualized return and Sharpe of each sample."""
+    rng = np.random.default_rng(seed)
+    n = len(values)
+    samples = values[rng.integers(0, n, size=(n_draws, n))]
+    annualized = np.prod(1 + samples, axis=1) ** (4 / n) - 1
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sharpe = samples.mean(axis=1) / samples.std(axis=1, ddof=1) * np.sqrt(4)
+    return annualized, sharpe
+
+
+def bootstrap_quarterly_metrics(quarterly_returns, n_iterations=10000, seed=None,
+                                block_size=10000, n_jobs=1) -> pd.DataFrame:
+    """
+    Bootstrap the annualized return and Sharpe ratio by resampling quarterly returns with replacement.
+
+    Parameters:
+        quarterly_returns: Series or array of quarterly portfolio returns.
+        n_iterations: Number of bootstrap samples.
+        seed: Seed for reproducible draws (None draws fresh entropy).
+        block_size: Number of samples drawn per vectorized block; bounds memory to
+            block_size * len(quarterly_returns) values.
+        n_jobs: Number of worker processes the blocks are spread over.
+
+    Returns:
+        A DataFrame with one row per bootstrap sample and columns annualized_return and sharpe_ratio.
+    """
+    values = np.asarray(quarterly_returns, dtype=float)
+    sizes = _block_sizes(n_iterations, block_size)
+    seeds = _block_seeds(seed, len(sizes))
+
+    if n_jobs == 1:
+        blocks = list(map(_outer_block, [values] * len(sizes), sizes, seeds))
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+            blocks = list(pool.map(_outer_block, [values] * len(sizes), sizes, seeds))
+
+    return pd.DataFrame({
+        'annualized_return': np.concatenate([b[0] for b in blocks]) if blocks else np.array([]),
+        'sharpe_ratio': np.concatenate([b[1] for b in blocks]) if blocks else np.array([]),
+    })
+
+
+def bootstrap_trade_quarter_means(trades_df, quarters, n_inner=2000, seed=None,
+                                  fill_value=-0.01, max_block_values=2 ** 22) -> pd.Series:
+    """
+    Inner level of the hierarchical bootstrap: for each quarter, resample its trades with
+    replacement n_inner times and average the resampled mean trade returns. Every quarter
+    is resampled in the same draw, in blocks of resamples sized from the total trade count.
+
+    Parameters:
+        trades_df: Trade ledger with 'Quarter' and 'trade_return' columns.
+        quarters: All quarters of the backtest; quarters without trades get fill_value.
+        n_inner: Number of trade-level resamples per quarter.
+        seed: Seed for reproducible draws.
+        max_block_values: Upper bound on the number of resampled trade returns held at once.
+
+    Returns:
+        A Series of bootstrapped quarterly returns indexed by quarter.
+    """
+    codes, quarter_index = pd.factorize(trades_df['Quarter'], sort=True)
+    has_quarter = codes >= 0
+    codes = codes[has_quarter]
+    order = np.argsort(codes, kind='stable')
+    codes = codes[order]
+    values = trades_df['trade_return'].to_numpy(dtype=float)[has_quarter][order]
+    if len(values) == 0:
+        return pd.Series(fill_value, index=quarters, dtype=float)
+
+    # Trades sorted by quarter: position j of a resample draws from its own quarter's
+    # trades, starts[q]:starts[q] + counts[q], so one integers() call per block resamples
+    # every quarter. Drawing 32-bit integers with a scalar bound and reducing them modulo
+    # the quarter's trade count is much faster than per-element bounds; its bias is below
+    # counts[q] / 2**32.
+    counts = np.bincount(codes, minlength=len(quarter_index))
+    starts = np.r_[0, np.cumsum(counts)[:-1]]
+    high = np.repeat(counts, counts).astype(np.uint32)
+    base = np.repeat(starts, counts).astype(np.uint32)
+
+    rng = np.random.default_rng(seed)
+    rows_per_block = max(max_block_values // len(values), 1)
+    picks = np.zeros(len(values))
+    for n_rows in _block_sizes(n_inner, rows_per_block):
+        draws = rng.integers(0, 2 ** 32, size=(n_rows, len(values)), dtype=np.uint32)
+        np.remainder(draws, high, out=draws)
+        np.add(draws, base, out=draws)
+        # How often each trade was picked; only the totals matter for the mean
+        picks += np.bincount(draws.ravel(), minlength=len(values))
+    # Mean over resamples of each resample's mean trade return
+    totals = np.bincount(codes, weights=picks * values, minlength=len(quarter_index))
+    means = totals / (counts * n_inner)
+
+    return pd.Series(means, index=quarter_index, dtype=float).reindex(quarters, fill_value=fill_value)
+
+
+def hierarchical_bootstrap(trades_df, quarters, n_inner=2000, n_outer=25000, seed=None,
+                           fill_value=-0.01, block_size=10000, n_jobs=1) -> pd.DataFrame:
+    """
+    Two-level (block) bootstrap: trades are resampled within each quarter, then the
+    bootstrapped quarterly returns are resampled to build annualized return and Sharpe distributions.
+    """
+    inner_seed, outer_seed = _block_seeds(seed, 2)
+    quarterly = bootstrap_trade_quarter_means(trades_df, quarters, n_inner=n_inner,
+                                              seed=inner_seed, fill_value=fill_value)
+    return bootstrap_quarterly_metrics(quarterly, n_iterations=n_outer, seed=outer_seed,
+                                       block_size=block_size, n_jobs=n_jobs)
+
+
+def bootstrap_summary(samples, observed, confidence=0.95) -> dict:
+    """
+    Summarize a bootstrap distribution: mean, percentile confidence interval and the
+    two-sided p-value for the statistic being zero, computed as in the notebooks.
+    """
+    samples = np.asarray(samples, dtype=float)
+    samples = samples[~np.isnan(samples)]
+    tail = (1 - confidence) / 2 * 100
+    if observed >= 0:
+        p_value = 2 * np.mean(samples <= 0)
+    else:
+        p_value = 2 * np.mean(samples >= 0)
+    return {
+        'mean': samples.mean(),
+        'ci_lower': np.percentile(samples, tail),
+        'ci_upper': np.percentile(samples, 100 - tail),
+        'p_value': min(p_value, 1.0),
+    }
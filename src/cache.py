@@ -0,0 +1,191 @@
+# src/cache.py
+import hashlib
+import json
+import logging
+import os
+import time
+
+import pandas as pd
+
+
+class _Node:
+    """
+    A lazily evaluated pipeline value: either a raw input file (whose value is its path)
+    or the output of a stage applied to other nodes.
+    """
+
+    def __init__(self, name, key, func=None, inputs=(), params=None, value=None):
+        self.name = name
+        self.key = key
+        self.func = func
+        self.inputs = inputs
+        self.params = params or {}
+        self.value = value
+        self.resolved = func is None
+        self.consumers = 0
+
+    def take(self):
+        """Hand the value to one consumer, dropping the reference once every consumer has it."""
+        value = self.value
+        self.consumers -= 1
+        if self.consumers <= 0 and self.func is not None:
+            self.value = None
+        return value
+
+
+class StageCache:
+    """
+    Content-addressed on-disk cache for pipeline stages.
+
+    Each stage's key combines its name, version and parameters with the keys of its
+    inputs, and raw input files are keyed by a hash of their contents, so a change to
+    any file, parameter or version invalidates that stage and everything downstream.
+    Stages are evaluated lazily from the final result backwards: a cached stage is
+    loaded from Parquet and the stages feeding it are never run.
+
+    Parameters:
+        cache_dir: Directory for the cached Parquet files; None disables caching.
+        max_bytes: Size cap for the cache; least recently used entries are evicted beyond it.
+        refresh: Recompute every stage and overwrite its cached output.
+        profiler: Optional StageProfiler that records every stage computed or loaded.
+    """
+
+    INDEX_FILE = 'index.json'
+
+    def __init__(self, cache_dir: str = None, max_bytes: int = 2 * 1024 ** 3, refresh: bool = False,
+                 profiler=None):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.refresh = refresh
+        self.profiler = profiler
+        self.nodes = []
+        self.statuses = {}
+        self.index = {'stages': {}, 'files': {}}
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+            index_path = os.path.join(cache_dir, self.INDEX_FILE)
+            if os.path.exists(index_path):
+                with open(index_path) as f:
+                    self.index = json.load(f)
+
+    @property
+    def enabled(self) -> bool:
+        return self.cache_dir is not None
+
+    def file(self, path: str) -> _Node:
+        """
+        Register a raw input file; its key is the SHA-256 of its contents. With caching
+        disabled no key is ever looked up, so the file is not read and its path is the key.
+        """
+        if not self.enabled:
+            return _Node(os.path.basename(path), os.path.abspath(path), value=path)
+        return _Node(os.path.basename(path), self._file_hash(path), value=path)
+
+    def stage(self, func, *inputs, version: int = 1, name: str = None, **params) -> _Node:
+        """
+        Register `func(*inputs, **params)` as a cached stage. The stage must return a
+        DataFrame; it only runs if its output is needed and not already cached.
+        """
+        name = name or func.__name__
+        payload = json.dumps({'stage': name, 'version': version, 'params': params,
+                              'inputs': [node.key for node in inputs]}, sort_keys=True, default=str)
+        node = _Node(name, hashlib.sha256(payload.encode()).hexdigest(), func, inputs, params)
+        for parent in inputs:
+            parent.consumers += 1
+        self.nodes.append(node)
+        return node
+
+    def result(self, node: _Node) -> pd.DataFrame:
+        """Evaluate a stage, loading it (or its nearest cached ancestors) from disk where possible."""
+        node.consumers += 1
+        value = self._resolve(node)
+        self._save_index()
+        return value
+
+    def report(self) -> pd.DataFrame:
+        """One row per registered stage: 'hit', 'computed', or 'skipped' when it was not needed."""
+        return pd.DataFrame([
+            {'stage': node.name, 'key': node.key[:12], 'status': self.statuses.get(node.key, 'skipped')}
+            for node in self.nodes
+        ])
+
+    def invalidate(self, stage: str = None):
+        """Delete the cached outputs of one stage (by name), or of every stage if none is given."""
+        for key, entry in list(self.index['stages'].items()):
+            if stage is None or entry['stage'] == stage:
+                self._remove(key)
+        self._save_index()
+
+    def _resolve(self, node: _Node):
+        if node.resolved:
+            return node.take()
+
+        path = self._path(node.key)
+        if self.enabled and not self.refresh and node.key in self.index['stages'] and os.path.exists(path):
+            if self.profiler is None:
+                node.value = pd.read_parquet(path)
+            else:
+                node.value = self.profiler.run(node.name, pd.read_parquet, [path], {}, status='hit')
+            self.index['stages'][node.key]['last_used'] = time.time()
+            self.statuses[node.key] = 'hit'
+        else:
+            args = [self._resolve(parent) for parent in node.inputs]
+            if self.profiler is None:
+                node.value = node.func(*args, **node.params)
+            else:
+                node.value = self.profiler.run(node.name, node.func, args, node.params)
+            self.statuses[node.key] = 'computed'
+            if self.enabled:
+                self._store(node)
+        logging.info(f"Stage {node.name}: {self.statuses[node.key]}")
+        node.resolved = True
+        return node.take()
+
+    def _store(self, node: _Node):
+        path = self._path(node.key)
+        tmp_path = path + '.tmp'
+        node.value.to_parquet(tmp_path)
+        os.replace(tmp_path, path)
+        self.index['stages'][node.key] = {'stage': node.name, 'bytes': os.path.getsize(path),
+                                          'last_used': time.time()}
+        self._evict()
+
+    def _evict(self):
+        """Drop least recently used entries until the cache fits within max_bytes."""
+        entries = sorted(self.index['stages'].items(), key=lambda item: item[1]['last_used'])
+        total = sum(entry['bytes'] for _, entry in entries)
+        for key, entry in entries:
+            if total <= self.max_bytes:
+                break
+            total -= entry['bytes']
+            self._remove(key)
+
+    def _remove(self, key: str):
+        self.index['stages'].pop(key, None)
+        if os.path.exists(self._path(key)):
+            os.remove(self._path(key))
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir or '', f"{key}.parquet")
+
+    def _file_hash(self, path: str) -> str:
+        """Hash a file's contents, reusing the stored hash while its size and mtime are unchanged."""
+        stat = os.stat(path)
+        known = self.index['files'].get(os.path.abspath(path))
+        if known and known['size'] == stat.st_size and known['mtime'] == stat.st_mtime:
+            return known['sha256']
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        self.index['files'][os.path.abspath(path)] = {'size': stat.st_size, 'mtime': stat.st_mtime,
+                                                      'sha256': digest.hexdigest()}
+        return digest.hexdigest()
+
+    def _save_index(self):
+        if not self.enabled:
+            return
+        index_path = os.path.join(self.cache_dir, self.INDEX_FILE)
+        with open(index_path + '.tmp', 'w') as f:
+            json.dump(self.index, f)
+        os.replace(index_path + '.tmp', index_path)
@@ -0,0 +1,161 @@
+# src/feature_matrix.py
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+TARGET = 'good_stock'
+
+# Columns of final_df that are built from the forward price and must never be features
+OUTCOME_COLUMNS = ['target_date', 'future_date', 'future_price', 'future_dji', 'log_dji_return',
+                   'log_return_future', 'relative_log_return', TARGET]
+
+# Prefixes of the per-horizon outcome columns of src.price_store.add_forward_targets
+OUTCOME_PREFIXES = ('future_date_', 'log_return_future_', 'log_market_return_', 'relative_log_return_',
+                    'good_stock_')
+
+MANIFEST_FILE = 'manifest.json'
+
+
+def default_feature_columns(df: pd.DataFrame, target: str = TARGET) -> list:
+    """Every numeric column of final_df except the target and the forward-looking outcome columns."""
+    excluded = set(OUTCOME_COLUMNS) | {target}
+    return [col for col in df.select_dtypes(include='number').columns
+            if col not in excluded and not str(col).startswith(OUTCOME_PREFIXES)]
+
+
+def export_feature_matrix(df: pd.DataFrame, directory: str, features: list = None, target: str = TARGET) -> dict:
+    """
+    Write final_df's features, label and (symbol, accepted_date) index as .npy files that
+    FeatureMatrix opens memory-mapped.
+
+      X.npy:        C-contiguous float32 (rows x features); infinities stored as NaN, as
+                    the notebooks replace them before dropping incomplete rows
+      y.npy:        int8 label (-1 where the target is missing)
+      symbols.npy:  int32 code into the manifest's symbol list (-1 for a missing symbol)
+      dates.npy:    accepted_date as datetime64[ns]
+
+    X is filled one column at a time through a memory-mapped file, so no float64 copy of
+    the feature block is ever built. The manifest is written last and marks a complete export.
+
+    Returns:
+        The manifest.
+    """
+    features = default_feature_columns(df, target) if features is None else list(features)
+    os.makedirs(directory, exist_ok=True)
+    manifest_path = os.path.join(directory, MANIFEST_FILE)
+    if os.path.exists(manifest_path):
+        os.remove(manifest_path)
+
+    X = np.lib.format.open_memmap(os.path.join(directory, 'X.npy'), mode='w+', dtype=np.float32,
+                                  shape=(len(df), len(features)))
+    for j, col in enumerate(features):
+        values = df[col].to_numpy(dtype=np.float32, na_value=np.nan)
+        values[np.isinf(values)] = np.nan
+        X[:, j] = values
+    X.flush()
+    del X
+
+    labels = df[target].to_numpy(dtype=float, na_value=np.nan)
+    np.save(os.path.join(directory, 'y.npy'), np.where(np.isnan(labels), -1, labels).astype(np.int8))
+    symbols = pd.Categorical(df['symbol_stock'])
+    np.save(os.path.join(directory, 'symbols.npy'), symbols.codes.astype(np.int32))
+    np.save(os.path.join(directory, 'dates.npy'), pd.to_datetime(df['accepted_date']).to_numpy(dtype='datetime64[ns]'))
+
+    manifest = {
+        'version': 1,
+        'n_rows': len(df),
+        'features': features,
+        'target': target,
+        'symbols': [str(symbol) for symbol in symbols.categories],
+        'dtype': 'float32',
+    }
+    with open(manifest_path + '.tmp', 'w') as f:
+        json.dump(manifest, f)
+    os.replace(manifest_path + '.tmp', manifest_path)
+    return manifest
+
+
+class FeatureMatrix:
+    """
+    Read-only, memory-mapped view of an export_feature_matrix directory.
+
+    The arrays are opened with mmap_mode='r', so opening is zero-copy and every process
+    that opens the same directory shares one physical copy through the page cache.
+    Subsets are described by integer index arrays (row_index, column_index) and only
+    materialized by take(), which copies just the selected float32 block.
+
+    Attributes:
+        X, y, symbol_codes, dates: The memory-mapped arrays.
+        features, symbols, target: From the manifest.
+    """
+
+    chunk_rows = 65536
+
+    def __init__(self, directory: str):
+        with open(os.path.join(directory, MANIFEST_FILE)) as f:
+            self.manifest = json.load(f)
+        self.directory = directory
+        self.features = self.manifest['features']
+        self.symbols = self.manifest['symbols']
+        self.target = self.manifest['target']
+        self.X = np.load(os.path.join(directory, 'X.npy'), mmap_mode='r')
+        self.y = np.load(os.path.join(directory, 'y.npy'), mmap_mode='r')
+        self.symbol_codes = np.load(os.path.join(directory, 'symbols.npy'), mmap_mode='r')
+        self.dates = np.load(os.path.join(directory, 'dates.npy'), mmap_mode='r')
+
+    def __len__(self):
+        return self.manifest['n_rows']
+
+    def column_index(self, names: list = None) -> np.ndarray:
+        """Positions of the named features in X (all features if names is None)."""
+        if names is None:
+            return np.arange(len(self.features))
+        position = {name: i for i, name in enumerate(self.features)}
+        missing = [name for name in names if name not in position]
+        if missing:
+            raise KeyError(f"Features not in the export: {missing}")
+        return np.array([position[name] for name in names], dtype=np.intp)
+
+    def row_index(self, start=None, end=None, symbols: list = None, complete_columns: np.ndarray = None,
+                  labelled: bool = True) -> np.ndarray:
+        """
+        Positions of the rows with start <= accepted_date < end, in the given symbols, with a
+        label (unless labelled=False) and, if complete_columns is given, no NaN in those
+        columns of X - the notebooks' dropna over the feature list.
+        """
+        keep = np.ones(len(self), dtype=bool)
+        if start is not None:
+            keep &= self.dates >= np.datetime64(pd.Timestamp(start))
+        if end is not None:
+            keep &= self.dates < np.datetime64(pd.Timestamp(end))
+        if symbols is not None:
+            wanted = set(symbols)
+            keep &= np.isin(self.symbol_codes, [i for i, symbol in enumerate(self.symbols) if symbol in wanted])
+        if labelled:
+            keep &= self.y >= 0
+        rows = np.flatnonzero(keep)
+        if complete_columns is not None:
+            # Checked in blocks so only chunk_rows x len(complete_columns) values are read at once
+            complete = np.concatenate([
+                ~np.isnan(self.X[np.ix_(rows[lo:lo + self.chunk_rows], complete_columns)]).any(axis=1)
+                for lo in range(0, len(rows), self.chunk_rows)
+            ] + [np.zeros(0, dtype=bool)])
+            rows = rows[complete]
+        return rows
+
+    def take(self, rows: np.ndarray = None, columns: np.ndarray = None):
+        """The float32 feature block and labels of the given rows and columns, as in-memory arrays."""
+        rows = np.arange(len(self)) if rows is None else rows
+        X = self.X[rows] if columns is None else self.X[np.ix_(rows, columns)]
+        return X, np.asarray(self.y[rows])
+
+    def index(self, rows: np.ndarray = None) -> pd.DataFrame:
+        """symbol_stock and accepted_date of the given rows, to align predictions with final_df."""
+        rows = np.arange(len(self)) if rows is None else rows
+        codes = np.asarray(self.symbol_codes[rows])
+        return pd.DataFrame({
+            'symbol_stock': pd.Categorical.from_codes(codes, categories=self.symbols),
+            'accepted_date': np.asarray(self.dates[rows]),
+        })
@@ -0,0 +1,244 @@
+# src/incremental.py
+import json
+import os
+
+import numpy as np
+import pandas as pd
+from src.preprocessing import (
+    fix_financial_columns,
+    calculate_financial_metrics,
+    merge_sp500,
+    add_target_and_features,
+    merge_with_future_prices,
+    calculate_final_returns,
+    clean_final_df,
+    apply_universe_filters,
+    feature_column_names,
+    feature_depth,
+    FEATURE_SPEC,
+    RATIO_SPEC
+)
+from src.ingestion import restore_string_columns
+
+# The incremental state cannot be final_df itself: lags, rolling means and growth rates
+# read filings that clean_final_df and the universe filters later drop. Instead it keeps
+#   panel:          every filing after add_target_and_features (sorted by symbol and date),
+#                   plus its resolved forward prices
+#   last_adj_close: the last 'Adj Close' per symbol in file order, for log_return
+#   sp_last_date:   the last S&P date the panel was matched against
+#   horizon_days / feature_spec / ratio_spec: the parameters the features were built with
+FUTURE_COLUMNS = ['future_date', 'future_price', 'future_dji']
+
+
+def _last_adj_close(financial_df: pd.DataFrame) -> pd.Series:
+    """'Adj Close' of the last row of each symbol in file order (NaN included, as shift(1) sees it)."""
+    last_rows = financial_df.drop_duplicates('symbol_stock', keep='last')
+    return pd.Series(last_rows['Adj Close'].to_numpy(), index=last_rows['symbol_stock'].astype(object))
+
+
+def _future_prices(panel: pd.DataFrame, horizon_days: int = 90) -> pd.DataFrame:
+    """Resolve the forward asof prices of merge_with_future_prices for each panel row, in panel order."""
+    tagged = panel[['symbol_stock', 'accepted_date', 'Adj Close', 'Close']].assign(_row=np.arange(len(panel)))
+    merged = merge_with_future_prices(tagged, horizon_days=horizon_days)
+    future = merged.set_index('_row')[FUTURE_COLUMNS].reindex(np.arange(len(panel)))
+    future.index = panel.index
+    return future
+
+
+def _date_keys(dates) -> np.ndarray:
+    """int64 sort keys of dates with NaT last, as the (symbol, date) sort of the panel places them."""
+    dates = pd.DatetimeIndex(dates)
+    return np.where(dates.isna(), np.iinfo(np.int64).max, dates.asi8)
+
+
+def build_incremental_state(financial_df: pd.DataFrame, sp_df: pd.DataFrame, horizon_days: int = 90,
+                            feature_spec: dict = FEATURE_SPEC, ratio_spec: list = RATIO_SPEC) -> dict:
+    """
+    Run the per-filing stages of preprocess() over the full history and return the state
+    that update_incremental_state extends.
+    """
+    last_adj_close = _last_adj_close(financial_df)
+    df = fix_financial_columns(financial_df)
+    df = calculate_financial_metrics(df, ratio_spec)
+    df = merge_sp500(df, sp_df)
+    panel = restore_string_columns(add_target_and_features(df, horizon_days=horizon_days,
+                                                           feature_spec=feature_spec))
+    panel = pd.concat([panel, _future_prices(panel, horizon_days)], axis=1)
+    return {
+        'panel': panel,
+        'last_adj_close': last_adj_close,
+        'sp_last_date': sp_df['acceptedDate'].max(),
+        'horizon_days': horizon_days,
+        'feature_spec': feature_spec,
+        'ratio_spec': ratio_spec,
+    }
+
+
+def update_incremental_state(state: dict, new_filings: pd.DataFrame, sp_df: pd.DataFrame) -> dict:
+    """
+    Add a delta of new filings (as they would be appended to merged_fullstock_data.csv)
+    and the current S&P data to the state, recomputing only what the delta can change:
+      - log_return, ratios and the S&P asof match of the new filings
+      - the S&P match of old filings dated after the previous last S&P date
+      - lags, growth rates, rolling means and forward prices of each affected symbol's
+        rows from the first one the delta changes, with the feature_depth rows before
+        it as context; the rest of the panel is neither recomputed nor re-sorted
+
+    Matches a full rebuild when (symbol_stock, accepted_date) is unique, as it is for
+    quarterly filings.
+    """
+    panel = state['panel']
+    feature_spec = state['feature_spec']
+    feature_cols = feature_column_names(feature_spec)
+    base_cols = [col for col in panel.columns
+                 if col not in feature_cols + FUTURE_COLUMNS + ['accepted_date', 'target_date']]
+
+    # Row-wise stages for the delta; log_return continues from each symbol's last filing
+    last_adj_close = state['last_adj_close']
+    new_rows = calculate_financial_metrics(fix_financial_columns(new_filings.copy()), state['ratio_spec'])
+    first_new = ~new_rows['symbol_stock'].duplicated()
+    previous = new_rows.loc[first_new, 'symbol_stock'].astype(object).map(last_adj_close)
+    new_rows.loc[first_new, 'log_return'] = np.log(new_rows.loc[first_new, 'Adj Close'] / previous)
+    last_adj_close = pd.concat([last_adj_close, _last_adj_close(new_rows)])
+    last_adj_close = last_adj_close[~last_adj_close.index.duplicated(keep='last')]
+
+    financial_cols = [col for col in base_cols if col in new_rows.columns]
+    new_rows = restore_string_columns(merge_sp500(new_rows, sp_df))
+    new_rows = new_rows.sort_values(['symbol_stock', 'acceptedDate'], kind='mergesort', ignore_index=True)
+
+    # Old filings after the last known S&P date may now match newer S&P rows
+    sp_last_date = sp_df['acceptedDate'].max()
+    rematch = np.zeros(len(panel), dtype=bool)
+    if sp_last_date > state['sp_last_date']:
+        rematch = (panel['acceptedDate'] > state['sp_last_date']).to_numpy()
+
+    # The panel is sorted by (symbol, date) with missing symbols and dates last, so each
+    # symbol is one block of rows and a row's features only read the rows before it
+    symbols = panel['symbol_stock'].astype(object).to_numpy()
+    new_symbols = new_rows['symbol_stock'].astype(object).to_numpy()
+    n_known, n_new_known = int(pd.notna(symbols).sum()), int(pd.notna(new_symbols).sum())
+    affected = np.asarray(sorted(set(new_symbols[:n_new_known]) | set(symbols[:n_known][rematch[:n_known]])),
+                          dtype=object)
+    blocks = list(zip(np.searchsorted(symbols[:n_known], affected, side='left').tolist(),
+                      np.searchsorted(symbols[:n_known], affected, side='right').tolist(),
+                      np.searchsorted(new_symbols[:n_new_known], affected, side='left').tolist(),
+                      np.searchsorted(new_symbols[:n_new_known], affected, side='right').tolist()))
+    # Rows without a symbol get no features; they are few, so their block is redone whole
+    redo_unknown = n_new_known < len(new_rows) or rematch[n_known:].any()
+    if redo_unknown:
+        blocks.append((n_known, len(panel), n_new_known, len(new_rows)))
+
+    date_keys = _date_keys(panel['accepted_date'])
+    future_keys = _date_keys(panel['future_date'])
+    new_keys = _date_keys(new_rows['acceptedDate'])
+    no_change = np.iinfo(np.int64).max
+    depth = feature_depth(feature_spec)
+    starts, contexts = [], []
+    for i, (lo, hi, new_lo, new_hi) in enumerate(blocks):
+        if redo_unknown and i == len(blocks) - 1:
+            start = lo
+        else:
+            # First row the delta changes: where the earliest new filing sorts in (after old
+            # rows of the same date), a re-matched row, or a row whose forward price could
+            # now come from a new or re-matched filing
+            first_change = min(new_keys[new_lo:new_hi].min(initial=no_change),
+                               date_keys[lo:hi][rematch[lo:hi]].min(initial=no_change))
+            changed = rematch[lo:hi] | (future_keys[lo:hi] >= first_change)
+            start = lo + int(np.searchsorted(date_keys[lo:hi], first_change, side='right'))
+            if changed.any():
+                start = min(start, lo + int(changed.argmax()))
+        starts.append(start)
+        contexts.append(max(start - depth, lo))
+
+    # Old rows of every affected symbol from its context rows on, then the new filings
+    rows = np.concatenate([np.arange(context, hi) for context, (_, hi, _, _) in zip(contexts, blocks)]
+                          + [np.zeros(0, dtype=np.intp)])
+    is_context = np.concatenate([np.arange(context, hi) < start
+                                 for context, start, (_, hi, _, _) in zip(contexts, starts, blocks)]
+                                + [np.zeros(0, dtype=bool)])
+    history = panel.iloc[rows][base_cols].reset_index(drop=True)
+
+    rematched = rematch[rows]
+    if rematched.any():
+        matched = merge_sp500(history.loc[rematched, financial_cols].assign(_row=np.flatnonzero(rematched)), sp_df)
+        matched = matched.set_index('_row').loc[np.flatnonzero(rematched)]
+        for col in base_cols:
+            if col not in financial_cols:
+                history.loc[rematched, col] = matched[col].to_numpy()
+
+    # Growth rates forward-fill their sources from the symbol's start: carry each source's
+    # last value before the context rows into the first context row
+    sources = list(dict.fromkeys(source for source, _ in feature_spec.get('growth', {}).values()))
+    first_rows = np.cumsum([0] + [hi - context for context, (_, hi, _, _) in zip(contexts, blocks)])[:-1]
+    for source in sources:
+        values = panel[source].to_numpy(dtype=float)
+        column = history[source].to_numpy(dtype=float, copy=True)
+        for first, context, (lo, _, _, _) in zip(first_rows.tolist(), contexts, blocks):
+            if context > lo and np.isnan(column[first]):
+                row = context - 1
+                while row > lo and np.isnan(values[row]):
+                    row -= 1
+                column[first] = values[row]
+        history[source] = column
+
+    history = pd.concat([history.assign(_context=is_context), new_rows[base_cols].assign(_context=False)],
+                        ignore_index=True)
+    recomputed = add_target_and_features(history, horizon_days=state['horizon_days'], feature_spec=feature_spec)
+    recomputed = pd.concat([recomputed, _future_prices(recomputed, state['horizon_days'])], axis=1)
+    recomputed = recomputed.loc[~recomputed['_context'], panel.columns]
+
+    # Splice each symbol's recomputed rows (in the same symbol order) over its old rows
+    # from `start` on; the rows in between are taken over as they are
+    combined = pd.concat([panel, recomputed], ignore_index=True)
+    take, previous, offset = [], 0, len(panel)
+    for start, (lo, hi, new_lo, new_hi) in zip(starts, blocks):
+        size = hi - start + new_hi - new_lo
+        take += [np.arange(previous, start), np.arange(offset, offset + size)]
+        previous, offset = hi, offset + size
+    take.append(np.arange(previous, len(panel)))
+    panel = combined.take(np.concatenate(take))
+    return {
+        **state,
+        'panel': panel.reset_index(drop=True),
+        'last_adj_close': last_adj_close,
+        'sp_last_date': max(sp_last_date, state['sp_last_date']),
+    }
+
+
+def finalize_incremental_state(state: dict, universe: pd.DataFrame) -> pd.DataFrame:
+    """
+    Produce final_df from the state, exactly as preprocess() builds it from the same filings:
+    the forward-price merge order, final returns, cleaning and universe filters.
+    """
+    df = state['panel'].dropna(subset=['accepted_date']).copy()
+    df['target_date'] = df['accepted_date'] + pd.Timedelta(days=state['horizon_days'])
+    df_model = df.sort_values('target_date', kind='mergesort').reset_index(drop=True)
+    df_model = calculate_final_returns(df_model)
+    final_df = clean_final_df(df_model)
+    return apply_universe_filters(final_df, universe)
+
+
+def save_incremental_state(state: dict, directory: str):
+    """Persist the state as Parquet files plus a small JSON manifest."""
+    os.makedirs(directory, exist_ok=True)
+    state['panel'].to_parquet(os.path.join(directory, 'panel.parquet'))
+    state['last_adj_close'].rename('Adj Close').to_frame().to_parquet(
+        os.path.join(directory, 'last_adj_close.parquet'))
+    with open(os.path.join(directory, 'state.json'), 'w') as f:
+        json.dump({'sp_last_date': str(state['sp_last_date']), 'horizon_days': state['horizon_days'],
+                   'feature_spec': state['feature_spec'], 'ratio_spec': state['ratio_spec']}, f)
+
+
+def load_incremental_state(directory: str) -> dict:
+    """Load a state written by save_incremental_state."""
+    with open(os.path.join(directory, 'state.json')) as f:
+        meta = json.load(f)
+    meta['feature_spec']['growth'] = {name: tuple(source) for name, source in meta['feature_spec']['growth'].items()}
+    return {
+        'panel': pd.read_parquet(os.path.join(directory, 'panel.parquet')),
+        'last_adj_close': pd.read_parquet(os.path.join(directory, 'last_adj_close.parquet'))['Adj Close'],
+        'sp_last_date': pd.Timestamp(meta['sp_last_date']),
+        'horizon_days': meta['horizon_days'],
+        'feature_spec': meta['feature_spec'],
+        'ratio_spec': [tuple(entry) for entry in meta.get('ratio_spec', RATIO_SPEC)],
+    }
@@ -0,0 +1,198 @@
+# src/ingestion.py
+import numpy as np
+import pandas as pd
+
+# Declared schemas for the three input files. 'columns' maps every column the pipeline
+# reads to its dtype (None lets pandas infer it); 'ratio' lists inputs that may be
+# downcast to float32. Columns outside the schema are only loaded with columns='all'.
+FINANCIAL_SCHEMA = {
+    'columns': {
+        'symbol_stock': 'category',
+        'Sector': 'category',
+        'acceptedDate': 'object',
+        'quarter_number': None,
+        'Adj Close': 'float64',
+        'totalCurrentLiabilities': 'float64',
+        'totalLiabilities': 'float64',
+        'totalLiabilitiesAndTotalEquity': 'float64',
+        'netIncome_x': 'float64',
+        'totalAssets': 'float64',
+        'totalInvestments': 'float64',
+        'totalDebt': 'float64',
+        'netDebt': 'float64',
+        'freeCashFlow': 'float64',
+        'operatingCashFlow': 'float64',
+        'revenue': 'float64',
+        'costOfRevenue': 'float64',
+        'inventory_x': 'float64',
+        'operatingIncome': 'float64',
+        'interestExpense': 'float64',
+        'longTermInvestments': 'float64',
+        'dividendsPaid': 'float64',
+        'totalCurrentAssets': 'float64',
+        'cashAndShortTermInvestments': 'float64',
+        'capitalExpenditure': 'float64',
+        'taxAssets': 'float64',
+        'deferredRevenue': 'float64',
+        'goodwillAndIntangibleAssets': 'float64',
+        'sellingAndMarketingExpenses': 'float64',
+        'researchAndDevelopmentExpenses': 'float64',
+        'totalStockholdersEquity': 'float64',
+        'weightedAverageShsOut': 'float64',
+        'eps': 'float64',
+        'epsdiluted': 'float64',
+        'ebitda': 'float64',
+    },
+    'ratio': ['grossProfitRatio', 'ebitdaratio', 'operatingIncomeRatio',
+              'incomeBeforeTaxRatio', 'netIncomeRatio'],
+}
+
+SP500_SCHEMA = {
+    'columns': {
+        'Date': 'object',
+        'Close': 'float64',
+    },
+    'ratio': [],
+}
+
+STOCK_PRICES_SCHEMA = {
+    'columns': {
+        'Stock': 'category',
+        'Adj Close': 'float64',
+        'Volume': 'float64',
+    },
+    'ratio': [],
+}
+
+
+def _schema_read_args(filepath: str, schema: dict, columns: str, float32: bool):
+    """The usecols and dtype arguments of pd.read_csv for a schema, after checking the header."""
+    if columns not in ('all', 'pipeline'):
+        raise ValueError(f"columns must be 'all' or 'pipeline', got {columns!r}")
+
+    header = pd.read_csv(filepath, nrows=0).columns
+    missing = [col for col in schema['columns'] if col not in header]
+    if missing:
+        raise KeyError(f"{filepath} is missing schema columns: {missing}")
+
+    usecols = list(header) if columns == 'all' else [col for col in header if col in schema['columns']]
+    dtype = {col: t for col, t in schema['columns'].items() if t is not None and col in usecols}
+    if float32:
+        dtype.update({col: 'float32' for col in schema['ratio'] if col in usecols})
+    return usecols, dtype
+
+
+def count_csv_rows(filepath: str) -> int:
+    """Number of data rows in a CSV file, counted from its newlines without parsing it."""
+    newlines, last = 0, b'\n'
+    with open(filepath, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            newlines += block.count(b'\n')
+            last = block[-1:]
+    return max(newlines + (last != b'\n') - 1, 0)
+
+
+def _common_dtype(a: np.dtype, b: np.dtype) -> np.dtype:
+    """The dtype pd.concat gives two chunks of a column: numeric types widen, anything else is object."""
+    if a.kind in 'iuf' and b.kind in 'iuf':
+        return np.result_type(a, b)
+    return np.dtype(object)
+
+
+def read_csv_with_schema(filepath: str, schema: dict, columns: str = 'all', float32: bool = False,
+                         chunksize: int = 100_000) -> pd.DataFrame:
+    """
+    Read a CSV file with the dtypes declared in its schema.
+
+    The file is parsed in chunks of `chunksize` rows so the parser's object buffers never
+    hold more than one chunk. Each chunk is copied into columns preallocated for the
+    file's row count and then released, so the data is never held twice as a list of
+    chunks and their concatenation. Categorical columns are stored as codes into one
+    growing category list per column and get sorted categories, which keeps sort order
+    identical to the plain string columns.
+
+    Parameters:
+        filepath: Path to the CSV file.
+        schema: One of the *_SCHEMA dictionaries above.
+        columns: 'all' to load every column in the file, or 'pipeline' to load only the schema's columns.
+        float32: Downcast the schema's ratio inputs to float32.
+        chunksize: Number of rows parsed at a time.
+
+    Returns:
+        The loaded DataFrame, with string identifiers stored as categoricals.
+    """
+    usecols, dtype = _schema_read_args(filepath, schema, columns, float32)
+    # Quoted newlines can only make the count larger than the number of rows
+    capacity = count_csv_rows(filepath)
+    data, categories, n = {}, {}, 0
+    for chunk in pd.read_csv(filepath, usecols=usecols, dtype=dtype, chunksize=chunksize):
+        rows = slice(n, n + len(chunk))
+        for col, series in chunk.items():
+            if isinstance(series.dtype, pd.CategoricalDtype):
+                # Codes into the column's categories in order of appearance; -1 stays missing
+                known = categories.setdefault(col, {})
+                mapping = np.array([known.setdefault(category, len(known)) for category in series.cat.categories]
+                                   + [-1], dtype=np.int64)
+                values = mapping[series.cat.codes]
+            else:
+                values = series.to_numpy()
+            if col not in data:
+                data[col] = np.empty(capacity, dtype=values.dtype)
+            elif data[col].dtype != values.dtype:
+                data[col] = data[col].astype(_common_dtype(data[col].dtype, values.dtype))
+            data[col][rows] = values
+        n += len(chunk)
+    if not data:
+        return pd.read_csv(filepath, usecols=usecols, dtype=dtype)
+
+    for col in data:
+        values = data[col] if n == capacity else data[col][:n].copy()
+        if col in categories:
+            names = np.array(list(categories[col]), dtype=object)
+            order = np.argsort(names, kind='stable')
+            rank = np.empty(len(names), dtype=np.int64)
+            rank[order] = np.arange(len(names))
+            values = pd.Categorical.from_codes(np.where(values >= 0, rank[np.maximum(values, 0)], -1),
+                                               categories=names[order])
+        data[col] = values
+    # copy=False keeps the columns as they are instead of consolidating them into 2-D blocks
+    return pd.DataFrame(data, copy=False)
+
+
+def iter_csv_with_schema(filepath: str, schema: dict, columns: str = 'all', float32: bool = False,
+                         chunksize: int = 100_000):
+    """
+    Yield a CSV file in chunks of `chunksize` rows with the dtypes declared in its schema.
+    Categorical columns are read as plain strings, since the categories of separate chunks
+    would not agree.
+    """
+    usecols, dtype = _schema_read_args(filepath, schema, columns, float32)
+    dtype = {col: 'object' if t == 'category' else t for col, t in dtype.items()}
+    yield from pd.read_csv(filepath, usecols=usecols, dtype=dtype, chunksize=chunksize)
+
+
+def parse_two_digit_year_dates(dates: pd.Series, max_year: int = 2025) -> pd.Series:
+    """
+    Vectorized equivalent of date_parser for a whole column of "%m/%d/%y" strings.
+    Years after max_year are moved back one century.
+    """
+    parsed = pd.to_datetime(dates, format="%m/%d/%y")
+    shift = parsed.dt.year > max_year
+    if shift.any():
+        shifted = parsed[shift]
+        parsed[shift] = pd.to_datetime(pd.DataFrame({
+            'year': shifted.dt.year - 100,
+            'month': shifted.dt.month,
+            'day': shifted.dt.day,
+        }))
+    return parsed
+
+
+def restore_string_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Convert categorical columns back to plain object strings, matching the dtypes a
+    plain pd.read_csv load would have produced.
+    """
+    for col in df.columns[df.dtypes.apply(lambda t: isinstance(t, pd.CategoricalDtype))]:
+        df[col] = df[col].astype(object)
+    return df
@@ -1,4 +1,5 @@
 import os
+from functools import partial
 import pandas as pd
 import numpy as np
 import logging
@@ -12,46 +13,90 @@ from src.preprocessing import (
     merge_with_future_prices,
     calculate_final_returns,
     clean_final_df,
-    load_stock_prices,
-    add_market_cap_categories,
-    filter_stock_prices,
-    filter_final_data_by_symbols
+    FEATURE_SPEC,
+    RATIO_SPEC,
+    select_universe,
+    apply_universe_filters
 )
+from src.cache import StageCache
+from src.profiling import StageProfiler
+from src.sharding import preprocess_sharded
+from src.feature_matrix import export_feature_matrix
+from src.ingestion import restore_string_columns
+from src.price_store import load_price_history, add_price_targets
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
-def preprocess() -> pd.DataFrame:
+def preprocess(cache_dir: str = os.path.join("data", ".stage_cache"), refresh: bool = False,
+               max_cache_bytes: int = 2 * 1024 ** 3, profile_path: str = None,
+               data_dir: str = "data", profiler: StageProfiler = None, n_shards: int = 1,
+               n_jobs: int = None, export_dir: str = None, export_features: list = None,
+               horizons: tuple = None) -> pd.DataFrame:
+    """
+    Run the full preprocessing pipeline. Every stage's output is cached in cache_dir,
+    keyed by the input file contents, stage parameters and stage version, so a rerun
+    loads the latest unchanged stage instead of recomputing. Pass cache_dir=None to
+    disable caching or refresh=True to recompute and overwrite the cache.
+
+    Pass profile_path to record per-stage timings, memory and row/NaN counts: the
+    report is logged as a table and written to profile_path as JSON. A StageProfiler
+    passed as profiler collects the same records for the caller instead.
+    The input CSVs are read from data_dir.
+
+    With n_shards > 1 the per-symbol stages run as one 'preprocess_sharded' stage: the
+    symbols are hash-partitioned into n_shards and processed by n_jobs worker processes
+    (default n_shards). The result is identical to the single-process pipeline, so the
+    cached output is shared between shard counts.
+
+    Pass export_dir to also write the final features (export_features, default every
+    non-outcome numeric column) as a memory-mapped float32 matrix for FeatureMatrix.
+
+    Pass horizons (e.g. src.price_store.HORIZONS) to also add forward-return targets for
+    each horizon in days from the daily prices of adjclose_stock.csv (add_forward_targets).
+    """
     # Define file paths
-    financial_filepath = os.path.join("data", "merged_fullstock_data.csv")
-    sp500_filepath = os.path.join("data", "sp.csv")
-    stock_prices_filepath = os.path.join("data", "adjclose_stock.csv")
+    financial_filepath = os.path.join(data_dir, "merged_fullstock_data.csv")
+    sp500_filepath = os.path.join(data_dir, "sp.csv")
+    stock_prices_filepath = os.path.join(data_dir, "adjclose_stock.csv")
+
+    if profiler is None and profile_path is not None:
+        profiler = StageProfiler()
+    cache = StageCache(cache_dir, max_bytes=max_cache_bytes, refresh=refresh, profiler=profiler)
     
     # Load raw data
-    df = load_financial_data(financial_filepath)
-    sp_df = load_sp500_data(sp500_filepath)
-    
-    # Preprocess financial data
-    df = fix_financial_columns(df)
-    df = calculate_financial_metrics(df)
-    df = merge_sp500(df, sp_df)
-    df = add_target_and_features(df)
-    df_model = merge_with_future_prices(df)
-    df_model = calculate_final_returns(df_model)
-    final_df = clean_final_df(df_model)
+    df = cache.stage(load_financial_data, cache.file(financial_filepath), version=2)
+    sp_df = cache.stage(load_sp500_data, cache.file(sp500_filepath), version=2)
     
     # Load and process stock prices for market cap filtering
-    sp_prices_df = load_stock_prices(stock_prices_filepath)
-    sp_prices_df = add_market_cap_categories(sp_prices_df)
-    filtered_stock_prices = filter_stock_prices(sp_prices_df)
-    symbols_to_keep = filtered_stock_prices['Stock'].unique().tolist()
-    final_df = filter_final_data_by_symbols(final_df, symbols_to_keep)
-    
-    # Additional filtering based on criteria
-    final_df = final_df[final_df.groupby('symbol_stock')['quarter_number'].transform(lambda x: (x > 20).any())]
-    final_df = final_df.reset_index(drop=True)
+    universe = cache.stage(select_universe, cache.file(stock_prices_filepath), version=3)
+
+    if n_shards > 1:
+        sharded = partial(preprocess_sharded, n_shards=n_shards, n_jobs=n_jobs)
+        final_df = cache.stage(sharded, df, sp_df, universe, name='preprocess_sharded',
+                               horizon_days=90, feature_spec=FEATURE_SPEC, ratio_spec=RATIO_SPEC)
+    else:
+        # Preprocess financial data
+        df = cache.stage(fix_financial_columns, df)
+        df = cache.stage(calculate_financial_metrics, df, ratio_spec=RATIO_SPEC)
+        df = cache.stage(merge_sp500, df, sp_df, version=2)
+        df = cache.stage(add_target_and_features, df, horizon_days=90, feature_spec=FEATURE_SPEC)
+        df_model = cache.stage(merge_with_future_prices, df, version=2)
+        df_model = cache.stage(calculate_final_returns, df_model)
+        final_df = cache.stage(clean_final_df, df_model)
+        final_df = cache.stage(apply_universe_filters, final_df, universe)
+    if horizons:
+        prices = cache.stage(load_price_history, cache.file(stock_prices_filepath))
+        final_df = cache.stage(add_price_targets, final_df, prices, sp_df, horizons=list(horizons))
+    final_df = restore_string_columns(cache.result(final_df))
+    if export_dir is not None:
+        manifest = export_feature_matrix(final_df, export_dir, features=export_features)
+        logging.info("Exported a %d x %d float32 feature matrix to %s",
+                     manifest['n_rows'], len(manifest['features']), export_dir)
 
-    final_df = final_df[final_df.groupby('symbol_stock')['Adj Close'].transform(lambda x: (x > 14).any())]
-    final_df = final_df.reset_index(drop=True)
+    logging.info("Stage cache report:\n%s", cache.report().to_string(index=False))
+    if profile_path is not None:
+        profiler.to_json(profile_path)
+        logging.info("Stage profile (written to %s):\n%s", profile_path, profiler.table())
     
     # Return the DataFrame
     return final_df
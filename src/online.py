@@ -0,0 +1,335 @@
+# src/online.py
+import json
+import math
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+from src.preprocessing import (
+    fix_financial_columns,
+    calculate_financial_metrics,
+    merge_sp500,
+    add_target_and_features,
+    feature_depth,
+    FEATURE_SPEC,
+    RATIO_SPEC
+)
+
+
+class _SymbolState:
+    """
+    Per-symbol state of an OnlineFeatureStore: ring buffers with the last `depth` rows of
+    the lag/rolling inputs and of the forward-filled growth sources, the forward-fill
+    carry, the row count, the last 'Adj Close' (for log_return) and the last filing date.
+    """
+
+    __slots__ = ('inputs', 'filled', 'last_filled', 'count', 'last_adj_close', 'last_date')
+
+    def __init__(self, depth: int, n_inputs: int, n_sources: int):
+        self.inputs = np.full((depth, n_inputs), np.nan)
+        self.filled = np.full((depth, n_sources), np.nan)
+        self.last_filled = np.full(n_sources, np.nan)
+        self.count = 0
+        self.last_adj_close = np.nan
+        self.last_date = None
+
+
+def _float(value) -> float:
+    return np.nan if value is None else float(value)
+
+
+def _divide(a: float, b: float) -> float:
+    """a / b with NumPy's float semantics (x / 0 is +-inf, 0 / 0 is NaN) on plain floats."""
+    if b == 0:
+        return np.nan if a == 0 or a != a else math.copysign(math.inf, a) * math.copysign(1.0, b)
+    return a / b
+
+
+class OnlineFeatureStore:
+    """
+    Computes the features of one new filing from compact per-symbol state instead of
+    rerunning preprocess() over the whole history.
+
+    For each filing, update() applies fix_financial_columns, the RATIO_SPEC ratios, the
+    backward S&P asof match and every growth, lag and rolling feature of the feature
+    spec, giving the same values as the batch pipeline (rolling means agree to float
+    rounding). Each symbol only keeps the last max(lag, window, growth period) rows of the
+    inputs those features read, in a ring buffer.
+
+    Filings of a symbol must arrive in accepted_date order, as they do when they are
+    appended to merged_fullstock_data.csv; an older filing raises ValueError.
+
+    Parameters:
+        sp_df: The S&P500 data (load_sp500_data); extend it with set_sp_data.
+        feature_spec: The growth/lag/rolling spec (see FEATURE_SPEC).
+        ratio_spec: The ratio spec (see RATIO_SPEC).
+        horizon_days: Days from accepted_date to target_date.
+    """
+
+    def __init__(self, sp_df: pd.DataFrame, feature_spec: dict = FEATURE_SPEC, ratio_spec: list = RATIO_SPEC,
+                 horizon_days: int = 90):
+        self.feature_spec = feature_spec
+        self.ratio_spec = ratio_spec
+        self.horizon = pd.Timedelta(days=horizon_days)
+
+        self.growth = list(feature_spec.get('growth', {}).items())
+        self.sources = list(dict.fromkeys(source for _, (source, _) in self.growth))
+        lags = feature_spec.get('lags') or {'columns': [], 'periods': []}
+        rolling = feature_spec.get('rolling') or {'columns': [], 'windows': []}
+        self.inputs = list(dict.fromkeys(lags['columns'] + rolling['columns']))
+        position = [self.inputs.index(col) for col in lags['columns']]
+        # name -> column lookups grouped by period/window, so each reads the buffer once
+        self.growth_index = [(name, self.sources.index(source), p) for name, (source, p) in self.growth]
+        self.lag_index = {p: ([f'{col}_lag{p}' for col in lags['columns']], position) for p in lags['periods']}
+        position = [self.inputs.index(col) for col in rolling['columns']]
+        self.rolling_index = {w: ([f'{col}_roll{w}' for col in rolling['columns']], position)
+                              for w in rolling['windows']}
+        self.depth = feature_depth(feature_spec)
+        self._lookback = np.arange(1, self.depth + 1)
+
+        self.states = {}
+        self.set_sp_data(sp_df)
+
+    def set_sp_data(self, sp_df: pd.DataFrame):
+        """Replace the S&P series the filings are asof-matched against (e.g. after new trading days)."""
+        sp_df = sp_df.sort_values('acceptedDate', kind='mergesort')
+        self.sp_dates = pd.to_datetime(sp_df['acceptedDate'], errors='coerce').to_numpy(dtype='datetime64[ns]')
+        self.sp_columns = [col for col in sp_df.columns if col != 'acceptedDate']
+        self.sp_values = [sp_df[col].to_numpy() for col in self.sp_columns]
+
+    @classmethod
+    def from_history(cls, financial_df: pd.DataFrame, sp_df: pd.DataFrame, feature_spec: dict = FEATURE_SPEC,
+                     ratio_spec: list = RATIO_SPEC, horizon_days: int = 90) -> 'OnlineFeatureStore':
+        """Build a store whose state is the end of the given filing history (load_financial_data)."""
+        store = cls(sp_df, feature_spec=feature_spec, ratio_spec=ratio_spec, horizon_days=horizon_days)
+        last_adj_close = financial_df.drop_duplicates('symbol_stock', keep='last').set_index('symbol_stock')['Adj Close']
+
+        df = calculate_financial_metrics(fix_financial_columns(financial_df.copy()), ratio_spec)
+        panel = add_target_and_features(merge_sp500(df, sp_df.copy()), horizon_days=horizon_days,
+                                        feature_spec=feature_spec)
+        panel = panel.dropna(subset=['symbol_stock'])
+        filled = panel.groupby('symbol_stock', observed=True)[store.sources].ffill()
+        counts = panel.groupby('symbol_stock', observed=True).size()
+        tail = panel.groupby('symbol_stock', observed=True).tail(store.depth).index
+
+        inputs = panel.loc[tail, store.inputs].to_numpy(dtype=float)
+        sources = filled.loc[tail].to_numpy(dtype=float)
+        symbols = panel.loc[tail, 'symbol_stock'].astype(object).to_numpy()
+        dates = panel.loc[tail, 'accepted_date'].to_numpy()
+        bounds = np.flatnonzero(np.r_[True, symbols[1:] != symbols[:-1], True])
+        for lo, hi in zip(bounds[:-1], bounds[1:]):
+            symbol = symbols[lo]
+            state = _SymbolState(store.depth, len(store.inputs), len(store.sources))
+            state.inputs[:hi - lo] = inputs[lo:hi]
+            state.filled[:hi - lo] = sources[lo:hi]
+            state.last_filled = sources[hi - 1].copy()
+            state.count = int(counts[symbol])
+            # Rows were placed at 0..n-1; rebase so that the next write goes to count % depth
+            shift = state.count % store.depth - (hi - lo) % store.depth
+            state.inputs = np.roll(state.inputs, shift, axis=0)
+            state.filled = np.roll(state.filled, shift, axis=0)
+            state.last_adj_close = _float(last_adj_close.get(symbol))
+            state.last_date = pd.Timestamp(dates[hi - 1])
+            store.states[symbol] = state
+        return store
+
+    def _sp_row(self, accepted_date: pd.Timestamp) -> dict:
+        i = -1 if pd.isna(accepted_date) else \
+            np.searchsorted(self.sp_dates, accepted_date.to_datetime64(), side='right') - 1
+        return {col: values[i] if i >= 0 else np.nan for col, values in zip(self.sp_columns, self.sp_values)}
+
+    def update(self, filing: dict, commit: bool = True) -> dict:
+        """
+        The pipeline row of one new filing: its fields, the fixed columns, the ratios, the
+        matched S&P columns, accepted_date/target_date and every derived feature.
+        With commit=False the symbol's state is left unchanged (a what-if score).
+        """
+        row = dict(filing)
+        symbol = row['symbol_stock']
+        state = self.states.get(symbol)
+        if state is None:
+            state = _SymbolState(self.depth, len(self.inputs), len(self.sources))
+
+        try:
+            accepted_date = pd.Timestamp(row.get('acceptedDate'))
+        except (ValueError, TypeError):
+            accepted_date = pd.NaT
+        if state.last_date is not None and accepted_date < state.last_date:
+            raise ValueError(f"Filing of {symbol} dated {accepted_date} is older than its last filing "
+                             f"({state.last_date}); the online store only appends")
+
+        # fix_financial_columns
+        if math.isnan(_float(row.get('totalCurrentLiabilities'))):
+            row['totalCurrentLiabilities'] = row.get('totalLiabilities')
+        row['totalEquity'] = _float(row.get('totalLiabilitiesAndTotalEquity')) - _float(row.get('totalLiabilities'))
+
+        # calculate_financial_metrics, one scalar at a time
+        for name, op, left, right in self.ratio_spec:
+            a = _float(row.get(left))
+            if op == 'log_return':
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    row[name] = float(np.log(np.float64(_divide(a, state.last_adj_close))))
+                continue
+            b = _float(row.get(right))
+            if op == '/':
+                row[name] = _divide(a, b)
+            elif op == '/nonzero':
+                row[name] = _divide(a, b) if b != 0 else np.nan
+            elif op == '-':
+                row[name] = a - b
+            else:
+                raise ValueError(f"Unknown ratio operation {op!r} for {name!r}")
+
+        # merge_sp500: backward asof match; clashing names get the '_sp' suffix
+        for col, value in self._sp_row(accepted_date).items():
+            row[f'{col}_sp' if col in row else col] = value
+        row['accepted_date'] = accepted_date
+        row['target_date'] = accepted_date + self.horizon
+
+        # compute_group_features from the ring buffers. Slots never written are NaN, so
+        # reading further back than a symbol's history gives NaN just like the batch shift.
+        pos = state.count % self.depth
+        inputs = np.array([_float(row.get(col)) for col in self.inputs])
+        values = np.array([_float(row.get(col)) for col in self.sources])
+        filled = np.where(np.isnan(values), state.last_filled, values)
+        back = (pos - self._lookback) % self.depth  # slots of rows t-1, t-2, ..., t-depth
+        with np.errstate(divide='ignore', invalid='ignore'):
+            previous = state.filled[back]
+            for name, j, periods in self.growth_index:
+                row[name] = float(filled[j] / previous[periods - 1, j] - 1)
+
+            history = state.inputs[back]
+            for periods, (names, columns) in self.lag_index.items():
+                row.update(zip(names, history[periods - 1, columns].tolist()))
+
+            # Trailing sums and counts over rows t, t-1, ...; pandas rolling means skip
+            # NaN and infinite values
+            block = np.concatenate([inputs[None], history[:-1]])
+            finite = np.isfinite(block)
+            sums = np.where(finite, block, 0).cumsum(axis=0)
+            counts = finite.cumsum(axis=0)
+            for window, (names, columns) in self.rolling_index.items():
+                row.update(zip(names, (sums[window - 1, columns] / counts[window - 1, columns]).tolist()))
+
+        if commit:
+            state.inputs[pos] = inputs
+            state.filled[pos] = filled
+            state.last_filled = filled
+            state.count += 1
+            state.last_adj_close = _float(row.get('Adj Close'))
+            state.last_date = accepted_date
+            self.states[symbol] = state
+        return row
+
+
+class OnlineScorer:
+    """
+    Scores single filings: OnlineFeatureStore features, an optional fitted Winsorizer,
+    then the model's predict_proba. The model must have been trained on `features` in
+    that order. Calls are serialized with a lock, so one scorer can back a threaded server.
+    """
+
+    def __init__(self, store: OnlineFeatureStore, model, features: list, winsorizer=None, threshold: float = 0.5):
+        self.store = store
+        self.model = model
+        self.features = list(features)
+        self.winsorizer = winsorizer
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        if winsorizer is not None:
+            self._win_columns = [self.features.index(col) for col in winsorizer.columns]
+
+    def score(self, filing: dict, commit: bool = True) -> dict:
+        with self._lock:
+            row = self.store.update(filing, commit=commit)
+        X = np.array([[_float(row.get(col)) for col in self.features]])
+        X[~np.isfinite(X)] = np.nan
+        if self.winsorizer is not None:
+            X[:, self._win_columns] = self.winsorizer.clip_array(X[:, self._win_columns])
+        proba = float(self.model.predict_proba(X)[0, 1])
+        return {
+            'symbol_stock': row['symbol_stock'],
+            'accepted_date': str(row['accepted_date']),
+            'proba': proba,
+            'predicted_signal': int(proba >= self.threshold),
+        }
+
+
+def _json_value(value):
+    """A JSON-serializable copy of a response value: NaN, infinities and missing values become null."""
+    if isinstance(value, dict):
+        return {key: _json_value(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_json_value(item) for item in value]
+    if value is None or (pd.api.types.is_scalar(value) and pd.isna(value)):
+        return None
+    if isinstance(value, pd.Timestamp):
+        return str(value)
+    if isinstance(value, (bool, np.bool_)):
+        return bool(value)
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    if isinstance(value, (float, np.floating)):
+        return float(value) if math.isfinite(value) else None
+    return value
+
+
+def make_server(scorer: OnlineScorer, host: str = '127.0.0.1', port: int = 8000) -> ThreadingHTTPServer:
+    """
+    A local HTTP server for a scorer (call serve_forever() on it):
+      POST /score     body: one filing as JSON -> the OnlineScorer.score result
+      POST /features  body: one filing as JSON -> the feature row, without changing state
+    Responses are JSON with NaN and infinite values as null. A body that is not a JSON
+    object, or a filing the store rejects, gets a 400 response with an 'error' message.
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            try:
+                filing = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                if not isinstance(filing, dict):
+                    raise ValueError(f"The request body must be a JSON object, got {type(filing).__name__}")
+                if self.path == '/score':
+                    body = scorer.score(filing)
+                elif self.path == '/features':
+                    with scorer._lock:
+                        body = scorer.store.update(filing, commit=False)
+                else:
+                    self.send_error(404)
+                    return
+                status = 200
+            except (ValueError, KeyError, TypeError) as e:
+                body, status = {'error': str(e)}, 400
+            payload = json.dumps(_json_value(body), allow_nan=False).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    return ThreadingHTTPServer((host, port), Handler)
+
+
+def latency_benchmark(call, payloads: list) -> dict:
+    """
+    Call `call(payload)` once per payload and report throughput and latency percentiles,
+    in seconds like the benchmark.py results.
+    """
+    latencies = np.empty(len(payloads))
+    start = time.perf_counter()
+    for i, payload in enumerate(payloads):
+        t = time.perf_counter()
+        call(payload)
+        latencies[i] = time.perf_counter() - t
+    total = time.perf_counter() - start
+    return {
+        'calls': len(payloads),
+        'throughput_per_s': len(payloads) / total if total > 0 else np.nan,
+        'p50_s': float(np.percentile(latencies, 50)),
+        'p99_s': float(np.percentile(latencies, 99)),
+        'max_s': float(latencies.max()),
+    }
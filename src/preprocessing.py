@@ -1,11 +1,27 @@
 # src/preprocessing.py
+import logging
 import os
 import pandas as pd
 import numpy as np
+from pandas.api.indexers import BaseIndexer
+from src.ingestion import (
+    FINANCIAL_SCHEMA,
+    SP500_SCHEMA,
+    STOCK_PRICES_SCHEMA,
+    read_csv_with_schema,
+    parse_two_digit_year_dates
+)
+from src.winsorizer import Winsorizer
+from src.price_store import GOOD_STOCK_THRESHOLD
 
-def load_financial_data(filepath: str) -> pd.DataFrame:
-    """Load financial data from a CSV file."""
-    return pd.read_csv(filepath)
+def load_financial_data(filepath: str, columns: str = 'all', float32: bool = False) -> pd.DataFrame:
+    """
+    Load financial data from a CSV file using the declared schema.
+    Symbols and sectors are loaded as categoricals; float32 downcasts the raw ratio inputs.
+    columns defaults to 'all' because final_df carries the raw columns outside the schema
+    (e.g. ebitdaratio), which the notebooks use as features; 'pipeline' loads only the schema's.
+    """
+    return read_csv_with_schema(filepath, FINANCIAL_SCHEMA, columns=columns, float32=float32)
 
 def fix_financial_columns(df: pd.DataFrame) -> pd.DataFrame:
     """
@@ -16,52 +32,73 @@ def fix_financial_columns(df: pd.DataFrame) -> pd.DataFrame:
     df['totalEquity'] = df['totalLiabilitiesAndTotalEquity'] - df['totalLiabilities']
     return df
 
-def calculate_financial_metrics(df: pd.DataFrame) -> pd.DataFrame:
-    """
-    Calculate various financial ratios and metrics.
-    """
-    df['ROE'] = df['netIncome_x'] / df['totalEquity']
-    df['ROA'] = df['netIncome_x'] / df['totalAssets']
-    df['ROI'] = df['netIncome_x'] / df['totalInvestments']
-    df['log_return'] = np.log(df['Adj Close'] / df.groupby('symbol_stock')['Adj Close'].shift(1))
-    
+# Declarative description of the ratios built by calculate_financial_metrics, in column order.
+# Each entry is (new column, operation, left column, right column):
+#   '/'          left / right
+#   '/nonzero'   left / right, with a zero right-hand side treated as NaN
+#   '-'          left - right
+#   'log_return' log of left over the symbol's previous left (right unused)
+# Later entries may use the columns of earlier ones.
+RATIO_SPEC = [
+    ('ROE', '/', 'netIncome_x', 'totalEquity'),
+    ('ROA', '/', 'netIncome_x', 'totalAssets'),
+    ('ROI', '/', 'netIncome_x', 'totalInvestments'),
+    ('log_return', 'log_return', 'Adj Close', None),
+
     # Debt ratios
-    df['debtToEquity'] = df['totalDebt'] / df['totalEquity']
-    df['netDebtRatio'] = df['netDebt'] / df['totalAssets']
-    df['debt_ratio'] = df['totalLiabilities'] / df['totalAssets']
-    
+    ('debtToEquity', '/', 'totalDebt', 'totalEquity'),
+    ('netDebtRatio', '/', 'netDebt', 'totalAssets'),
+    ('debt_ratio', '/', 'totalLiabilities', 'totalAssets'),
+
     # Cash flow ratios
-    df['free_cash_flow_yield'] = df['freeCashFlow'] / df['totalEquity']
-    df['Op_Cash_Flow_to_Revenue'] = df['operatingCashFlow'] / df['revenue']
-    df['Op_Cash_Flow_to_Liabilities'] = df['operatingCashFlow'] / df['totalCurrentLiabilities']
-    
+    ('free_cash_flow_yield', '/', 'freeCashFlow', 'totalEquity'),
+    ('Op_Cash_Flow_to_Revenue', '/', 'operatingCashFlow', 'revenue'),
+    ('Op_Cash_Flow_to_Liabilities', '/', 'operatingCashFlow', 'totalCurrentLiabilities'),
+
     # Inventory, interest, investment ratios
-    df['inventoryTurnover'] = df['costOfRevenue'] / df['inventory_x']
-    df['inventory_to_assets'] = df['inventory_x'] / df['totalAssets']
-    df['interest_coverage'] = df['operatingIncome'] / df['interestExpense']
-    df['longinvest_to_assets'] = df['longTermInvestments'] / df['totalAssets']
-    df['longinvest_to_equity'] = df['longTermInvestments'] / df['totalEquity']
-    df['totalInvestments_to_assets'] = df['totalInvestments'] / df['totalAssets']
-    
+    ('inventoryTurnover', '/', 'costOfRevenue', 'inventory_x'),
+    ('inventory_to_assets', '/', 'inventory_x', 'totalAssets'),
+    ('interest_coverage', '/', 'operatingIncome', 'interestExpense'),
+    ('longinvest_to_assets', '/', 'longTermInvestments', 'totalAssets'),
+    ('longinvest_to_equity', '/', 'longTermInvestments', 'totalEquity'),
+    ('totalInvestments_to_assets', '/', 'totalInvestments', 'totalAssets'),
+
     # Other important ratios
-    df['Profit_Margin'] = df['netIncome_x'] / df['revenue']
-    df['retained_earnings'] = df['netIncome_x'] - df['dividendsPaid']
-    df['re_ratio'] = df['retained_earnings'] / df['netIncome_x']
-    df['currentRatio'] = df['totalCurrentAssets'] / df['totalCurrentLiabilities']
-    df['cash_ratio'] = df['cashAndShortTermInvestments'] / df['totalCurrentLiabilities']
-    df['capital_light'] = df['capitalExpenditure'] / df['operatingCashFlow']
-    df['liabilitiesToEquity'] = df['totalLiabilities'] / df['totalEquity']
-    df['taxAssetsRatio'] = df['taxAssets'] / df['totalAssets']
-    df['Deferred_Revenue_to_Revenue'] = df['deferredRevenue'] / df['revenue'].replace(0, np.nan)
-    df['Deferred_Revenue_to_Current_Liabilities'] = df['deferredRevenue'] / df['totalCurrentLiabilities'].replace(0, np.nan)
-    df['goodwillIntangible_to_assets'] = df['goodwillAndIntangibleAssets'] / df['totalAssets']
-    df['sellingMarketing_to_revenue'] = df['sellingAndMarketingExpenses'] / df['revenue']
-    df['rnd_to_revenue'] = df['researchAndDevelopmentExpenses'] / df['revenue']
-    
+    ('Profit_Margin', '/', 'netIncome_x', 'revenue'),
+    ('retained_earnings', '-', 'netIncome_x', 'dividendsPaid'),
+    ('re_ratio', '/', 'retained_earnings', 'netIncome_x'),
+    ('currentRatio', '/', 'totalCurrentAssets', 'totalCurrentLiabilities'),
+    ('cash_ratio', '/', 'cashAndShortTermInvestments', 'totalCurrentLiabilities'),
+    ('capital_light', '/', 'capitalExpenditure', 'operatingCashFlow'),
+    ('liabilitiesToEquity', '/', 'totalLiabilities', 'totalEquity'),
+    ('taxAssetsRatio', '/', 'taxAssets', 'totalAssets'),
+    ('Deferred_Revenue_to_Revenue', '/nonzero', 'deferredRevenue', 'revenue'),
+    ('Deferred_Revenue_to_Current_Liabilities', '/nonzero', 'deferredRevenue', 'totalCurrentLiabilities'),
+    ('goodwillIntangible_to_assets', '/', 'goodwillAndIntangibleAssets', 'totalAssets'),
+    ('sellingMarketing_to_revenue', '/', 'sellingAndMarketingExpenses', 'revenue'),
+    ('rnd_to_revenue', '/', 'researchAndDevelopmentExpenses', 'revenue'),
+
     # Valuation metrics
-    df['Book_Value_per_share'] = df['totalStockholdersEquity'] / df['weightedAverageShsOut']
-    df['PE_ratio'] = df['Adj Close'] / df['eps'].replace(0, np.nan)
-    df['PB_ratio'] = df['Adj Close'] / df['Book_Value_per_share'].replace(0, np.nan)
+    ('Book_Value_per_share', '/', 'totalStockholdersEquity', 'weightedAverageShsOut'),
+    ('PE_ratio', '/nonzero', 'Adj Close', 'eps'),
+    ('PB_ratio', '/nonzero', 'Adj Close', 'Book_Value_per_share'),
+]
+
+def calculate_financial_metrics(df: pd.DataFrame, ratio_spec: list = RATIO_SPEC) -> pd.DataFrame:
+    """
+    Calculate various financial ratios and metrics, as declared in ratio_spec (see RATIO_SPEC).
+    """
+    for name, op, left, right in ratio_spec:
+        if op == '/':
+            df[name] = df[left] / df[right]
+        elif op == '/nonzero':
+            df[name] = df[left] / df[right].replace(0, np.nan)
+        elif op == '-':
+            df[name] = df[left] - df[right]
+        elif op == 'log_return':
+            df[name] = np.log(df[left] / df.groupby('symbol_stock', observed=True)[left].shift(1))
+        else:
+            raise ValueError(f"Unknown ratio operation {op!r} for {name!r}")
     return df
 
 def date_parser(date_str: str, max_year: int = 2025) -> pd.Timestamp:
@@ -78,8 +115,8 @@ def load_sp500_data(filepath: str) -> pd.DataFrame:
     """
     Load S&P500 data from a CSV file.
     """
-    df = pd.read_csv(filepath)
-    df['Date'] = df['Date'].apply(date_parser)
+    df = read_csv_with_schema(filepath, SP500_SCHEMA)
+    df['Date'] = parse_two_digit_year_dates(df['Date'])
     df = df[df['Date'] >= pd.Timestamp('1999-01-01')]
     df.rename(columns={'Date': 'acceptedDate'}, inplace=True)
     df['acceptedDate'] = pd.to_datetime(df['acceptedDate'])
@@ -88,63 +125,166 @@ def load_sp500_data(filepath: str) -> pd.DataFrame:
 def merge_sp500(df: pd.DataFrame, sp_df: pd.DataFrame) -> pd.DataFrame:
     """
     Merge the financial DataFrame with the S&P500 data using an asof merge.
-    Ensure both 'acceptedDate' columns are datetime types.
+    Ensure both 'acceptedDate' columns are datetime types. The sort is stable, so rows
+    with the same date keep their input order.
     """
     df['acceptedDate'] = pd.to_datetime(df['acceptedDate'], errors='coerce')
     sp_df['acceptedDate'] = pd.to_datetime(sp_df['acceptedDate'], errors='coerce')
     
     merged_df = pd.merge_asof(
-        df.sort_values('acceptedDate'),
-        sp_df.sort_values('acceptedDate'),
+        df.sort_values('acceptedDate', kind='mergesort'),
+        sp_df.sort_values('acceptedDate', kind='mergesort'),
         on='acceptedDate',
         direction='backward',
         suffixes=('', '_sp')
     )
     return merged_df
 
-def add_target_and_features(df: pd.DataFrame, horizon_days: int = 90) -> pd.DataFrame:
+LAG_FEATURES = ['ROE', 'ROA', 'free_cash_flow_yield', 're_ratio', 'Profit_Margin',
+                'debtToEquity', 'eps', 'epsdiluted', 'ebitda', 'goodwillIntangible_to_assets',
+                'sellingMarketing_to_revenue', 'totalInvestments_to_assets', 'rnd_to_revenue',
+                'inventory_to_assets']
+
+# Declarative description of the per-symbol features built by add_target_and_features.
+#   growth:  new column -> (source column, pct_change periods)
+#   lags:    f'{column}_lag{period}' for every column and period
+#   rolling: f'{column}_roll{window}' rolling means (min_periods=1) for every column and window
+FEATURE_SPEC = {
+    'growth': {
+        'revenue_growth_quarterly': ('revenue', 1),
+        'revenue_growth_annual': ('revenue', 4),
+        'eps_growth_quarterly': ('epsdiluted', 1),
+        'eps_growth_annual': ('epsdiluted', 4),
+    },
+    'lags': {'columns': LAG_FEATURES, 'periods': [1, 4]},
+    'rolling': {'columns': LAG_FEATURES, 'windows': [4, 8]},
+}
+
+def feature_column_names(spec: dict = FEATURE_SPEC) -> list:
+    """Names of the columns compute_group_features produces for a spec, in output order."""
+    names = list(spec.get('growth', {}))
+    if spec.get('lags'):
+        names += [f'{col}_lag{p}' for col in spec['lags']['columns'] for p in spec['lags']['periods']]
+    if spec.get('rolling'):
+        names += [f'{col}_roll{w}' for col in spec['rolling']['columns'] for w in spec['rolling']['windows']]
+    return names
+
+def feature_depth(spec: dict = FEATURE_SPEC) -> int:
+    """How many rows of a symbol's history the features of a row read: the longest growth period, lag or window."""
+    lags = spec.get('lags') or {'periods': []}
+    rolling = spec.get('rolling') or {'windows': []}
+    return max([periods for _, periods in spec.get('growth', {}).values()]
+               + list(lags['periods']) + list(rolling['windows']) + [1])
+
+class _GroupWindowIndexer(BaseIndexer):
+    """Trailing windows of `window_size` rows that never reach back past the start of the row's group."""
+
+    def get_window_bounds(self, num_values=0, min_periods=None, center=None, closed=None, step=None):
+        end = np.arange(1, num_values + 1, dtype=np.int64)
+        start = np.maximum(end - self.window_size, self.group_start)
+        return start, end
+
+def _shift_within_groups(values: np.ndarray, position: np.ndarray, periods: int) -> np.ndarray:
+    """Shift the rows of a 2D block down by `periods`, leaving NaN where that crosses a group start."""
+    shifted = np.full(values.shape, np.nan)
+    if periods < len(values):
+        shifted[periods:] = values[:len(values) - periods]
+    shifted[position < periods] = np.nan
+    return shifted
+
+def _ffill_within_groups(values: np.ndarray, group_start: np.ndarray) -> np.ndarray:
+    """Forward-fill NaNs in each column of a 2D block without carrying values across groups."""
+    rows = np.arange(len(values))[:, None]
+    last_valid = np.maximum.accumulate(np.where(np.isnan(values), -1, rows), axis=0)
+    filled = values[np.maximum(last_valid, 0), np.arange(values.shape[1])]
+    filled[last_valid < group_start[:, None]] = np.nan
+    return filled
+
+def compute_group_features(df: pd.DataFrame, spec: dict = FEATURE_SPEC,
+                           group_col: str = 'symbol_stock') -> pd.DataFrame:
+    """
+    Compute every growth, lag and rolling feature in `spec` in one pass.
+
+    The DataFrame must already be sorted by group and date. Group boundaries are found
+    once, then each feature family is computed on a 2D block of its source columns,
+    matching groupby pct_change (with forward fill), shift and rolling(min_periods=1).mean().
+
+    Returns:
+        A DataFrame of the new columns, aligned to df.index.
+    """
+    codes = pd.factorize(df[group_col])[0]
+    n = len(df)
+    new_group = np.ones(n, dtype=bool)
+    new_group[1:] = codes[1:] != codes[:-1]
+    group_start = np.maximum.accumulate(np.where(new_group, np.arange(n), 0))
+    position = np.arange(n) - group_start
+    missing_key = codes < 0
+    features = {}
+
+    growth = spec.get('growth', {})
+    if growth:
+        sources = list(dict.fromkeys(source for source, _ in growth.values()))
+        filled = _ffill_within_groups(df[sources].to_numpy(dtype=float), group_start)
+        for name, (source, periods) in growth.items():
+            column = filled[:, [sources.index(source)]]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                features[name] = (column / _shift_within_groups(column, position, periods) - 1)[:, 0]
+
+    lags = spec.get('lags')
+    if lags:
+        values = df[lags['columns']].to_numpy(dtype=float)
+        shifted = {periods: _shift_within_groups(values, position, periods) for periods in lags['periods']}
+        for i, column in enumerate(lags['columns']):
+            for periods in lags['periods']:
+                features[f'{column}_lag{periods}'] = shifted[periods][:, i]
+
+    rolling = spec.get('rolling')
+    if rolling:
+        block = pd.DataFrame(df[rolling['columns']].to_numpy(dtype=float), columns=rolling['columns'])
+        means = {
+            window: block.rolling(_GroupWindowIndexer(window_size=window, group_start=group_start),
+                                  min_periods=1).mean().to_numpy()
+            for window in rolling['windows']
+        }
+        for i, column in enumerate(rolling['columns']):
+            for window in rolling['windows']:
+                features[f'{column}_roll{window}'] = means[window][:, i]
+
+    result = pd.DataFrame(features, index=df.index)
+    result[missing_key] = np.nan
+    return result
+
+def add_target_and_features(df: pd.DataFrame, horizon_days: int = 90, feature_spec: dict = FEATURE_SPEC) -> pd.DataFrame:
     """
     Add target dates, growth rates, lag features, and rolling averages.
+    The derived columns are declared in feature_spec (see FEATURE_SPEC).
     """
     df['accepted_date'] = pd.to_datetime(df['acceptedDate'], errors='coerce')
     df['target_date'] = df['accepted_date'] + pd.Timedelta(days=horizon_days)
     df = df.sort_values(by=['symbol_stock', 'accepted_date'])
-    
-    # Growth rates
-    df['revenue_growth_quarterly'] = df.groupby('symbol_stock')['revenue'].pct_change(periods=1)
-    df['revenue_growth_annual'] = df.groupby('symbol_stock')['revenue'].pct_change(periods=4)
-    df['eps_growth_quarterly'] = df.groupby('symbol_stock')['epsdiluted'].pct_change(periods=1)
-    df['eps_growth_annual'] = df.groupby('symbol_stock')['epsdiluted'].pct_change(periods=4)
-    
-    # Lag features
-    lag_features = ['ROE', 'ROA', 'free_cash_flow_yield', 're_ratio', 'Profit_Margin',
-                    'debtToEquity', 'eps', 'epsdiluted', 'ebitda', 'goodwillIntangible_to_assets',
-                    'sellingMarketing_to_revenue', 'totalInvestments_to_assets', 'rnd_to_revenue',
-                    'inventory_to_assets']
-    for feature in lag_features:
-        df[f'{feature}_lag1'] = df.groupby('symbol_stock')[feature].shift(1)
-        df[f'{feature}_lag4'] = df.groupby('symbol_stock')[feature].shift(4)
-    
-    # Rolling averages over 4 and 8 quarters
-    for feature in lag_features:
-        df[f'{feature}_roll4'] = df.groupby('symbol_stock')[feature].transform(lambda x: x.rolling(window=4, min_periods=1).mean())
-        df[f'{feature}_roll8'] = df.groupby('symbol_stock')[feature].transform(lambda x: x.rolling(window=8, min_periods=1).mean())
-    return df
 
-def merge_with_future_prices(df: pd.DataFrame) -> pd.DataFrame:
+    features = compute_group_features(df, feature_spec)
+    existing = [col for col in features.columns if col in df.columns]
+    return pd.concat([df.drop(columns=existing), features], axis=1)
+
+def merge_with_future_prices(df: pd.DataFrame, horizon_days: int = 90) -> pd.DataFrame:
     """
-    Use an asof merge on the target date to attach future stock prices.
+    Use an asof merge on the target date (horizon_days after accepted_date) to attach the
+    Adj Close of the symbol's next filing on or after it as the future price.
+    Rows with the same target date keep their (symbol, date) order from the stable sort.
+    For future prices from the daily price file at several horizons, see
+    src.price_store.add_forward_targets.
     """
     df_prices = df[['symbol_stock', 'accepted_date', 'Adj Close', 'Close']].rename(
         columns={'accepted_date': 'future_date', 'Adj Close': 'future_price', 'Close': 'future_dji'}
-    ).sort_values('future_date')
+    ).sort_values('future_date', kind='mergesort')
     
     df = df.dropna(subset=['accepted_date'])
-    df['target_date'] = df['accepted_date'] + pd.Timedelta(days=90)
+    df['target_date'] = df['accepted_date'] + pd.Timedelta(days=horizon_days)
     df_prices = df_prices.dropna(subset=['future_date'])
     
     df_model = pd.merge_asof(
-        left=df.sort_values('target_date'),
+        left=df.sort_values('target_date', kind='mergesort'),
         right=df_prices,
         left_on='target_date',
         right_on='future_date',
@@ -161,42 +301,54 @@ def calculate_final_returns(df: pd.DataFrame) -> pd.DataFrame:
     df['log_return_future'] = np.log(df['future_price'] / df['Adj Close'])
     df = df.dropna(subset=['log_return_future']).copy()
     df['relative_log_return'] = df['log_return_future'] - df['log_dji_return']
-    threshold = np.log(1 + 0.02)
-    df['good_stock'] = (df['relative_log_return'] > threshold).astype(int)
+    df['good_stock'] = (df['relative_log_return'] > GOOD_STOCK_THRESHOLD).astype(int)
     return df
 
+# Key columns a row must have finite values in to survive clean_final_df
+FINAL_REQUIRED_COLUMNS = ['Book_Value_per_share', 'PE_ratio', 'PB_ratio']
+
 def clean_final_df(df: pd.DataFrame) -> pd.DataFrame:
     """
     Drop rows with NaN or infinite values in key columns and reset the index.
     """
-    cols_to_check = ['Book_Value_per_share', 'PE_ratio', 'PB_ratio']
-    df = df[np.isfinite(df[cols_to_check]).all(axis=1)]
+    df = df[np.isfinite(df[FINAL_REQUIRED_COLUMNS]).all(axis=1)]
     df.reset_index(drop=True, inplace=True)
     return df
 
-def load_stock_prices(filepath: str) -> pd.DataFrame:
-    """Load stock prices data from a CSV file."""
-    return pd.read_csv(filepath)
+def load_stock_prices(filepath: str, columns: str = 'pipeline') -> pd.DataFrame:
+    """Load stock prices data from a CSV file, by default only the columns used for market cap filtering."""
+    return read_csv_with_schema(filepath, STOCK_PRICES_SCHEMA, columns=columns)
+
+# Market cap categories as (label, lower bound) from the largest down; anything below the
+# last bound (including NaN market caps) falls into DEFAULT_MARKET_CAP_FLOOR.
+MARKET_CAP_CATEGORIES = [
+    ('Mega-cap', 200_000_000_000),
+    ('Big-cap', 10_000_000_000),
+    ('Mid-cap', 2_000_000_000),
+    ('Small-cap', 250_000_000),
+    ('Micro-cap', 50_000_000),
+]
+DEFAULT_MARKET_CAP_FLOOR = 'Nano-cap'
+DEFAULT_CATEGORIES_TO_KEEP = ['Mega-cap', 'Big-cap', 'Mid-cap', 'Small-cap', 'Micro-cap']
+
+def categorize_market_caps(market_cap: pd.Series, categories: list = MARKET_CAP_CATEGORIES,
+                           floor: str = DEFAULT_MARKET_CAP_FLOOR) -> np.ndarray:
+    """
+    Vectorized market cap binning: each value gets the first category whose lower bound it reaches.
+    """
+    labels = np.array([floor] + [label for label, _ in reversed(categories)], dtype=object)
+    bounds = np.array([bound for _, bound in reversed(categories)], dtype=float)
+    values = np.asarray(market_cap, dtype=float)
+    bins = np.searchsorted(bounds, values, side='right')
+    bins[np.isnan(values)] = 0
+    return labels[bins]
 
 def add_market_cap_categories(df: pd.DataFrame) -> pd.DataFrame:
     """
     Calculate market cap and assign market cap categories.
     """
     df['Market Cap'] = df['Adj Close'] * df['Volume']
-    def categorize_market_cap(market_cap):
-        if market_cap >= 200_000_000_000:
-            return 'Mega-cap'
-        elif market_cap >= 10_000_000_000:
-            return 'Big-cap'
-        elif market_cap >= 2_000_000_000:
-            return 'Mid-cap'
-        elif market_cap >= 250_000_000:
-            return 'Small-cap'
-        elif market_cap >= 50_000_000:
-            return 'Micro-cap'
-        else:
-            return 'Nano-cap'
-    df['Market Cap Category'] = df['Market Cap'].apply(categorize_market_cap)
+    df['Market Cap Category'] = categorize_market_caps(df['Market Cap'])
     return df
 
 def filter_stock_prices(df: pd.DataFrame, categories_to_keep=None) -> pd.DataFrame:
@@ -204,15 +356,75 @@ def filter_stock_prices(df: pd.DataFrame, categories_to_keep=None) -> pd.DataFra
     Filter the stock prices DataFrame by specified market cap categories.
     """
     if categories_to_keep is None:
-        categories_to_keep = ['Mega-cap', 'Big-cap', 'Mid-cap', 'Small-cap', 'Micro-cap']
+        categories_to_keep = DEFAULT_CATEGORIES_TO_KEEP
     return df[df['Market Cap Category'].isin(categories_to_keep)]
 
+def stream_universe(filepath: str, categories_to_keep: list = None, categories: list = MARKET_CAP_CATEGORIES,
+                    floor: str = DEFAULT_MARKET_CAP_FLOOR, start_date: str = None, end_date: str = None,
+                    chunksize: int = 1_000_000) -> pd.DataFrame:
+    """
+    Build the market cap universe from the daily price file without loading it whole.
+
+    The file is read in chunks of `chunksize` rows; each chunk is restricted to the
+    [start_date, end_date] window, binned with categorize_market_caps and reduced to the
+    symbols with at least one day in categories_to_keep. Only the running set of kept
+    symbols is retained between chunks, so memory stays bounded by chunksize.
+
+    Returns:
+        A DataFrame with a 'Stock' column, in order of each symbol's first qualifying row.
+    """
+    if categories_to_keep is None:
+        categories_to_keep = DEFAULT_CATEGORIES_TO_KEEP
+    usecols = list(STOCK_PRICES_SCHEMA['columns'])
+    dtype = {'Stock': 'object', 'Adj Close': 'float64', 'Volume': 'float64'}
+    if start_date is not None or end_date is not None:
+        usecols.append('Date')
+
+    kept = {}
+    for chunk in pd.read_csv(filepath, usecols=usecols, dtype=dtype, chunksize=chunksize):
+        if 'Date' in usecols:
+            dates = pd.to_datetime(chunk['Date'])
+            in_window = np.ones(len(chunk), dtype=bool)
+            if start_date is not None:
+                in_window &= (dates >= pd.Timestamp(start_date)).to_numpy()
+            if end_date is not None:
+                in_window &= (dates <= pd.Timestamp(end_date)).to_numpy()
+            chunk = chunk[in_window]
+        labels = categorize_market_caps(chunk['Adj Close'].to_numpy() * chunk['Volume'].to_numpy(),
+                                        categories, floor)
+        for symbol in pd.unique(chunk['Stock'].to_numpy()[np.isin(labels, categories_to_keep)]):
+            kept.setdefault(symbol, None)
+    return pd.DataFrame({'Stock': pd.Series(list(kept), dtype=object)})
+
 def filter_final_data_by_symbols(final_df: pd.DataFrame, symbols: list) -> pd.DataFrame:
     """
     Filter the final DataFrame to only include rows for the given symbols.
     """
     return final_df[final_df['symbol_stock'].isin(symbols)]
 
+def select_universe(stock_prices_filepath: str, categories_to_keep: list = None,
+                    start_date: str = None, end_date: str = None) -> pd.DataFrame:
+    """
+    Return the symbols whose market cap reaches one of categories_to_keep on at least one
+    day in the optional date window, streaming the daily price file.
+    """
+    return stream_universe(stock_prices_filepath, categories_to_keep=categories_to_keep,
+                           start_date=start_date, end_date=end_date)
+
+def apply_universe_filters(final_df: pd.DataFrame, universe: pd.DataFrame) -> pd.DataFrame:
+    """
+    Keep universe symbols that reach quarter_number 21 and trade above 14 at least once.
+    """
+    final_df = filter_final_data_by_symbols(final_df, universe['Stock'].tolist())
+
+    # Additional filtering based on criteria
+    final_df = final_df[final_df.groupby('symbol_stock', observed=True)['quarter_number'].transform('max') > 20]
+    final_df = final_df.reset_index(drop=True)
+
+    final_df = final_df[final_df.groupby('symbol_stock', observed=True)['Adj Close'].transform('max') > 14]
+    final_df = final_df.reset_index(drop=True)
+    return final_df
+
 
 def winsorize_columns(
     df: pd.DataFrame,
@@ -223,7 +435,8 @@ def winsorize_columns(
     ) -> (pd.DataFrame, list):
     """
     Winsorize specified columns of the DataFrame by capping values below the lower quantile 
-    and above the upper quantile.
+    and above the upper quantile. The bounds are fitted on df itself; use Winsorizer to
+    fit them on a training split and reuse them elsewhere.
     
     Parameters:
         df: The input DataFrame.
@@ -234,19 +447,17 @@ def winsorize_columns(
     
     Returns:
         A tuple of:
-          - A new DataFrame with winsorized columns added.
+          - A new DataFrame with winsorized columns added. It is a shallow copy of df, so
+            the other columns share df's data; df itself is left unchanged.
           - A list of the winsorized column names.
     """
-    df_copy = df.copy()
-    winsorized_columns = []
+    present = []
     for col in columns:
-        if col in df_copy.columns:
-            lower_bound = df_copy[col].quantile(lower_quantile)
-            upper_bound = df_copy[col].quantile(upper_quantile)
-            new_col = f"{col}{suffix}"
-            df_copy[new_col] = df_copy[col].clip(lower=lower_bound, upper=upper_bound)
-            winsorized_columns.append(new_col)
+        if col in df.columns:
+            present.append(col)
         else:
-            print(f"Warning: Column '{col}' not found in DataFrame.")
-    return df_copy, winsorized_columns
+            logging.warning("Column '%s' not found in DataFrame.", col)
+    result = df.copy(deep=False)
+    Winsorizer(present, lower_quantile, upper_quantile).fit_transform(result, inplace=True, suffix=suffix)
+    return result, [f"{col}{suffix}" for col in present]
 
@@ -0,0 +1,201 @@
+# src/price_store.py
+import numpy as np
+import pandas as pd
+
+HORIZONS = (30, 60, 90, 180, 365)
+
+# log(1 + 2%): the relative log return a stock must beat to be a good_stock
+GOOD_STOCK_THRESHOLD = np.log(1 + 0.02)
+
+# Symbol code and day number are packed into one sortable int64 key: code << 32 | day + 2**31
+_DAY_BIAS = 2 ** 31
+
+
+def load_price_history(filepath: str, chunksize: int = 1_000_000) -> pd.DataFrame:
+    """
+    Daily prices of adjclose_stock.csv as one (Stock, Date)-sorted frame with columns Stock,
+    Date (datetime64, day resolution) and Adj Close. The file is read in chunks of only
+    those three columns; rows without a date or price are dropped and of duplicate
+    (Stock, Date) rows the last one in the file is kept.
+    """
+    dtype = {'Stock': 'object', 'Date': 'object', 'Adj Close': 'float64'}
+    chunks = []
+    for chunk in pd.read_csv(filepath, usecols=list(dtype), dtype=dtype, chunksize=chunksize):
+        chunk['Date'] = pd.to_datetime(chunk['Date'], errors='coerce').dt.normalize()
+        chunks.append(chunk.dropna(subset=['Stock', 'Date', 'Adj Close']))
+    prices = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame(columns=list(dtype))
+    prices = prices.sort_values(['Stock', 'Date'], kind='mergesort')
+    prices = prices.drop_duplicates(['Stock', 'Date'], keep='last').reset_index(drop=True)
+    prices['Stock'] = prices['Stock'].astype('category')
+    return prices[['Stock', 'Date', 'Adj Close']]
+
+
+class PriceStore:
+    """
+    Indexed daily price series of many symbols: one array of prices and day numbers,
+    sorted by (symbol, date), with offsets[i]:offsets[i + 1] holding symbol i's rows.
+
+    Lookups for any number of (symbol, date, horizon) queries are answered with a single
+    np.searchsorted over packed (symbol code, day) keys, so adding horizons adds no sort
+    or merge - only more keys to the same search.
+
+    Attributes:
+        symbols: Sorted symbol names.
+        offsets: int64 start of each symbol's rows, plus the total row count.
+        days: Day numbers (days since 1970-01-01) of every row.
+        prices: Price of every row.
+    """
+
+    def __init__(self, symbols: np.ndarray, offsets: np.ndarray, days: np.ndarray, prices: np.ndarray):
+        self.symbols = np.asarray(symbols, dtype=object)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.days = np.asarray(days, dtype=np.int64)
+        self.prices = np.asarray(prices, dtype=float)
+        codes = np.repeat(np.arange(len(self.symbols), dtype=np.int64), np.diff(self.offsets))
+        self._keys = (codes << 32) | (self.days + _DAY_BIAS)
+        self._index = pd.Index(self.symbols)
+
+    def __len__(self):
+        return len(self.prices)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, symbol_col: str = 'Stock', date_col: str = 'Date',
+                   price_col: str = 'Adj Close') -> 'PriceStore':
+        """A store of a price frame; it is sorted here unless already in (symbol, date) order."""
+        df = df.dropna(subset=[symbol_col, date_col, price_col])
+        symbols = df[symbol_col].astype(str).to_numpy()
+        days = pd.to_datetime(df[date_col]).to_numpy().astype('datetime64[D]').astype(np.int64)
+        order = np.lexsort((days, symbols))
+        if not (order == np.arange(len(order))).all():
+            symbols, days = symbols[order], days[order]
+            prices = df[price_col].to_numpy(dtype=float)[order]
+        else:
+            prices = df[price_col].to_numpy(dtype=float)
+        new_symbol = np.r_[True, symbols[1:] != symbols[:-1]] if len(symbols) else np.zeros(0, dtype=bool)
+        starts = np.flatnonzero(new_symbol)
+        return cls(symbols[starts], np.r_[starts, len(symbols)], days, prices)
+
+    @classmethod
+    def from_csv(cls, filepath: str, chunksize: int = 1_000_000) -> 'PriceStore':
+        return cls.from_frame(load_price_history(filepath, chunksize=chunksize))
+
+    @classmethod
+    def from_series(cls, dates, values, name: str = 'market') -> 'PriceStore':
+        """A single-symbol store, e.g. the S&P closes of sp_df for market returns."""
+        return cls.from_frame(pd.DataFrame({'Stock': name, 'Date': dates, 'Adj Close': values}))
+
+    def symbol_codes(self, symbols) -> np.ndarray:
+        """Position of each symbol in self.symbols, -1 for symbols without prices."""
+        return self._index.get_indexer(pd.Index(np.asarray(symbols, dtype=object)).astype(str))
+
+    def lookup(self, symbols, dates, horizons=(0,), direction: str = 'forward', tolerance_days: int = None):
+        """
+        Price at each date + horizon (in days) of each symbol.
+
+        'forward' takes the first price on or after the target day, 'backward' the last
+        price on or before it; dates are compared at day resolution. Targets with no such
+        price within the symbol (or further than tolerance_days from the target) get NaN.
+
+        Parameters:
+            symbols: Symbol of each query row; a single symbol name applies to every row.
+            dates: Date of each query row.
+            horizons: Day offsets; every row is looked up at each of them in one search.
+
+        Returns:
+            A tuple of two (rows x horizons) arrays: the prices and the datetime64[D] dates
+            of the matched rows (NaT where unmatched).
+        """
+        if direction not in ('forward', 'backward'):
+            raise ValueError(f"direction must be 'forward' or 'backward', got {direction!r}")
+        dates = pd.DatetimeIndex(pd.to_datetime(dates))
+        n = len(dates)
+        if isinstance(symbols, str):
+            codes = np.full(n, self._index.get_loc(symbols) if symbols in self._index else -1)
+        else:
+            codes = self.symbol_codes(symbols)
+        days = dates.to_numpy().astype('datetime64[D]').astype(np.int64)
+        horizons = np.asarray(horizons, dtype=np.int64)
+
+        target = days[:, None] + horizons[None, :]
+        if len(self) == 0:
+            return np.full(target.shape, np.nan), np.full(target.shape, np.datetime64('NaT'), dtype='datetime64[D]')
+        known = (codes >= 0)[:, None] & ~dates.isna()[:, None]
+        safe_codes = np.where(codes >= 0, codes, 0).astype(np.int64)[:, None]
+        keys = (safe_codes << 32) | (np.where(known, target, 0) + _DAY_BIAS)
+
+        if direction == 'forward':
+            pos = np.searchsorted(self._keys, keys, side='left')
+            found = known & (pos < self.offsets[safe_codes + 1])
+        else:
+            pos = np.searchsorted(self._keys, keys, side='right') - 1
+            found = known & (pos >= self.offsets[safe_codes])
+        pos = np.where(found, pos, 0)
+        if tolerance_days is not None:
+            found &= np.abs(self.days[pos] - target) <= tolerance_days
+
+        prices = np.where(found, self.prices[pos], np.nan)
+        matched = self.days[pos].astype('datetime64[D]')
+        matched[~found] = np.datetime64('NaT')
+        return prices, matched
+
+
+def forward_target_columns(horizon: int) -> list:
+    """Names of the columns add_forward_targets adds for one horizon."""
+    return [f'future_date_{horizon}d', f'log_return_future_{horizon}d', f'log_market_return_{horizon}d',
+            f'relative_log_return_{horizon}d', f'good_stock_{horizon}d']
+
+
+def add_forward_targets(df: pd.DataFrame, store: PriceStore, market: PriceStore, horizons=HORIZONS,
+                        threshold: float = GOOD_STOCK_THRESHOLD, tolerance_days: int = None) -> pd.DataFrame:
+    """
+    Add forward-return targets for several horizons from the daily price store.
+
+    For each horizon h (days after accepted_date):
+      - log_return_future_{h}d: log of the first daily price on or after accepted_date + h
+        over the last daily price on or before accepted_date, both from `store`;
+      - log_market_return_{h}d: the same for the market series (e.g. PriceStore.from_series
+        of the S&P closes);
+      - relative_log_return_{h}d and good_stock_{h}d (relative return above threshold, as in
+        calculate_final_returns), with good_stock missing where the return is;
+      - future_date_{h}d: the date of the future price, for purging overlapping labels.
+
+    Every horizon is answered by the same two store lookups and the columns are added in
+    one concat, so rows are neither re-sorted nor dropped: rows without a price far enough
+    ahead (recent filings at long horizons) keep NaN targets.
+    """
+    dates = pd.to_datetime(df['accepted_date'], errors='coerce')
+    base, _ = store.lookup(df['symbol_stock'], dates, direction='backward')
+    future, future_dates = store.lookup(df['symbol_stock'], dates, horizons, tolerance_days=tolerance_days)
+    market_symbol = str(market.symbols[0]) if len(market.symbols) else ''
+    market_base, _ = market.lookup(market_symbol, dates, direction='backward')
+    market_future, _ = market.lookup(market_symbol, dates, horizons, tolerance_days=tolerance_days)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        stock_return = np.log(future / base)
+        market_return = np.log(market_future / market_base)
+    relative = stock_return - market_return
+
+    columns = {}
+    for j, horizon in enumerate(horizons):
+        good = pd.array((relative[:, j] > threshold).astype(np.int8), dtype='Int8')
+        good[np.isnan(relative[:, j])] = pd.NA
+        names = forward_target_columns(horizon)
+        columns.update({
+            names[0]: future_dates[:, j].astype('datetime64[ns]'),
+            names[1]: stock_return[:, j],
+            names[2]: market_return[:, j],
+            names[3]: relative[:, j],
+            names[4]: good,
+        })
+    targets = pd.DataFrame(columns, index=df.index)
+    return pd.concat([df.drop(columns=[col for col in targets.columns if col in df.columns]), targets], axis=1)
+
+
+def add_price_targets(final_df: pd.DataFrame, prices: pd.DataFrame, sp_df: pd.DataFrame,
+                      horizons=HORIZONS) -> pd.DataFrame:
+    """
+    Pipeline stage form of add_forward_targets: builds the stores from the frames of
+    load_price_history and load_sp500_data.
+    """
+    market = PriceStore.from_series(sp_df['acceptedDate'], sp_df['Close'])
+    return add_forward_targets(final_df, PriceStore.from_frame(prices), market, horizons)
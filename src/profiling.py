@@ -0,0 +1,101 @@
+# src/profiling.py
+import json
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+from src.preprocessing import FINAL_REQUIRED_COLUMNS
+
+
+def _frame_stats(df: pd.DataFrame) -> dict:
+    """Row/column counts and non-finite counts of a stage output."""
+    numeric = df.select_dtypes(include='number').to_numpy(dtype=float, na_value=np.nan)
+    stats = {
+        'rows': len(df),
+        'columns': df.shape[1],
+        'nan_cells': int(np.isnan(numeric).sum()),
+        'inf_cells': int(np.isinf(numeric).sum()),
+        'nonfinite_key_rows': None,
+    }
+    if all(col in df.columns for col in FINAL_REQUIRED_COLUMNS):
+        key_values = df[FINAL_REQUIRED_COLUMNS].to_numpy(dtype=float, na_value=np.nan)
+        stats['nonfinite_key_rows'] = int((~np.isfinite(key_values)).any(axis=1).sum())
+    return stats
+
+
+class StageProfiler:
+    """
+    Records wall time, CPU time, peak traced memory and input/output shapes for each
+    pipeline stage it runs. 'nonfinite_key_rows' counts the rows clean_final_df would
+    drop (NaN or inf in FINAL_REQUIRED_COLUMNS) wherever those columns exist.
+
+    Parameters:
+        track_memory: Trace allocations with tracemalloc to report each stage's peak
+            memory above its starting point. Tracing slows Python-heavy stages down.
+    """
+
+    def __init__(self, track_memory: bool = True):
+        self.track_memory = track_memory
+        self.records = []
+
+    def run(self, name: str, func, args: list, params: dict, status: str = 'computed'):
+        """Call func(*args, **params) and record one entry for it."""
+        inputs = [_frame_stats(arg) for arg in args if isinstance(arg, pd.DataFrame)]
+
+        started_tracing = self.track_memory and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        if self.track_memory:
+            tracemalloc.reset_peak()
+            memory_before = tracemalloc.get_traced_memory()[0]
+
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        result = func(*args, **params)
+        wall_time, cpu_time = time.perf_counter() - wall_start, time.process_time() - cpu_start
+
+        peak_memory = None
+        if self.track_memory:
+            peak_memory = tracemalloc.get_traced_memory()[1] - memory_before
+        if started_tracing:
+            tracemalloc.stop()
+
+        output = _frame_stats(result) if isinstance(result, pd.DataFrame) else {}
+        self.records.append({
+            'stage': name,
+            'status': status,
+            'wall_time_s': wall_time,
+            'cpu_time_s': cpu_time,
+            'peak_memory_mb': None if peak_memory is None else peak_memory / 1024 ** 2,
+            'input_rows': [stats['rows'] for stats in inputs],
+            'input_columns': [stats['columns'] for stats in inputs],
+            'output_rows': output.get('rows'),
+            'output_columns': output.get('columns'),
+            'nan_cells': output.get('nan_cells'),
+            'inf_cells': output.get('inf_cells'),
+            'nonfinite_key_rows': output.get('nonfinite_key_rows'),
+        })
+        return result
+
+    def report(self) -> pd.DataFrame:
+        """One row per recorded stage, in execution order."""
+        return pd.DataFrame(self.records)
+
+    def table(self) -> str:
+        """The report formatted as a readable text table."""
+        if not self.records:
+            return "(no stages recorded)"
+        report = self.report()
+        counts = ['output_rows', 'output_columns', 'nan_cells', 'inf_cells', 'nonfinite_key_rows']
+        report[counts] = report[counts].astype('Int64').astype(str).replace('<NA>', '-')
+        report['input_rows'] = report['input_rows'].apply(lambda rows: ', '.join(map(str, rows)))
+        report['input_columns'] = report['input_columns'].apply(lambda cols: ', '.join(map(str, cols)))
+        return report.to_string(index=False, float_format=lambda x: f"{x:.3f}", na_rep='-')
+
+    def to_json(self, path: str = None) -> str:
+        """The report as JSON; also written to `path` if one is given."""
+        text = json.dumps({'stages': self.records}, indent=2)
+        if path is not None:
+            with open(path, 'w') as f:
+                f.write(text)
+        return text
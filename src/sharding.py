@@ -0,0 +1,115 @@
+# src/sharding.py
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from src.preprocessing import (
+    fix_financial_columns,
+    calculate_financial_metrics,
+    merge_sp500,
+    add_target_and_features,
+    merge_with_future_prices,
+    calculate_final_returns,
+    clean_final_df,
+    apply_universe_filters,
+    FEATURE_SPEC,
+    RATIO_SPEC
+)
+
+_SHARD_STATE = {}
+
+
+def shard_ids(symbols: pd.Series, n_shards: int) -> np.ndarray:
+    """
+    Hash-partition symbols into n_shards: every row of a symbol gets the CRC32 of the
+    symbol modulo n_shards, which unlike hash() is the same in every process and run.
+    Rows without a symbol go to shard 0.
+    """
+    categorical = pd.Categorical(symbols)
+    # One extra trailing entry for the missing-symbol code -1
+    per_symbol = np.array([zlib.crc32(str(symbol).encode()) % n_shards for symbol in categorical.categories] + [0],
+                          dtype=np.int64)
+    return per_symbol[categorical.codes]
+
+
+def _init_shard_worker(sp_df, universe, horizon_days, feature_spec, ratio_spec):
+    """Share the S&P frame and the universe with a worker once instead of once per shard."""
+    _SHARD_STATE.update(sp_df=sp_df, universe=universe, horizon_days=horizon_days, feature_spec=feature_spec,
+                        ratio_spec=ratio_spec)
+
+
+def run_symbol_stages(df: pd.DataFrame, sp_df: pd.DataFrame, universe: pd.DataFrame, horizon_days: int = 90,
+                      feature_spec: dict = FEATURE_SPEC, ratio_spec: list = RATIO_SPEC) -> pd.DataFrame:
+    """
+    Run the stages of preprocess() from fix_financial_columns to apply_universe_filters on
+    financial data that holds every row of each of its symbols.
+    """
+    df = fix_financial_columns(df)
+    df = calculate_financial_metrics(df, ratio_spec)
+    df = merge_sp500(df, sp_df)
+    df = add_target_and_features(df, horizon_days=horizon_days, feature_spec=feature_spec)
+    df_model = merge_with_future_prices(df, horizon_days=horizon_days)
+    df_model = calculate_final_returns(df_model)
+    final_df = clean_final_df(df_model)
+    return apply_universe_filters(final_df, universe)
+
+
+def restore_row_order(final_df: pd.DataFrame, row_col: str = '_row') -> pd.DataFrame:
+    """
+    Put the concatenated outputs of run_symbol_stages back into single-process order.
+
+    The pipeline's sorts are stable, so preprocess() returns its rows in the order of
+    (target_date, symbol_stock, position in the loaded file); row_col must hold that
+    position. The column is dropped from the result.
+    """
+    symbol_codes = pd.Categorical(final_df['symbol_stock']).codes.astype(np.int64)
+    symbol_codes[symbol_codes < 0] = np.iinfo(np.int64).max
+    order = np.lexsort((final_df[row_col].to_numpy(), symbol_codes, final_df['target_date'].to_numpy()))
+    return final_df.take(order).drop(columns=row_col).reset_index(drop=True)
+
+
+def _run_shard(df: pd.DataFrame) -> pd.DataFrame:
+    """Run the per-symbol stages of preprocess() on one shard of the financial data."""
+    return run_symbol_stages(df, _SHARD_STATE['sp_df'], _SHARD_STATE['universe'],
+                             horizon_days=_SHARD_STATE['horizon_days'], feature_spec=_SHARD_STATE['feature_spec'],
+                             ratio_spec=_SHARD_STATE['ratio_spec'])
+
+
+def preprocess_sharded(df: pd.DataFrame, sp_df: pd.DataFrame, universe: pd.DataFrame, n_shards: int = 8,
+                       n_jobs: int = None, horizon_days: int = 90, feature_spec: dict = FEATURE_SPEC,
+                       ratio_spec: list = RATIO_SPEC) -> pd.DataFrame:
+    """
+    Run everything in preprocess() between loading the inputs and the universe filters
+    shard by shard, and return the same final DataFrame as the single-process pipeline.
+
+    Every stage in that range only looks at the rows of one symbol (or at the S&P frame),
+    so the symbols are hash-partitioned with shard_ids and each shard runs the stages in
+    a worker process; the S&P frame and the universe are sent to each worker once.
+
+    The shard outputs are put back into single-process order with restore_row_order,
+    which makes the result identical to preprocess()'s.
+
+    Parameters:
+        df: The loaded financial data (load_financial_data).
+        sp_df: The loaded S&P500 data (load_sp500_data).
+        universe: The market cap universe (select_universe).
+        n_shards: Number of symbol partitions.
+        n_jobs: Worker processes; defaults to n_shards. 1 runs the shards in this process.
+    """
+    n_jobs = n_shards if n_jobs is None else n_jobs
+    df = df.assign(_row=np.arange(len(df)))
+    shard = shard_ids(df['symbol_stock'], n_shards)
+    shards = [df[shard == i].copy() for i in range(n_shards) if (shard == i).any()]
+    del df
+
+    init_args = (sp_df, universe, horizon_days, feature_spec, ratio_spec)
+    if n_jobs == 1 or len(shards) <= 1:
+        _init_shard_worker(*init_args)
+        results = [_run_shard(part) for part in shards]
+    else:
+        with ProcessPoolExecutor(max_workers=min(n_jobs, len(shards)), initializer=_init_shard_worker,
+                                 initargs=init_args) as pool:
+            results = list(pool.map(_run_shard, shards))
+
+    return restore_row_order(pd.concat(results, ignore_index=True))
@@ -0,0 +1,160 @@
+# src/streaming.py
+import logging
+import math
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from src.ingestion import FINANCIAL_SCHEMA, count_csv_rows, iter_csv_with_schema
+from src.preprocessing import load_sp500_data, select_universe, FEATURE_SPEC, RATIO_SPEC
+from src.sharding import shard_ids, run_symbol_stages, restore_row_order
+
+# Written into output_dir by preprocess_streaming; only a directory holding it is cleared
+OUTPUT_MARKER = '.preprocess_streaming'
+
+
+def partition_by_symbol(filepath: str, bucket_dir: str, n_buckets: int, chunksize: int = 100_000) -> list:
+    """
+    Split the financial CSV into n_buckets symbol buckets on disk, reading chunksize rows at a time.
+
+    Every row goes to the bucket shard_ids assigns its symbol, so a bucket holds all of the
+    rows of its symbols, in file order, plus a '_row' column with the row's position in the
+    file. Each bucket is one Parquet file with a ParquetWriter kept open while partitioning;
+    every chunk appends its share of the bucket as a row group.
+
+    The Arrow schema is pinned from the first chunk, so columns whose dtype pandas infers
+    (quarter_number and columns outside the schema) get the same type in every row group;
+    missing values of a column inferred as integer are stored as nulls.
+
+    Returns:
+        The bucket files that received rows, in bucket order.
+    """
+    schema, writers, offset = None, {}, 0
+    try:
+        for chunk in iter_csv_with_schema(filepath, FINANCIAL_SCHEMA, chunksize=chunksize):
+            chunk['_row'] = np.arange(offset, offset + len(chunk))
+            offset += len(chunk)
+            if schema is None:
+                schema = pa.Table.from_pandas(chunk, preserve_index=False).schema
+            bucket = shard_ids(chunk['symbol_stock'], n_buckets)
+            for b in np.unique(bucket):
+                try:
+                    table = pa.Table.from_pandas(chunk[bucket == b], schema=schema, preserve_index=False)
+                except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+                    raise ValueError(f"{filepath} rows {offset - len(chunk)}-{offset - 1} do not match the "
+                                     f"column types of the first chunk ({e}); declare the column's dtype "
+                                     f"in FINANCIAL_SCHEMA") from e
+                if b not in writers:
+                    writers[b] = pq.ParquetWriter(os.path.join(bucket_dir, f'bucket-{b:05d}.parquet'), schema)
+                writers[b].write_table(table)
+    finally:
+        for writer in writers.values():
+            writer.close()
+    return [os.path.join(bucket_dir, f'bucket-{b:05d}.parquet') for b in sorted(writers)]
+
+
+def _read_bucket(path: str) -> pd.DataFrame:
+    """One bucket's rows in file order (its row groups are written in chunk order)."""
+    return pd.read_parquet(path)
+
+
+def _is_part(name: str) -> bool:
+    return name.startswith('part-') and name.endswith('.parquet')
+
+
+def _clear_output_dir(output_dir: str):
+    """
+    Remove the parts and buckets of an earlier preprocess_streaming run from output_dir and
+    mark the directory as ours. Any other file is left alone, and a non-empty directory
+    without the marker is refused rather than cleared.
+    """
+    marker = os.path.join(output_dir, OUTPUT_MARKER)
+    if os.path.isdir(output_dir) and os.listdir(output_dir) and not os.path.exists(marker):
+        raise ValueError(f"{output_dir} is not empty and was not written by preprocess_streaming; "
+                         f"pass an empty or new directory")
+    os.makedirs(output_dir, exist_ok=True)
+    for name in os.listdir(output_dir):
+        if _is_part(name):
+            os.remove(os.path.join(output_dir, name))
+    shutil.rmtree(os.path.join(output_dir, '.buckets'), ignore_errors=True)
+    open(marker, 'w').close()
+
+
+def _sp_window(sp_df: pd.DataFrame, dates: pd.Series) -> pd.DataFrame:
+    """
+    The S&P rows a backward asof merge of `dates` can match: from the last row on or
+    before the earliest date up to the latest date. sp_df must be sorted by acceptedDate.
+    """
+    sp_dates = sp_df['acceptedDate'].to_numpy()
+    dates = pd.to_datetime(dates, errors='coerce').dropna()
+    if dates.empty:
+        return sp_df.iloc[:0].copy()
+    lo = max(np.searchsorted(sp_dates, dates.min().to_datetime64(), side='right') - 1, 0)
+    hi = np.searchsorted(sp_dates, dates.max().to_datetime64(), side='right')
+    return sp_df.iloc[lo:hi].copy()
+
+
+def preprocess_streaming(output_dir: str, data_dir: str = "data", chunksize: int = 100_000,
+                         n_buckets: int = None, horizon_days: int = 90,
+                         feature_spec: dict = FEATURE_SPEC, ratio_spec: list = RATIO_SPEC) -> list:
+    """
+    Out-of-core version of preprocess() for financial files larger than memory.
+
+    The financial CSV is first hash-partitioned by symbol into buckets of about chunksize
+    rows (partition_by_symbol). Each bucket then runs through the per-symbol stages
+    (run_symbol_stages) against only the window of S&P rows its dates can match, and its
+    final rows are written to output_dir as one Parquet part before the next bucket is
+    read. Peak memory is set by chunksize, not by the size of the file: one raw chunk
+    while partitioning, one bucket with its derived columns while processing.
+
+    The daily S&P series and the market cap universe (streamed by select_universe) do
+    not grow with the number of symbols and are loaded once.
+
+    Parameters:
+        output_dir: Directory for the part-*.parquet output files. The parts of an earlier
+            run are removed first; a non-empty directory this function did not create is
+            refused with a ValueError.
+        data_dir: Directory with the three input CSVs.
+        chunksize: Target rows per bucket, and rows read per chunk while partitioning.
+        n_buckets: Number of symbol buckets; by default the row count over chunksize.
+
+    Returns:
+        The paths of the written parts. load_streamed_output reads them back in
+        preprocess() order.
+    """
+    financial_filepath = os.path.join(data_dir, "merged_fullstock_data.csv")
+    if n_buckets is None:
+        n_buckets = max(math.ceil(count_csv_rows(financial_filepath) / chunksize), 1)
+
+    _clear_output_dir(output_dir)
+    bucket_dir = os.path.join(output_dir, '.buckets')
+    os.makedirs(bucket_dir)
+    buckets = partition_by_symbol(financial_filepath, bucket_dir, n_buckets, chunksize=chunksize)
+    logging.info("Partitioned %s into %d symbol buckets", financial_filepath, len(buckets))
+
+    sp_df = load_sp500_data(os.path.join(data_dir, "sp.csv")).sort_values('acceptedDate', kind='mergesort')
+    universe = select_universe(os.path.join(data_dir, "adjclose_stock.csv"))
+
+    parts = []
+    for i, bucket in enumerate(buckets):
+        df = _read_bucket(bucket)
+        final_df = run_symbol_stages(df, _sp_window(sp_df, df['acceptedDate']), universe,
+                                     horizon_days=horizon_days, feature_spec=feature_spec, ratio_spec=ratio_spec)
+        del df
+        path = os.path.join(output_dir, f'part-{i:05d}.parquet')
+        final_df.to_parquet(path, index=False)
+        parts.append(path)
+        os.remove(bucket)
+        logging.info("Bucket %d/%d: %d final rows", i + 1, len(buckets), len(final_df))
+    shutil.rmtree(bucket_dir)
+    return parts
+
+
+def load_streamed_output(output_dir: str) -> pd.DataFrame:
+    """Read the parts written by preprocess_streaming into one DataFrame, in preprocess() order."""
+    parts = sorted(name for name in os.listdir(output_dir) if _is_part(name))
+    final_df = pd.concat([pd.read_parquet(os.path.join(output_dir, name)) for name in parts], ignore_index=True)
+    return restore_row_order(final_df)
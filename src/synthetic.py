@@ -0,0 +1,110 @@
+# src/synthetic.py
+import os
+
+import numpy as np
+import pandas as pd
+from src.ingestion import FINANCIAL_SCHEMA
+
+SECTORS = ['Financial Services', 'Technology', 'Energy', 'Healthcare', 'Industrials']
+
+# sp.csv stores two-digit years, which date_parser maps into 1926-2025; starting in 1999
+# leaves room for at most this many quarters of filings plus the forward-return horizon.
+MAX_QUARTERS = 100
+
+# Schema columns with a non-default generator below; every other float column is a
+# signed lognormal balance-sheet style amount.
+_SPECIAL_COLUMNS = ['symbol_stock', 'Sector', 'acceptedDate', 'quarter_number', 'Adj Close',
+                    'totalStockholdersEquity', 'weightedAverageShsOut', 'eps', 'epsdiluted']
+
+
+def _symbol_frames(symbol: str, sector: str, n_quarters: int, trading_days: pd.DatetimeIndex,
+                   rng: np.random.Generator, nan_fraction: float) -> tuple:
+    """Quarterly filings and weekly prices for one synthetic symbol."""
+    n_filings = int(rng.integers(n_quarters // 2, n_quarters + 1))
+    first_quarter = int(rng.integers(0, n_quarters - n_filings + 1))
+    quarter_index = np.arange(first_quarter, first_quarter + n_filings)
+    filing_dates = pd.Timestamp('2000-01-15') + pd.to_timedelta(
+        quarter_index * 91 + rng.integers(-5, 5, n_filings), 'D')
+
+    filings = {
+        'symbol_stock': symbol,
+        'acceptedDate': filing_dates.strftime('%Y-%m-%d %H:%M:%S'),
+        'quarter_number': np.arange(1, n_filings + 1),
+        'Sector': sector,
+        'Adj Close': rng.uniform(5, 80) * np.exp(np.cumsum(rng.normal(0.01, 0.15, n_filings))),
+    }
+    for col in FINANCIAL_SCHEMA['columns']:
+        if col not in _SPECIAL_COLUMNS:
+            values = rng.lognormal(15, 1, n_filings) * rng.choice([1, 1, 1, -1], n_filings)
+            values[rng.random(n_filings) < nan_fraction] = np.nan
+            filings[col] = values
+    filings['totalStockholdersEquity'] = rng.lognormal(15, 1, n_filings)
+    filings['weightedAverageShsOut'] = rng.lognormal(17, 1, n_filings)
+    filings['eps'] = rng.normal(1, 1, n_filings)
+    filings['epsdiluted'] = filings['eps'] * 0.98
+    for col in FINANCIAL_SCHEMA['ratio']:
+        filings[col] = rng.normal(0.2, 0.1, n_filings)
+
+    window = (trading_days >= filing_dates[0] - pd.Timedelta(days=30)) & \
+             (trading_days <= filing_dates[-1] + pd.Timedelta(days=200))
+    price_days = trading_days[window][::5]
+    prices = pd.DataFrame({
+        'Date': price_days.strftime('%Y-%m-%d'),
+        'Stock': symbol,
+        'Adj Close': rng.uniform(5, 80) * np.exp(np.cumsum(rng.normal(0, 0.02, len(price_days)))),
+        'Volume': rng.lognormal(rng.uniform(11, 17), 1, len(price_days)),
+    })
+    return pd.DataFrame(filings), prices
+
+
+def generate_synthetic_data(directory: str, n_symbols: int = 50, n_quarters: int = 100, seed: int = 0,
+                            nan_fraction: float = 0.03) -> dict:
+    """
+    Write deterministic, schema-compatible stand-ins for the three input files into directory:
+    merged_fullstock_data.csv (quarterly filings, rows shuffled), sp.csv (daily index closes)
+    and adjclose_stock.csv (weekly prices and volumes).
+
+    Each symbol draws from its own child of the seed, so the first k symbols are identical
+    for any n_symbols >= k.
+
+    Parameters:
+        directory: Output directory (created if needed).
+        n_symbols: Number of synthetic symbols.
+        n_quarters: Length of the filing calendar; each symbol files for a random half or more of it.
+        seed: Seed for the generator.
+        nan_fraction: Share of missing values in the raw financial statement fields.
+
+    Returns:
+        A dict mapping 'financial', 'sp500' and 'stock_prices' to the written file paths.
+    """
+    if n_symbols < 1:
+        raise ValueError(f"n_symbols must be at least 1, got {n_symbols}")
+    if not 1 <= n_quarters <= MAX_QUARTERS:
+        raise ValueError(f"n_quarters must be between 1 and {MAX_QUARTERS}, got {n_quarters}")
+    os.makedirs(directory, exist_ok=True)
+    seed_sequence = np.random.SeedSequence(seed)
+    market_seed, *symbol_seeds = seed_sequence.spawn(n_symbols + 1)
+
+    market_rng = np.random.default_rng(market_seed)
+    trading_days = pd.bdate_range('1999-01-04', periods=n_quarters * 63 + 200)
+    sp_close = 1000 * np.exp(np.cumsum(market_rng.normal(0, 0.01, len(trading_days))))
+    sp_df = pd.DataFrame({'Date': trading_days.strftime('%m/%d/%y'), 'Close': sp_close, 'Open': sp_close})
+
+    filings, prices = [], []
+    for i, symbol_seed in enumerate(symbol_seeds):
+        symbol_filings, symbol_prices = _symbol_frames(
+            f'SYM{i:05d}', SECTORS[i % len(SECTORS)], n_quarters, trading_days,
+            np.random.default_rng(symbol_seed), nan_fraction)
+        filings.append(symbol_filings)
+        prices.append(symbol_prices)
+    financial_df = pd.concat(filings, ignore_index=True).sample(frac=1, random_state=seed)
+
+    paths = {
+        'financial': os.path.join(directory, 'merged_fullstock_data.csv'),
+        'sp500': os.path.join(directory, 'sp.csv'),
+        'stock_prices': os.path.join(directory, 'adjclose_stock.csv'),
+    }
+    financial_df.to_csv(paths['financial'], index=False)
+    sp_df.to_csv(paths['sp500'], index=False)
+    pd.concat(prices, ignore_index=True).to_csv(paths['stock_prices'], index=False)
+    return paths
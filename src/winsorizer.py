@@ -0,0 +1,142 @@
+# src/winsorizer.py
+import json
+import warnings
+
+import numpy as np
+import pandas as pd
+
+
+class Winsorizer:
+    """
+    Fit-once quantile clipping: fit() stores the lower/upper quantile bounds of each
+    column, transform() and clip_array() cap new data at exactly those bounds. Fitting
+    on the training split only and reusing the bounds on the test split (or in the
+    production scorer, via save/load) keeps test data out of the bounds.
+
+    All columns' bounds come from one np.nanquantile call per group; NaNs are skipped
+    and interpolation is linear, matching Series.quantile in winsorize_columns.
+
+    Parameters:
+        columns: Columns to winsorize.
+        lower_quantile: The lower quantile threshold (default is 0.01).
+        upper_quantile: The upper quantile threshold (default is 0.99).
+        group_col: Optional column (e.g. 'Sector' or a quarter column) to fit separate
+            bounds for each of its values. Values not seen in fit use the overall bounds.
+    """
+
+    def __init__(self, columns: list, lower_quantile: float = 0.01, upper_quantile: float = 0.99,
+                 group_col: str = None):
+        self.columns = list(columns)
+        self.lower_quantile = lower_quantile
+        self.upper_quantile = upper_quantile
+        self.group_col = group_col
+        self.lower_ = None
+        self.upper_ = None
+        self.group_bounds_ = {}
+
+    def _bounds(self, values: np.ndarray):
+        """Lower and upper bounds of each column of a 2D block; NaN for all-NaN columns."""
+        if len(values) == 0:
+            return np.full(values.shape[1], np.nan), np.full(values.shape[1], np.nan)
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            bounds = np.nanquantile(values, [self.lower_quantile, self.upper_quantile], axis=0)
+        return bounds[0], bounds[1]
+
+    def fit(self, df: pd.DataFrame) -> 'Winsorizer':
+        """Compute and store the bounds of every column (and of every group, with group_col)."""
+        missing = [col for col in self.columns if col not in df.columns]
+        if missing:
+            raise KeyError(f"Columns not in DataFrame: {missing}")
+        values = df[self.columns].to_numpy(dtype=float, na_value=np.nan)
+        self.lower_, self.upper_ = self._bounds(values)
+
+        self.group_bounds_ = {}
+        if self.group_col is not None:
+            codes, groups = pd.factorize(df[self.group_col].astype(str))
+            order = np.argsort(codes, kind='mergesort')
+            splits = np.flatnonzero(np.diff(codes[order])) + 1
+            for rows in np.split(order, splits) if len(order) else []:
+                self.group_bounds_[groups[codes[rows[0]]]] = self._bounds(values[rows])
+        return self
+
+    def _row_bounds(self, groups) -> tuple:
+        """Per-row (n x k) lower and upper bounds, or the overall (k,) bounds without groups."""
+        if self.lower_ is None:
+            raise ValueError("Winsorizer is not fitted; call fit() first")
+        if self.group_col is None or groups is None:
+            return self.lower_, self.upper_
+        codes, keys = pd.factorize(pd.Series(groups).astype(str))
+        table_lower = np.vstack([self.group_bounds_.get(key, (self.lower_, self.upper_))[0] for key in keys]
+                                + [self.lower_])
+        table_upper = np.vstack([self.group_bounds_.get(key, (self.lower_, self.upper_))[1] for key in keys]
+                                + [self.upper_])
+        # Code -1 (missing group) picks the trailing overall bounds
+        return table_lower[codes], table_upper[codes]
+
+    def clip_array(self, values: np.ndarray, groups=None, out: np.ndarray = None) -> np.ndarray:
+        """
+        Clip a (rows x columns) array whose columns are self.columns, in that order.
+        Pass out=values to clip in place, e.g. a float32 block from FeatureMatrix.take().
+        NaN bounds (a column with no data in fit) leave the values unchanged.
+        """
+        lower, upper = self._row_bounds(groups)
+        lower = np.where(np.isnan(lower), -np.inf, lower)
+        upper = np.where(np.isnan(upper), np.inf, upper)
+        return np.clip(values, lower, upper, out=out)
+
+    def transform(self, df: pd.DataFrame, inplace: bool = False, suffix: str = None) -> pd.DataFrame:
+        """
+        Cap df's columns at the fitted bounds.
+
+        With inplace=True the capped values are written into df - over the original columns,
+        or into new f'{col}{suffix}' columns - and df is returned. Otherwise only the capped
+        columns are returned (renamed with suffix if given), aligned to df.index, so the rest
+        of df is never copied.
+        """
+        groups = df[self.group_col] if self.group_col is not None else None
+        values = self.clip_array(df[self.columns].to_numpy(dtype=float, na_value=np.nan), groups)
+        names = [f"{col}{suffix}" if suffix else col for col in self.columns]
+        if not inplace:
+            return pd.DataFrame(values, index=df.index, columns=names)
+        for j, name in enumerate(names):
+            df[name] = values[:, j]
+        return df
+
+    def fit_transform(self, df: pd.DataFrame, inplace: bool = False, suffix: str = None) -> pd.DataFrame:
+        return self.fit(df).transform(df, inplace=inplace, suffix=suffix)
+
+    def to_dict(self) -> dict:
+        """JSON-serializable parameters and bounds (NaN bounds as None)."""
+        def listed(bounds):
+            return [None if np.isnan(b) else float(b) for b in bounds]
+        return {
+            'columns': self.columns,
+            'lower_quantile': self.lower_quantile,
+            'upper_quantile': self.upper_quantile,
+            'group_col': self.group_col,
+            'lower': None if self.lower_ is None else listed(self.lower_),
+            'upper': None if self.upper_ is None else listed(self.upper_),
+            'groups': {key: [listed(lower), listed(upper)] for key, (lower, upper) in self.group_bounds_.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, state: dict) -> 'Winsorizer':
+        def array(bounds):
+            return np.array([np.nan if b is None else b for b in bounds], dtype=float)
+        winsorizer = cls(state['columns'], state['lower_quantile'], state['upper_quantile'], state['group_col'])
+        if state['lower'] is not None:
+            winsorizer.lower_, winsorizer.upper_ = array(state['lower']), array(state['upper'])
+        winsorizer.group_bounds_ = {key: (array(lower), array(upper)) for key, (lower, upper) in state['groups'].items()}
+        return winsorizer
+
+    def save(self, path: str):
+        """Write the fitted bounds to a JSON file."""
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f)
+
+    @classmethod
+    def load(cls, path: str) -> 'Winsorizer':
+        """Load a Winsorizer written by save(), with exactly the bounds it was fitted with."""
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
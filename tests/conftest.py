@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.synthetic import generate_synthetic_data
+
+
+def random_panel(seed, n_symbols=40, n_quarters=24, single_row_symbols=5, ties=False):
+    """A signal panel of random walks; ties=True repeats dates and prices within symbols."""
+    rng = np.random.default_rng(seed)
+    lengths = np.r_[np.ones(single_row_symbols, dtype=int),
+                    rng.integers(2, n_quarters + 1, n_symbols - single_row_symbols)]
+    n = lengths.sum()
+    offsets = np.concatenate([np.arange(length) for length in lengths])
+    dates = pd.Timestamp('2005-01-01') + pd.to_timedelta(offsets * 91 + rng.integers(0, 30, n), 'D')
+    prices = np.exp(np.cumsum(rng.normal(0, 0.08, n)))
+    roe = rng.normal(0.1, 0.05, n)
+    if ties:
+        repeat = rng.random(n) < 0.3
+        repeat[np.r_[0, np.cumsum(lengths)[:-1]]] = False
+        dates = pd.DatetimeIndex(np.where(repeat, np.roll(dates.to_numpy(), 1), dates.to_numpy()))
+        prices = np.where(rng.random(n) < 0.3, np.roll(prices, 1), prices)
+        roe = np.where(rng.random(n) < 0.3, np.roll(roe, 1), roe)
+    panel = pd.DataFrame({
+        'symbol_stock': np.repeat([f'S{i:03d}' for i in range(n_symbols)], lengths),
+        'accepted_date': dates,
+        'Adj Close': prices,
+        'ROE': roe,
+        'predicted_signal': rng.binomial(1, 0.5, n),
+    })
+    # Shuffle so the panel engines have to do their own (stable) sort
+    return panel.sample(frac=1, random_state=seed).sort_values('symbol_stock', kind='mergesort')
+
+
+def single_row_panel():
+    """Every symbol has exactly one row, so no trade has a row after its entry."""
+    return pd.DataFrame({
+        'symbol_stock': ['A', 'B', 'C'],
+        'accepted_date': pd.to_datetime(['2020-01-01', '2020-02-01', '2020-03-01']),
+        'Adj Close': [10.0, 20.0, 30.0],
+        'ROE': [0.1, 0.2, 0.3],
+        'predicted_signal': [1, 1, 0],
+    })
+
+
+def make_synthetic_dir(tmp_path_factory, **kwargs):
+    """A fresh directory of synthetic input files; kwargs go to generate_synthetic_data."""
+    directory = tmp_path_factory.mktemp('synthetic')
+    generate_synthetic_data(str(directory), **kwargs)
+    return directory
+
+
+@pytest.fixture(scope='session')
+def synthetic_dir(tmp_path_factory):
+    return make_synthetic_dir(tmp_path_factory, n_symbols=40, n_quarters=30)
@@ -0,0 +1,50 @@
+import pandas as pd
+import pytest
+
+from backtest import (simulate_trades_for_stock_baseline, simulate_trades_for_stock_enhanced,
+                      simulate_trades_panel_baseline, simulate_trades_panel_enhanced)
+from conftest import random_panel, single_row_panel
+
+TRANSACTION_COST, SLIPPAGE = 0.005, 0.002
+
+
+def per_stock_trades(simulate, panel, **kwargs):
+    """The per-stock simulator applied to each symbol of the (symbol, date)-sorted panel."""
+    panel = panel.sort_values(['symbol_stock', 'accepted_date'], kind='mergesort')
+    trades = []
+    for _, stock_df in panel.groupby('symbol_stock', sort=True):
+        trades += simulate(stock_df, TRANSACTION_COST, SLIPPAGE, **kwargs)
+    return pd.DataFrame(trades)
+
+
+PANELS = {
+    'random': lambda: random_panel(0),
+    'ties': lambda: random_panel(1, ties=True),
+    'mostly_single_rows': lambda: random_panel(2, n_symbols=20, single_row_symbols=15),
+    'single_rows': single_row_panel,
+}
+
+
+@pytest.mark.parametrize('name', PANELS)
+def test_panel_baseline_matches_per_stock(name):
+    panel = PANELS[name]()
+    expected = per_stock_trades(simulate_trades_for_stock_baseline, panel)
+    actual = simulate_trades_panel_baseline(panel, TRANSACTION_COST, SLIPPAGE)
+    pd.testing.assert_frame_equal(actual, expected)
+
+
+@pytest.mark.parametrize('max_hold_periods', [1, 2, 4, 20])
+@pytest.mark.parametrize('name', PANELS)
+def test_panel_enhanced_matches_per_stock(name, max_hold_periods):
+    panel = PANELS[name]()
+    expected = per_stock_trades(simulate_trades_for_stock_enhanced, panel, max_hold_periods=max_hold_periods)
+    actual = simulate_trades_panel_enhanced(panel, TRANSACTION_COST, SLIPPAGE, max_hold_periods=max_hold_periods)
+    pd.testing.assert_frame_equal(actual, expected)
+
+
+def test_single_row_symbols_exit_at_end_of_data():
+    trades = simulate_trades_panel_enhanced(single_row_panel(), TRANSACTION_COST, SLIPPAGE)
+    assert list(trades['symbol_stock']) == ['A', 'B']
+    assert (trades['entry_date'] == trades['exit_date']).all()
+    assert (trades['exit_reason'] == 'end_of_data').all()
+    assert (trades['hold_periods'] == 1).all()
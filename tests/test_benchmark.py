@@ -0,0 +1,36 @@
+import json
+
+import pandas as pd
+
+from benchmark import append_history, compare_to_history, environment, load_history
+
+
+def test_baseline_only_uses_runs_from_this_environment(tmp_path):
+    history_path = tmp_path / 'history.jsonl'
+    results = pd.DataFrame([{'tier': '1x', 'benchmark': 'preprocess', 'median_s': 1.0}])
+    # A much faster run on another machine, and one from before fingerprints were complete
+    other = {**environment(), 'machine': 'elsewhere'}
+    legacy = {key: value for key, value in environment().items() if key != 'cpu_count'}
+    with open(history_path, 'w') as f:
+        for fields in (other, legacy):
+            f.write(json.dumps({'timestamp': 't', 'commit': 'c', **fields,
+                                'results': [{**results.iloc[0].to_dict(), 'median_s': 0.1}]}) + '\n')
+
+    comparison = compare_to_history(results, load_history(history_path))
+    assert comparison['baseline_s'].isna().all() and not comparison['regression'].any()
+
+    append_history(results.assign(median_s=0.9), history_path)
+    append_history(results.assign(median_s=1.1), history_path)
+    comparison = compare_to_history(results, load_history(history_path))
+    assert comparison.loc[0, 'baseline_s'] == 1.0
+    assert not comparison.loc[0, 'regression']
+
+    everything = compare_to_history(results, load_history(history_path), fingerprint={})
+    assert everything.loc[0, 'regression']
+
+
+def test_empty_history(tmp_path):
+    history = load_history(tmp_path / 'missing.jsonl')
+    assert set(environment()) <= set(history.columns)
+    results = pd.DataFrame([{'tier': '1x', 'benchmark': 'preprocess', 'median_s': 1.0}])
+    assert compare_to_history(results, history)['baseline_s'].isna().all()
@@ -0,0 +1,35 @@
+import pandas as pd
+
+from src.cache import StageCache
+
+
+def row_count(path):
+    return pd.DataFrame({'rows': [sum(1 for _ in open(path))]})
+
+
+def test_disabled_cache_does_not_hash_files(tmp_path, monkeypatch):
+    path = tmp_path / 'input.csv'
+    path.write_text('a\n1\n2\n')
+
+    def fail(self, path):
+        raise AssertionError(f'{path} hashed with caching disabled')
+    monkeypatch.setattr(StageCache, '_file_hash', fail)
+    cache = StageCache(cache_dir=None)
+    assert cache.result(cache.stage(row_count, cache.file(str(path))))['rows'].tolist() == [3]
+    assert cache.report()['status'].tolist() == ['computed']
+
+
+def test_file_key_follows_contents(tmp_path):
+    path = tmp_path / 'input.csv'
+    path.write_text('a\n1\n')
+    cache_dir = str(tmp_path / 'cache')
+
+    def run():
+        cache = StageCache(cache_dir=cache_dir)
+        rows = cache.result(cache.stage(row_count, cache.file(str(path))))['rows'].tolist()
+        return rows, cache.report()['status'].tolist()
+
+    assert run() == ([2], ['computed'])
+    assert run() == ([2], ['hit'])
+    path.write_text('a\n1\n2\n')
+    assert run() == ([3], ['computed'])
@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.feature_matrix import FeatureMatrix, default_feature_columns, export_feature_matrix
+from src.main import preprocess
+
+
+@pytest.fixture(scope='module')
+def final_df(synthetic_dir):
+    df = preprocess(cache_dir=None, data_dir=str(synthetic_dir))
+    # An infinite ratio, which the export stores as NaN
+    df.loc[df.index[3], 'ROE'] = np.inf
+    return df
+
+
+@pytest.fixture(scope='module')
+def matrix(final_df, tmp_path_factory):
+    directory = tmp_path_factory.mktemp('features')
+    export_feature_matrix(final_df, str(directory))
+    return FeatureMatrix(str(directory))
+
+
+def expected_block(df, features):
+    return df[features].astype(float).replace([np.inf, -np.inf], np.nan).to_numpy(dtype=np.float32)
+
+
+def test_export_round_trip(final_df, matrix):
+    features = default_feature_columns(final_df)
+    assert matrix.features == features and len(matrix) == len(final_df)
+    assert isinstance(matrix.X, np.memmap) and matrix.X.dtype == np.float32 and matrix.X.flags['C_CONTIGUOUS']
+
+    X, y = matrix.take()
+    np.testing.assert_array_equal(X, expected_block(final_df, features))
+    labels = final_df['good_stock'].to_numpy(dtype=float, na_value=np.nan)
+    np.testing.assert_array_equal(y, np.where(np.isnan(labels), -1, labels))
+    index = matrix.index()
+    assert index['symbol_stock'].astype(str).tolist() == final_df['symbol_stock'].astype(str).tolist()
+    np.testing.assert_array_equal(index['accepted_date'].to_numpy(), pd.to_datetime(final_df['accepted_date']).to_numpy())
+
+
+def test_row_and_column_index_match_the_frame(final_df, matrix):
+    features = default_feature_columns(final_df)
+    chosen = features[-3:] + features[:2]
+    columns = matrix.column_index(chosen)
+    np.testing.assert_array_equal(columns, [features.index(name) for name in chosen])
+    with pytest.raises(KeyError):
+        matrix.column_index(['not_a_feature'])
+
+    dates = pd.to_datetime(final_df['accepted_date'])
+    start, end = dates.quantile(0.25), dates.quantile(0.75)
+    symbols = sorted(final_df['symbol_stock'].astype(str).unique())[::3]
+    rows = matrix.row_index(start, end, symbols=symbols, complete_columns=columns)
+
+    # The notebooks' filter: date window, symbols, labelled, then dropna over the features
+    block = final_df[chosen].astype(float).replace([np.inf, -np.inf], np.nan)
+    keep = ((dates >= start) & (dates < end) & final_df['symbol_stock'].astype(str).isin(symbols)
+            & final_df['good_stock'].notna() & block.notna().all(axis=1))
+    np.testing.assert_array_equal(rows, np.flatnonzero(keep.to_numpy()))
+    assert len(rows) > 0
+
+    X, y = matrix.take(rows, columns)
+    np.testing.assert_array_equal(X, expected_block(final_df.iloc[rows], chosen))
+    np.testing.assert_array_equal(y, final_df['good_stock'].iloc[rows].to_numpy(dtype=np.int8))
+    assert not isinstance(X, np.memmap)
+
+    # Every row, labelled or not, when nothing is filtered
+    np.testing.assert_array_equal(matrix.row_index(labelled=False), np.arange(len(final_df)))
+
+
+def test_reexport_replaces_previous(final_df, tmp_path):
+    export_feature_matrix(final_df, str(tmp_path))
+    subset = final_df.iloc[::2].reset_index(drop=True)
+    export_feature_matrix(subset, str(tmp_path), features=['ROE'])
+    matrix = FeatureMatrix(str(tmp_path))
+    assert matrix.features == ['ROE'] and len(matrix) == len(subset)
+    np.testing.assert_array_equal(matrix.take()[0], expected_block(subset, ['ROE']))
@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.datasets import make_classification
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.linear_model import LogisticRegression
+
+import importance
+from importance import data_hash, importance_table, permutation_importance, shap_importance, stratified_sample
+
+
+def test_data_hash_accepts_string_labels():
+    X = np.arange(6, dtype=float).reshape(3, 2)
+    labels = np.array(['good', 'bad', 'good'])
+    assert data_hash(X, labels) == data_hash(X, labels.copy())
+    assert data_hash(X, labels) != data_hash(X, np.array(['good', 'good', 'bad']))
+
+
+@pytest.fixture(scope='module')
+def fitted():
+    X, y = make_classification(n_samples=300, n_features=6, n_informative=3, weights=[0.8], random_state=0)
+    X = pd.DataFrame(X, columns=[f'f{j}' for j in range(X.shape[1])])
+    models = {'tree': RandomForestClassifier(n_estimators=10, max_depth=3, random_state=0).fit(X, y),
+              'agnostic': LogisticRegression().fit(X, y)}
+    return models, X, y
+
+
+def test_stratified_sample_keeps_class_proportions():
+    y = np.repeat(['a', 'b', 'c'], [700, 200, 100])
+    rows = stratified_sample(y, 100, seed=0)
+    assert len(rows) == len(np.unique(rows)) == 100
+    labels, counts = np.unique(y[rows], return_counts=True)
+    assert list(labels) == ['a', 'b', 'c'] and list(counts) == [70, 20, 10]
+
+
+@pytest.mark.parametrize('kind', ['tree', 'agnostic'])
+def test_shap_is_independent_of_n_jobs(fitted, kind):
+    models, X, y = fitted
+    kwargs = {'background_size': 10, 'eval_size': 30, 'batch_rows': 8, 'explainer': kind}
+    serial = shap_importance(models[kind], X, y, n_jobs=1, **kwargs)
+    parallel = shap_importance(models[kind], X, y, n_jobs=2, **kwargs)
+    pd.testing.assert_frame_equal(serial, parallel)
+
+
+def test_permutation_is_independent_of_n_jobs(fitted):
+    models, X, y = fitted
+    serial = permutation_importance(models['tree'], X, y, n_repeats=3, n_jobs=1)
+    parallel = permutation_importance(models['tree'], X, y, n_repeats=3, n_jobs=2)
+    pd.testing.assert_frame_equal(serial, parallel)
+
+
+@pytest.mark.parametrize('method', ['shap', 'permutation'])
+def test_second_call_is_served_from_cache(fitted, method, tmp_path, monkeypatch):
+    models, X, y = fitted
+    table = importance_table(models['tree'], X, y, methods=[method], cache_dir=str(tmp_path))
+    assert len(list(tmp_path.glob(f'{method}-*.parquet'))) == 1
+
+    def recompute(*args):
+        raise AssertionError('importance recomputed instead of read from the cache')
+    monkeypatch.setattr(importance, '_map', recompute)
+    pd.testing.assert_frame_equal(importance_table(models['tree'], X, y, methods=[method],
+                                                   cache_dir=str(tmp_path)), table)
@@ -0,0 +1,62 @@
+import shutil
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.incremental import build_incremental_state, finalize_incremental_state, update_incremental_state
+from src.ingestion import restore_string_columns
+from src.main import preprocess
+from src.preprocessing import load_financial_data, load_sp500_data, select_universe
+
+
+def canonical(df: pd.DataFrame) -> pd.DataFrame:
+    return df.sort_values(['symbol_stock', 'accepted_date'], kind='mergesort').reset_index(drop=True)
+
+
+def append_latest_filings(source, target, rng, late_filings=0):
+    """
+    Copy the synthetic data to target with the latest 1-3 filings of a random subset of
+    symbols moved to the end of merged_fullstock_data.csv, as a new batch of filings would
+    be appended, together with `late_filings` random older filings (filed late, so they
+    sort into the middle of their symbol's history). Half of the chosen symbols lose their
+    revenue after their first filing, so growth rates forward-fill from far before the
+    delta. Returns the number of rows before the delta.
+    """
+    shutil.copytree(source, target)
+    raw = pd.read_csv(target / 'merged_fullstock_data.csv', dtype=str, keep_default_na=False)
+    symbols = raw['symbol_stock'].unique()
+    chosen = rng.choice(symbols, size=int(rng.integers(1, len(symbols) + 1)), replace=False)
+    latest = {symbol: int(rng.integers(1, 4)) for symbol in chosen}
+    rank = raw.groupby('symbol_stock')['acceptedDate'].rank(method='first', ascending=False)
+    in_delta = rank <= raw['symbol_stock'].map(latest).fillna(0)
+    first = raw.groupby('symbol_stock')['acceptedDate'].rank(method='first') == 1
+    gaps = raw['symbol_stock'].isin(chosen[::2]) & ~first & ~in_delta
+    raw.loc[gaps, 'revenue'] = ''
+    in_delta[rng.choice(np.flatnonzero(~in_delta), size=late_filings, replace=False)] = True
+    delta = raw[in_delta].sort_values('acceptedDate', kind='mergesort')
+    pd.concat([raw[~in_delta], delta]).to_csv(target / 'merged_fullstock_data.csv', index=False)
+    return int((~in_delta).sum())
+
+
+@pytest.mark.parametrize('late_filings', [0, 25])
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_update_matches_fresh_preprocess(synthetic_dir, tmp_path, seed, late_filings):
+    rng = np.random.default_rng(seed)
+    data_dir = tmp_path / 'data'
+    n_base = append_latest_filings(synthetic_dir, data_dir, rng, late_filings)
+
+    financial_df = load_financial_data(str(data_dir / 'merged_fullstock_data.csv'))
+    sp_df = load_sp500_data(str(data_dir / 'sp.csv'))
+    universe = select_universe(str(data_dir / 'adjclose_stock.csv'))
+
+    # The state was built when the S&P history ended somewhere in the last third
+    cutoff = sp_df['acceptedDate'].quantile(rng.uniform(0.67, 1.0))
+    state = build_incremental_state(financial_df.iloc[:n_base].reset_index(drop=True),
+                                    sp_df[sp_df['acceptedDate'] <= cutoff].copy())
+    state = update_incremental_state(state, financial_df.iloc[n_base:].reset_index(drop=True), sp_df.copy())
+    updated = restore_string_columns(finalize_incremental_state(state, universe))
+
+    fresh = preprocess(cache_dir=None, data_dir=str(data_dir))
+    assert list(updated.columns) == list(fresh.columns)
+    pd.testing.assert_frame_equal(canonical(updated), canonical(fresh))
@@ -0,0 +1,40 @@
+import pandas as pd
+import pytest
+
+from src.ingestion import FINANCIAL_SCHEMA, count_csv_rows, read_csv_with_schema
+from src.synthetic import generate_synthetic_data
+
+
+@pytest.fixture(scope='module')
+def financial_csv(tmp_path_factory):
+    directory = tmp_path_factory.mktemp('synthetic')
+    generate_synthetic_data(str(directory), n_symbols=20, n_quarters=20)
+    raw = pd.read_csv(directory / 'merged_fullstock_data.csv', dtype=str, keep_default_na=False)
+    # Edge cases of a chunked read: a missing symbol, a quoted newline and an integer
+    # column that is only missing a value in the last chunk
+    raw.loc[raw.index[3], 'symbol_stock'] = ''
+    raw['note'] = ''
+    raw.loc[raw.index[50], 'note'] = 'two\nlines'
+    raw.loc[raw.index[-1], 'quarter_number'] = ''
+    path = directory / 'edge.csv'
+    raw.to_csv(path, index=False)
+    return str(path), len(raw)
+
+
+@pytest.mark.parametrize('chunksize', [1, 37, 10_000])
+def test_chunked_read_matches_single_read(financial_csv, chunksize):
+    path, n_rows = financial_csv
+    df = read_csv_with_schema(path, FINANCIAL_SCHEMA, chunksize=chunksize)
+    expected = pd.read_csv(path, dtype={'symbol_stock': 'category', 'Sector': 'category',
+                                        **{col: t for col, t in FINANCIAL_SCHEMA['columns'].items()
+                                           if t not in (None, 'category')}})
+    for col in ['symbol_stock', 'Sector']:
+        expected[col] = expected[col].cat.reorder_categories(expected[col].cat.categories.sort_values())
+    assert len(df) == n_rows
+    pd.testing.assert_frame_equal(df, expected)
+
+
+def test_count_csv_rows(financial_csv):
+    path, n_rows = financial_csv
+    # The quoted newline is counted as a row: the count is an upper bound
+    assert count_csv_rows(path) == n_rows + 1
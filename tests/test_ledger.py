@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from analytics import exit_reason_breakdown, quarterly_returns, symbol_stats
+from ledger import TradeLedger
+
+
+@pytest.fixture
+def trades():
+    """Enhanced-simulator trades with missing exit reasons, NaN returns and a quarter of only NaN returns."""
+    rng = np.random.default_rng(0)
+    n = 40
+    entry = pd.Timestamp('2015-01-01') + pd.to_timedelta(rng.integers(0, 700, n), 'D')
+    returns = rng.normal(0.01, 0.1, n)
+    returns[[3, 17]] = np.nan
+    reasons = rng.choice(['stop_loss/take_profit', 'max_hold_period', 'signal_change', 'end_of_data'], n).astype(object)
+    reasons[[0, 9]] = None
+    trades = pd.DataFrame({
+        'symbol_stock': rng.choice(['AAA', 'BBB', 'CCC', 'DDD'], n).astype(object),
+        'entry_date': entry,
+        # Some exits fall on the entry day, which quarterly_returns does not count
+        'exit_date': entry + pd.to_timedelta(rng.integers(0, 200, n), 'D'),
+        'trade_return': returns,
+        'position_size': rng.uniform(10, 100, n),
+        'hold_periods': rng.integers(1, 5, n),
+        'exit_reason': reasons,
+    })
+    # The only trade exiting in 2018Q2
+    trades.loc[5, ['entry_date', 'exit_date', 'trade_return']] = [pd.Timestamp('2018-03-01'),
+                                                                  pd.Timestamp('2018-05-01'), np.nan]
+    return trades
+
+
+def test_frame_round_trip(trades):
+    pd.testing.assert_frame_equal(TradeLedger.from_frame(trades).to_frame(), trades)
+
+
+def test_append_matches_from_arrays(trades):
+    appended = TradeLedger(capacity=4)
+    for trade in trades.to_dict(orient='records'):
+        appended.append(trade)
+    arrays = TradeLedger.from_arrays(trades['symbol_stock'], trades['entry_date'], trades['exit_date'],
+                                     trades['trade_return'].to_numpy(), position_size=trades['position_size'],
+                                     hold_periods=trades['hold_periods'], exit_reason=trades['exit_reason'])
+    assert appended.columns == arrays.columns and appended.symbols == arrays.symbols
+    for name in appended.columns:
+        np.testing.assert_array_equal(appended[name], arrays[name])
+    pd.testing.assert_frame_equal(appended.to_frame(), arrays.to_frame())
+
+
+def test_quarterly_returns_match_notebook(trades):
+    start, end = pd.Timestamp('2014-10-01'), pd.Timestamp('2018-12-31')
+    valid = trades[trades['entry_date'] < trades['exit_date']]
+    expected = valid.groupby(valid['exit_date'].dt.to_period('Q'))['trade_return'].mean()
+    expected = expected.reindex(pd.period_range(start, end, freq='Q'), fill_value=-0.01)
+    actual = quarterly_returns(trades, start, end)
+    np.testing.assert_allclose(actual.to_numpy(), expected.to_numpy(), rtol=1e-12)
+    assert actual.index.equals(expected.index)
+    # A quarter holding only a NaN return stays NaN instead of taking fill_value
+    assert np.isnan(actual[pd.Period('2018Q2')]) and actual[pd.Period('2018Q3')] == -0.01
+
+
+def grouped(trades, by):
+    """The per-group statistics of exit_reason_breakdown / symbol_stats with pandas groupby."""
+    groups = trades.groupby(by)
+    returns = groups['trade_return']
+    return pd.DataFrame({
+        'n_trades': groups.size(),
+        'share': groups.size() / len(trades),
+        'mean_return': returns.mean(),
+        'win_rate': returns.apply(lambda r: (r > 0).sum() / r.count()),
+        'best_return': returns.max(),
+        'worst_return': returns.min(),
+        'mean_hold_periods': groups['hold_periods'].mean(),
+    })
+
+
+def test_exit_reason_breakdown_matches_groupby(trades):
+    actual = exit_reason_breakdown(trades)
+    expected = grouped(trades.dropna(subset=['exit_reason']), 'exit_reason').reindex(actual.index)
+    pd.testing.assert_frame_equal(actual, expected, check_dtype=False, check_names=False)
+
+
+def test_symbol_stats_match_groupby(trades):
+    expected = grouped(trades, 'symbol_stock')
+    expected['compounded_return'] = trades.groupby('symbol_stock')['trade_return'].apply(lambda r: (1 + r).prod() - 1)
+    pd.testing.assert_frame_equal(symbol_stats(trades), expected, check_dtype=False, check_names=False)
@@ -0,0 +1,27 @@
+import pandas as pd
+import pytest
+
+from backtest import simulate_portfolio, simulate_trades_for_stock_enhanced
+from conftest import random_panel
+from test_backtest_parity import SLIPPAGE, TRANSACTION_COST, per_stock_trades
+
+
+@pytest.mark.parametrize('max_hold_periods', [1, 2, 4])
+@pytest.mark.parametrize('ties', [False, True])
+def test_unconstrained_portfolio_matches_per_stock(ties, max_hold_periods):
+    panel = random_panel(1, ties=ties)
+    expected = per_stock_trades(simulate_trades_for_stock_enhanced, panel, max_hold_periods=max_hold_periods)
+    trades, _ = simulate_portfolio(panel, TRANSACTION_COST, SLIPPAGE, max_hold_periods=max_hold_periods,
+                                   account_balance=1e12, max_open_positions=len(panel))
+    trades = trades.sort_values(['symbol_stock', 'entry_date', 'exit_date'], kind='mergesort')
+    pd.testing.assert_frame_equal(trades[expected.columns].reset_index(drop=True), expected)
+
+
+@pytest.mark.parametrize('ties', [False, True])
+def test_cash_and_positions_stay_within_limits(ties):
+    panel = random_panel(3, ties=ties)
+    trades, equity = simulate_portfolio(panel, TRANSACTION_COST, SLIPPAGE, account_balance=60000,
+                                        max_open_positions=3, equity_freq='D')
+    assert len(trades) > 0 and equity['entries_skipped'].iloc[-1] > 0
+    assert (equity['cash'] >= 0).all()
+    assert (equity['open_positions'] <= 3).all()
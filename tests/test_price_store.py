@@ -0,0 +1,99 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.preprocessing import merge_with_future_prices
+from src.price_store import PriceStore, add_forward_targets
+
+NAN = np.nan
+
+
+@pytest.fixture
+def store():
+    return PriceStore.from_frame(pd.DataFrame({
+        'Stock': ['B', 'A', 'A', 'A'],
+        'Date': pd.to_datetime(['2020-01-02', '2020-01-10', '2020-01-01', '2020-01-03']),
+        'Adj Close': [20.0, 12.0, 10.0, 11.0],
+    }))
+
+
+def assert_lookup(store, symbols, dates, prices, matched, **kwargs):
+    actual_prices, actual_matched = store.lookup(symbols, pd.to_datetime(dates), **kwargs)
+    np.testing.assert_array_equal(actual_prices[:, 0], prices)
+    assert [str(day) for day in actual_matched[:, 0]] == matched
+
+
+def test_forward_lookup_stays_within_symbol(store):
+    # A on 2020-01-11 is past A's last price; the next key in the store belongs to B
+    assert_lookup(store, ['A', 'A', 'A', 'B'], ['2020-01-02', '2020-01-03', '2020-01-11', '2020-01-01'],
+                  [11.0, 11.0, NAN, 20.0], ['2020-01-03', '2020-01-03', 'NaT', '2020-01-02'])
+
+
+def test_backward_lookup_stays_within_symbol(store):
+    # B on 2020-01-01 is before B's first price; the previous key in the store belongs to A
+    assert_lookup(store, ['A', 'A', 'A', 'B'], ['2020-01-02', '2020-01-03', '2020-01-11', '2020-01-01'],
+                  [10.0, 11.0, 12.0, NAN], ['2020-01-01', '2020-01-03', '2020-01-10', 'NaT'],
+                  direction='backward')
+
+
+def test_horizons_share_one_lookup(store):
+    prices, matched = store.lookup(['A', 'B'], pd.to_datetime(['2020-01-01', '2020-01-01']), horizons=(0, 2, 7))
+    np.testing.assert_array_equal(prices, [[10.0, 11.0, 12.0], [20.0, NAN, NAN]])
+    assert matched.dtype == np.dtype('datetime64[D]') and matched.shape == (2, 3)
+
+
+def test_missing_symbol_and_date(store):
+    assert_lookup(store, ['Z', 'A', 'A'], [pd.Timestamp('2020-01-01'), pd.NaT, pd.Timestamp('2020-01-01')],
+                  [NAN, NAN, 10.0], ['NaT', 'NaT', '2020-01-01'])
+    assert_lookup(store, 'Z', ['2020-01-01'], [NAN], ['NaT'])
+
+
+def test_tolerance_days(store):
+    # The first price on or after 2020-01-04 is 6 days later
+    assert_lookup(store, ['A'], ['2020-01-04'], [NAN], ['NaT'], tolerance_days=5)
+    assert_lookup(store, ['A'], ['2020-01-04'], [12.0], ['2020-01-10'], tolerance_days=6)
+    assert_lookup(store, ['A'], ['2020-01-12'], [12.0], ['2020-01-10'], direction='backward', tolerance_days=2)
+    assert_lookup(store, ['A'], ['2020-01-13'], [NAN], ['NaT'], direction='backward', tolerance_days=2)
+
+
+def test_good_stock_is_missing_without_future_price(store):
+    market = PriceStore.from_series(pd.date_range('2019-12-01', '2020-03-01'), np.linspace(100, 101, 92))
+    df = pd.DataFrame({'symbol_stock': ['A', 'A', 'Z'],
+                       'accepted_date': pd.to_datetime(['2020-01-01', '2020-01-09', '2020-01-01'])})
+    targets = add_forward_targets(df, store, market, horizons=(2, 30))
+    assert targets['good_stock_2d'].dtype == 'Int8'
+    assert targets['good_stock_2d'].tolist()[0] == 1
+    assert targets['good_stock_2d'].isna().tolist() == [False, True, True]
+    assert targets['good_stock_30d'].isna().all()
+    assert targets['log_return_future_30d'].isna().all()
+
+
+def baseline_merge_with_future_prices(df):
+    """merge_with_future_prices as it was before the horizon parameter."""
+    df_prices = df[['symbol_stock', 'accepted_date', 'Adj Close', 'Close']].rename(
+        columns={'accepted_date': 'future_date', 'Adj Close': 'future_price', 'Close': 'future_dji'}
+    ).sort_values('future_date')
+    df = df.dropna(subset=['accepted_date'])
+    df['target_date'] = df['accepted_date'] + pd.Timedelta(days=90)
+    df_prices = df_prices.dropna(subset=['future_date'])
+    return pd.merge_asof(left=df.sort_values('target_date'), right=df_prices, left_on='target_date',
+                         right_on='future_date', by='symbol_stock', direction='forward')
+
+
+def test_default_horizon_matches_baseline():
+    rng = np.random.default_rng(0)
+    n_symbols, n_quarters = 20, 16
+    n = n_symbols * n_quarters
+    offsets = np.tile(np.arange(n_quarters) * 91, n_symbols) + rng.integers(0, 60, n)
+    df = pd.DataFrame({
+        'symbol_stock': np.repeat([f'S{i:02d}' for i in range(n_symbols)], n_quarters),
+        'accepted_date': pd.Timestamp('2010-01-01') + pd.to_timedelta(offsets, 'D'),
+        'Adj Close': rng.lognormal(size=n),
+        'Close': rng.lognormal(size=n),
+    }).drop_duplicates(['symbol_stock', 'accepted_date'])
+    df.loc[df.index[::37], 'accepted_date'] = pd.NaT
+
+    def canonical(frame):
+        return frame.sort_values(['symbol_stock', 'accepted_date'], kind='mergesort').reset_index(drop=True)
+    pd.testing.assert_frame_equal(canonical(merge_with_future_prices(df.copy())),
+                                  canonical(baseline_merge_with_future_prices(df.copy())))
@@ -0,0 +1,76 @@
+import json
+
+import numpy as np
+import pytest
+
+from src.main import preprocess
+from src.profiling import StageProfiler
+
+STAGES = ['load_financial_data', 'fix_financial_columns', 'calculate_financial_metrics', 'load_sp500_data',
+          'merge_sp500', 'add_target_and_features', 'merge_with_future_prices', 'calculate_final_returns',
+          'clean_final_df', 'select_universe', 'apply_universe_filters']
+
+
+@pytest.fixture(scope='module')
+def profiled(synthetic_dir):
+    profiler = StageProfiler()
+    final_df = preprocess(cache_dir=None, data_dir=str(synthetic_dir), profiler=profiler)
+    return profiler, final_df
+
+
+def test_every_stage_is_recorded(profiled):
+    profiler, final_df = profiled
+    report = profiler.report().set_index('stage')
+    assert sorted(report.index) == sorted(STAGES)
+    # Stages run once their inputs are ready, so each appears after the stages feeding it
+    order = {stage: i for i, stage in enumerate(report.index)}
+    assert order['load_financial_data'] < order['fix_financial_columns'] < order['calculate_financial_metrics']
+    assert order['load_sp500_data'] < order['merge_sp500'] < order['add_target_and_features']
+    assert order['select_universe'] < order['apply_universe_filters'] == len(STAGES) - 1
+    assert (report['status'] == 'computed').all()
+    assert (report['wall_time_s'] >= 0).all() and (report['peak_memory_mb'] >= 0).all()
+
+    # Each stage's input shapes are the output shapes of the stages feeding it
+    assert report.loc['fix_financial_columns', 'input_rows'] == [report.loc['load_financial_data', 'output_rows']]
+    assert report.loc['merge_sp500', 'input_rows'] == [report.loc['calculate_financial_metrics', 'output_rows'],
+                                                       report.loc['load_sp500_data', 'output_rows']]
+    assert report.loc['apply_universe_filters', 'input_rows'] == [report.loc['clean_final_df', 'output_rows'],
+                                                                  report.loc['select_universe', 'output_rows']]
+    assert report.loc['apply_universe_filters', 'output_rows'] == len(final_df)
+    assert report.loc['apply_universe_filters', 'output_columns'] == final_df.shape[1]
+
+    # clean_final_df drops exactly the rows counted as non-finite in its input
+    assert report.loc['clean_final_df', 'nonfinite_key_rows'] == 0
+    assert (report.loc['calculate_final_returns', 'output_rows'] - report.loc['calculate_final_returns', 'nonfinite_key_rows']
+            == report.loc['clean_final_df', 'output_rows'])
+    numeric = final_df.select_dtypes(include='number').to_numpy(dtype=float, na_value=np.nan)
+    assert report.loc['apply_universe_filters', 'nan_cells'] == np.isnan(numeric).sum()
+
+
+def test_cache_hits_are_recorded(synthetic_dir, tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    preprocess(cache_dir=cache_dir, data_dir=str(synthetic_dir))
+    profiler = StageProfiler(track_memory=False)
+    preprocess(cache_dir=cache_dir, data_dir=str(synthetic_dir), profiler=profiler)
+    report = profiler.report()
+    assert report['stage'].tolist() == ['apply_universe_filters'] and report['status'].tolist() == ['hit']
+    assert report['peak_memory_mb'].isna().all()
+
+
+def test_profile_path_writes_readable_json(synthetic_dir, tmp_path):
+    path = tmp_path / 'profile.json'
+    final_df = preprocess(cache_dir=None, data_dir=str(synthetic_dir), profile_path=str(path))
+    with open(path) as f:
+        stages = json.load(f)['stages']
+    assert sorted(stage['stage'] for stage in stages) == sorted(STAGES)
+    last = next(stage for stage in stages if stage['stage'] == 'apply_universe_filters')
+    assert last['output_rows'] == len(final_df)
+    assert all(isinstance(stage['wall_time_s'], float) for stage in stages)
+
+
+def test_table_lists_every_stage(profiled):
+    profiler, _ = profiled
+    table = profiler.table()
+    assert all(stage in table for stage in STAGES)
+    assert StageProfiler().table() == "(no stages recorded)"
+    assert json.loads(profiler.to_json())['stages'] == json.loads(json.dumps(profiler.records))
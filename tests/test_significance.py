@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from significance import bootstrap_trade_quarter_means, hierarchical_bootstrap
+
+QUARTERS = pd.period_range('2010Q1', periods=12, freq='Q')
+
+
+@pytest.fixture
+def trades():
+    rng = np.random.default_rng(0)
+    n = 300
+    trades = pd.DataFrame({'Quarter': rng.choice(QUARTERS[:-2], n), 'trade_return': rng.normal(0.01, 0.1, n)})
+    trades.loc[:4, 'Quarter'] = pd.NaT
+    return trades
+
+
+def test_inner_means_converge_to_quarter_means(trades):
+    means = bootstrap_trade_quarter_means(trades, QUARTERS, n_inner=4000, seed=1)
+    expected = trades.groupby('Quarter')['trade_return'].mean().reindex(QUARTERS, fill_value=-0.01)
+    assert means.index.equals(QUARTERS)
+    assert (means.iloc[-2:] == -0.01).all()
+    # Standard error of the bootstrap average is about std / sqrt(n_trades * n_inner)
+    np.testing.assert_allclose(means, expected, atol=0.002)
+
+
+def test_inner_draws_do_not_depend_on_block_size(trades):
+    small = bootstrap_trade_quarter_means(trades, QUARTERS, n_inner=50, seed=3, max_block_values=100)
+    large = bootstrap_trade_quarter_means(trades, QUARTERS, n_inner=50, seed=3)
+    pd.testing.assert_series_equal(small, large)
+    assert not small.equals(bootstrap_trade_quarter_means(trades, QUARTERS, n_inner=50, seed=4))
+
+
+def test_no_trades_gives_fill_value(trades):
+    means = bootstrap_trade_quarter_means(trades.iloc[:0], QUARTERS, seed=0)
+    assert (means == -0.01).all() and means.index.equals(QUARTERS)
+
+
+def test_hierarchical_bootstrap_is_reproducible(trades):
+    first = hierarchical_bootstrap(trades, QUARTERS, n_inner=200, n_outer=500, seed=7)
+    pd.testing.assert_frame_equal(first, hierarchical_bootstrap(trades, QUARTERS, n_inner=200, n_outer=500, seed=7))
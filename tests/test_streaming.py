@@ -0,0 +1,55 @@
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from src.main import preprocess
+from src.streaming import OUTPUT_MARKER, load_streamed_output, partition_by_symbol, preprocess_streaming
+
+
+def test_streaming_matches_preprocess(synthetic_dir, tmp_path):
+    expected = preprocess(cache_dir=None, data_dir=str(synthetic_dir))
+    parts = preprocess_streaming(str(tmp_path / 'out'), data_dir=str(synthetic_dir), chunksize=100)
+    assert len(parts) > 1
+    pd.testing.assert_frame_equal(load_streamed_output(str(tmp_path / 'out')), expected)
+
+
+def test_one_file_per_bucket(synthetic_dir, tmp_path):
+    # A missing quarter_number after the first chunk must not change the column's type
+    raw = pd.read_csv(synthetic_dir / 'merged_fullstock_data.csv', dtype=str, keep_default_na=False)
+    raw.loc[raw.index[-1], 'quarter_number'] = ''
+    filepath = str(tmp_path / 'merged_fullstock_data.csv')
+    raw.to_csv(filepath, index=False)
+    bucket_dir = tmp_path / 'buckets'
+    bucket_dir.mkdir()
+
+    buckets = partition_by_symbol(filepath, str(bucket_dir), 4, chunksize=50)
+    assert sorted(os.listdir(bucket_dir)) == [os.path.basename(path) for path in buckets]
+    assert len({pq.read_schema(path) for path in buckets}) == 1
+    assert pq.read_schema(buckets[0]).field('quarter_number').type == pa.int64()
+
+    rows = pd.concat([pd.read_parquet(path) for path in buckets])
+    assert sorted(rows['_row']) == list(range(len(raw)))
+    assert all(group.is_monotonic_increasing for _, group in rows.groupby('symbol_stock')['_row'])
+    assert rows['quarter_number'].isna().sum() == 1
+
+
+def test_rerun_only_replaces_own_files(synthetic_dir, tmp_path):
+    output_dir = tmp_path / 'out'
+    preprocess_streaming(str(output_dir), data_dir=str(synthetic_dir), chunksize=100)
+    assert (output_dir / OUTPUT_MARKER).exists()
+    (output_dir / 'part-99999.parquet').write_bytes(b'stale')
+    (output_dir / 'notes.txt').write_text('keep me')
+    parts = preprocess_streaming(str(output_dir), data_dir=str(synthetic_dir), chunksize=1000)
+    assert sorted(p for p in os.listdir(output_dir) if p.startswith('part-')) == \
+        [os.path.basename(path) for path in parts]
+    assert (output_dir / 'notes.txt').read_text() == 'keep me'
+
+
+def test_refuses_foreign_directory(synthetic_dir, tmp_path):
+    (tmp_path / 'important.csv').write_text('a,b\n1,2\n')
+    with pytest.raises(ValueError, match='not written by preprocess_streaming'):
+        preprocess_streaming(str(tmp_path), data_dir=str(synthetic_dir))
+    assert (tmp_path / 'important.csv').exists()
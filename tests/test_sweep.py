@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from backtest import simulate_trades_panel_enhanced, sweep_enhanced_parameters
+from analytics import quarterly_returns, headline_metrics
+from conftest import random_panel, single_row_panel
+
+GRID = {
+    'stop_loss': [-0.05, -0.1],
+    'take_profit': [0.1, 0.2],
+    'max_hold_periods': [1, 4],
+    'transaction_cost': [0.005],
+    'slippage': [0.0, 0.002],
+}
+
+
+PANELS = {
+    'random': lambda: random_panel(0, n_symbols=30, n_quarters=20, single_row_symbols=0),
+    'single_rows': single_row_panel,
+}
+
+
+@pytest.mark.parametrize('name', PANELS)
+def test_sweep_is_independent_of_n_jobs(name):
+    panel = PANELS[name]()
+    serial = sweep_enhanced_parameters(panel, GRID)
+    parallel = sweep_enhanced_parameters(panel, GRID, n_jobs=2)
+    assert len(serial) == np.prod([len(values) for values in GRID.values()])
+    pd.testing.assert_frame_equal(serial, parallel)
+
+
+@pytest.mark.parametrize('name', PANELS)
+def test_sweep_matches_panel_simulator(name):
+    panel = PANELS[name]()
+    results = sweep_enhanced_parameters(panel, GRID, chunk_size=7)
+    for row in results.itertuples():
+        trades = simulate_trades_panel_enhanced(
+            panel, row.transaction_cost, row.slippage, stop_loss=row.stop_loss,
+            take_profit=row.take_profit, max_hold_periods=row.max_hold_periods)
+        assert row.n_trades == len(trades)
+        quarterly = quarterly_returns(trades, panel['accepted_date'].min(), panel['accepted_date'].max())
+        expected = headline_metrics(quarterly)
+        for metric, value in expected.items():
+            np.testing.assert_allclose(getattr(row, metric), value, rtol=1e-12, equal_nan=True)
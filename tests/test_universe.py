@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.preprocessing import select_universe, stream_universe
+
+
+def baseline_universe(filepath, categories_to_keep=None, start_date=None, end_date=None):
+    """load_stock_prices / add_market_cap_categories / filter_stock_prices as they were before streaming."""
+    df = pd.read_csv(filepath)
+    if start_date is not None:
+        df = df[pd.to_datetime(df['Date']) >= pd.Timestamp(start_date)]
+    if end_date is not None:
+        df = df[pd.to_datetime(df['Date']) <= pd.Timestamp(end_date)]
+    df['Market Cap'] = df['Adj Close'] * df['Volume']
+
+    def categorize_market_cap(market_cap):
+        if market_cap >= 200_000_000_000:
+            return 'Mega-cap'
+        elif market_cap >= 10_000_000_000:
+            return 'Big-cap'
+        elif market_cap >= 2_000_000_000:
+            return 'Mid-cap'
+        elif market_cap >= 250_000_000:
+            return 'Small-cap'
+        elif market_cap >= 50_000_000:
+            return 'Micro-cap'
+        else:
+            return 'Nano-cap'
+    df['Market Cap Category'] = df['Market Cap'].apply(categorize_market_cap)
+    if categories_to_keep is None:
+        categories_to_keep = ['Mega-cap', 'Big-cap', 'Mid-cap', 'Small-cap', 'Micro-cap']
+    return df[df['Market Cap Category'].isin(categories_to_keep)]['Stock'].unique().tolist()
+
+
+@pytest.fixture(scope='module')
+def price_file(synthetic_dir, tmp_path_factory):
+    """The synthetic daily prices with some missing volumes, prices and symbols."""
+    df = pd.read_csv(synthetic_dir / 'adjclose_stock.csv')
+    rng = np.random.default_rng(0)
+    for col, share in [('Volume', 0.05), ('Adj Close', 0.02), ('Stock', 0.01)]:
+        df.loc[rng.random(len(df)) < share, col] = np.nan
+    path = tmp_path_factory.mktemp('universe') / 'adjclose_stock.csv'
+    df.to_csv(path, index=False)
+    return str(path)
+
+
+@pytest.mark.parametrize('categories', [None, ['Mega-cap', 'Big-cap'], ['Micro-cap'], ['Nano-cap']])
+def test_select_universe_matches_in_memory_filter(synthetic_dir, price_file, categories):
+    for path in [str(synthetic_dir / 'adjclose_stock.csv'), price_file]:
+        expected = baseline_universe(path, categories)
+        assert select_universe(path, categories_to_keep=categories)['Stock'].tolist() == expected
+
+
+@pytest.mark.parametrize('chunksize', [97, 997, 10 ** 7])
+def test_chunk_size_does_not_change_universe(price_file, chunksize):
+    # A symbol qualifying in several chunks is still listed once, at its first qualifying day
+    categories = ['Mega-cap', 'Big-cap', 'Mid-cap']
+    universe = stream_universe(price_file, categories_to_keep=categories, chunksize=chunksize)
+    assert universe['Stock'].tolist() == baseline_universe(price_file, categories)
+
+
+def test_date_window(price_file):
+    dates = pd.to_datetime(pd.read_csv(price_file, usecols=['Date'])['Date'])
+    start, end = dates.quantile(0.4).normalize(), dates.quantile(0.6).normalize()
+    for window in [dict(start_date=start), dict(end_date=end), dict(start_date=start, end_date=end)]:
+        expected = baseline_universe(price_file, ['Mega-cap', 'Big-cap'], **window)
+        universe = stream_universe(price_file, categories_to_keep=['Mega-cap', 'Big-cap'], chunksize=5000, **window)
+        assert universe['Stock'].tolist() == expected
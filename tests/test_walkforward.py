@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import make_synthetic_dir
+from src.main import preprocess
+from walkforward import FEATURES, TARGET, _model_frame, build_fold_matrices, run_walk_forward, walk_forward_windows
+
+
+@pytest.fixture(scope='module')
+def final_df(tmp_path_factory):
+    directory = make_synthetic_dir(tmp_path_factory, n_symbols=40, n_quarters=60, seed=1)
+    return preprocess(cache_dir=None, data_dir=str(directory))
+
+
+def test_single_quarter_test_window(final_df):
+    # A test window shorter than a quarter holds at most one filing per symbol, so the
+    # backtest sees only single-row symbols
+    signals, timing, trades = run_walk_forward(final_df, '2013-01-01', last_test_end='2013-03-15',
+                                               models=('logistic_regression',))
+    assert len(timing) == 1
+    assert not signals.duplicated('symbol_stock').any()
+    assert (trades['exit_reason'] == 'end_of_data').all()
+    assert 0 < len(trades) == signals['predicted_signal'].sum()
+
+
+def test_fold_cache_key_covers_symbols(final_df, tmp_path):
+    frame = _model_frame(final_df, FEATURES, TARGET)
+    windows = walk_forward_windows(frame['accepted_date'], '2012-01-01', last_test_end='2013-01-01')
+    folds = build_fold_matrices(frame, windows, FEATURES, TARGET, str(tmp_path))
+    assert not any(fold['cached'] for fold in folds)
+    assert all(fold['cached'] for fold in build_fold_matrices(frame, windows, FEATURES, TARGET, str(tmp_path)))
+
+    relabelled = frame.assign(symbol_stock=np.roll(frame['symbol_stock'].to_numpy(), 1))
+    moved = build_fold_matrices(relabelled, windows, FEATURES, TARGET, str(tmp_path))
+    assert not any(fold['cached'] for fold in moved)
+    assert {fold['fold_dir'] for fold in moved}.isdisjoint(fold['fold_dir'] for fold in folds)
+
+
+def test_appended_quarter_keeps_earlier_folds(final_df, tmp_path):
+    frame = _model_frame(final_df, FEATURES, TARGET)
+    windows = walk_forward_windows(frame['accepted_date'], '2012-01-01', last_test_end='2012-12-31')
+    history = frame[frame['accepted_date'] < '2012-10-01']
+    build_fold_matrices(history, windows.iloc[:-1], FEATURES, TARGET, str(tmp_path))
+
+    # The rows of the new quarter are interleaved by symbol, moving every later row
+    folds = build_fold_matrices(frame, windows, FEATURES, TARGET, str(tmp_path))
+    assert [fold['cached'] for fold in folds] == [True] * (len(folds) - 1) + [False]
+    for fold in folds:
+        dates = frame['accepted_date'].iloc[fold['test_rows']]
+        assert ((dates >= fold['test_start']) & (dates < fold['test_end'])).all()
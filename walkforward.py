@@ -0,0 +1,268 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import make_scorer, recall_score
+from sklearn.model_selection import GridSearchCV, TimeSeriesSplit
+
+from backtest import simulate_trades_panel_enhanced
+
+TARGET = 'good_stock'
+
+# The raw (non-winsorized) feature set of only-fin-srvcs.ipynb
+FEATURES = [
+    'ROA', 'ROE', 'ROI',
+    'revenue_growth_quarterly', 'revenue_growth_annual', 'Profit_Margin',
+    'PB_ratio',
+    'Deferred_Revenue_to_Current_Liabilities', 'Deferred_Revenue_to_Revenue',
+    'cash_ratio', 'debt_ratio',
+    'totalInvestments_to_assets',
+    'ROE_lag1',
+    'epsdiluted_lag1', 'epsdiluted_lag4',
+    'ROE_roll4', 'ROE_roll8', 'ROA_roll4', 'ROA_roll8',
+    'free_cash_flow_yield_roll8',
+    'Profit_Margin_roll4',
+    'epsdiluted',
+    're_ratio_roll4',
+    're_ratio_roll8',
+]
+
+# Hyperparameter grids of the notebook's RF / XGB / LogisticRegression comparison
+PARAM_GRIDS = {
+    'random_forest': {'n_estimators': [100], 'max_depth': [5], 'min_samples_split': [2], 'max_features': [None]},
+    'xgboost': {'n_estimators': [100, 200], 'max_depth': [3, 5], 'learning_rate': [0.01, 0.1], 'subsample': [0.8, 1.0]},
+    'logistic_regression': {'C': [0.1, 1.0, 10.0], 'penalty': ['l2']},
+}
+
+# Enhanced backtest settings of the notebook's train_and_backtest
+BACKTEST_PARAMS = {'transaction_cost': 0.005, 'slippage': 0.002, 'stop_loss': -0.05, 'take_profit': 1.0,
+                   'max_hold_periods': 20, 'risk_per_trade': 1000, 'account_balance': 100000}
+
+_PANEL_COLUMNS = ['symbol_stock', 'accepted_date', 'Adj Close', 'ROE']
+
+# Empty file written after a fold's matrices, marking the fold directory complete
+FOLD_MARKER = '.complete'
+
+
+def custom_recall_scorer(y_true, y_pred):
+    """
+    Harmonic mean of the recall for class 0 and class 1, or 0 if the recall for class 0
+    (not good) is below 0.90, as in the notebooks.
+    """
+    recall0 = recall_score(y_true, y_pred, pos_label=0)
+    recall1 = recall_score(y_true, y_pred, pos_label=1)
+    if recall0 < 0.90:
+        return 0.0
+    if recall0 + recall1 == 0:
+        return 0.0
+    return 2 * (recall0 * recall1) / (recall0 + recall1)
+
+
+def make_model(name):
+    """An unfitted estimator for one of the PARAM_GRIDS model names."""
+    if name == 'random_forest':
+        return RandomForestClassifier(random_state=42)
+    if name == 'logistic_regression':
+        return LogisticRegression(solver='lbfgs', max_iter=1000, random_state=42)
+    if name == 'xgboost':
+        try:
+            from xgboost import XGBClassifier
+        except ImportError as e:
+            raise ImportError("The 'xgboost' model requires the xgboost package") from e
+        return XGBClassifier(eval_metric='logloss', random_state=42)
+    raise ValueError(f"Unknown model {name!r}; expected one of {sorted(PARAM_GRIDS)}")
+
+
+def walk_forward_windows(dates, first_test_start, last_test_end=None, test_months=3,
+                         train_months=None, mode='expanding') -> pd.DataFrame:
+    """
+    Consecutive walk-forward folds over a date column.
+
+    Each fold tests on [test_start, test_start + test_months) and trains on everything
+    before test_start ('expanding') or only the last train_months before it ('rolling').
+
+    Parameters:
+        dates: The accepted_date values the folds are laid over.
+        first_test_start: Start of the first test window (the notebook's train_cutoff).
+        last_test_end: Inclusive end of the last test window; defaults to the last date.
+        test_months: Length of each test window, which is also the retraining interval.
+        train_months: Training window length for mode='rolling'.
+        mode: 'expanding' or 'rolling'.
+
+    Returns:
+        A DataFrame with one row per fold: fold, train_start, train_end, test_start, test_end
+        (train_end and test_end are exclusive).
+    """
+    if mode not in ('expanding', 'rolling'):
+        raise ValueError(f"mode must be 'expanding' or 'rolling', got {mode!r}")
+    if mode == 'rolling' and train_months is None:
+        raise ValueError("mode='rolling' requires train_months")
+
+    dates = pd.to_datetime(pd.Series(dates))
+    last_test_end = pd.Timestamp(last_test_end) if last_test_end is not None else dates.max()
+    step = pd.DateOffset(months=test_months)
+
+    windows = []
+    test_start = pd.Timestamp(first_test_start)
+    while test_start <= last_test_end:
+        test_end = min(test_start + step, last_test_end + pd.Timedelta(1, 'ns'))
+        train_start = dates.min() if mode == 'expanding' else test_start - pd.DateOffset(months=train_months)
+        windows.append({'fold': len(windows), 'train_start': train_start, 'train_end': test_start,
+                        'test_start': test_start, 'test_end': test_end})
+        test_start = test_start + step
+    return pd.DataFrame(windows, columns=['fold', 'train_start', 'train_end', 'test_start', 'test_end'])
+
+
+def _model_frame(df, features, target):
+    """Rows usable for modelling, cleaned as in the notebooks: infinities to NaN, then dropna."""
+    frame = df[_PANEL_COLUMNS + [col for col in features + [target] if col not in _PANEL_COLUMNS]].copy()
+    frame['accepted_date'] = pd.to_datetime(frame['accepted_date'])
+    frame[features] = frame[features].replace([np.inf, -np.inf], np.nan)
+    return frame.dropna(subset=features + [target]).reset_index(drop=True)
+
+
+def build_fold_matrices(frame, windows, features, target, cache_dir) -> list:
+    """
+    Write each fold's X/y train and test matrices to cache_dir as .npy files, once.
+
+    A fold's directory is keyed by a hash of the fold's own train and test rows (symbols,
+    dates, features and target), the window bounds, the features and the target, so an
+    existing directory is reused as is and appending new filings only invalidates the folds
+    whose windows they fall in. Workers memory-map the files instead of receiving copies
+    of the data.
+
+    Returns:
+        One dict per fold with the window, the matrix directory, whether it was cached and
+        the frame positions of its test rows.
+    """
+    keyed = frame[['symbol_stock', 'accepted_date'] + features + [target]]
+    row_hashes = pd.util.hash_pandas_object(keyed, index=False).to_numpy()
+    dates = frame['accepted_date'].to_numpy()
+
+    folds = []
+    for window in windows.to_dict(orient='records'):
+        train = (dates >= np.datetime64(window['train_start'])) & (dates < np.datetime64(window['train_end']))
+        test = (dates >= np.datetime64(window['test_start'])) & (dates < np.datetime64(window['test_end']))
+        payload = json.dumps({'train': hashlib.sha256(row_hashes[train].tobytes()).hexdigest(),
+                              'test': hashlib.sha256(row_hashes[test].tobytes()).hexdigest(),
+                              'features': features, 'target': target,
+                              'window': {k: str(v) for k, v in window.items() if k != 'fold'}}, sort_keys=True)
+        fold_dir = os.path.join(cache_dir, hashlib.sha256(payload.encode()).hexdigest()[:16])
+
+        cached = os.path.exists(os.path.join(fold_dir, FOLD_MARKER))
+        start = time.perf_counter()
+        if not cached:
+            os.makedirs(fold_dir, exist_ok=True)
+            np.save(os.path.join(fold_dir, 'X_train.npy'), frame.loc[train, features].to_numpy(dtype=float))
+            np.save(os.path.join(fold_dir, 'y_train.npy'), frame.loc[train, target].to_numpy(dtype=int))
+            np.save(os.path.join(fold_dir, 'X_test.npy'), frame.loc[test, features].to_numpy(dtype=float))
+            # Written last, so its presence marks a complete fold
+            open(os.path.join(fold_dir, FOLD_MARKER), 'w').close()
+        folds.append({**window, 'fold_dir': fold_dir, 'cached': cached, 'test_rows': np.flatnonzero(test),
+                      'build_s': time.perf_counter() - start,
+                      'n_train': int(train.sum()), 'n_test': int(test.sum())})
+    return folds
+
+
+def _fit_fold(task):
+    """Grid-search one model on one fold's cached matrices and predict its test window."""
+    fold, model_name, param_grid, cv_splits = task
+    X_train, y_train, X_test = (np.load(os.path.join(fold['fold_dir'], f'{name}.npy'), mmap_mode='r')
+                                for name in ('X_train', 'y_train', 'X_test'))
+    test_rows = fold['test_rows']
+
+    result = {'fold': fold['fold'], 'model': model_name, 'fit_s': 0.0, 'predict_s': 0.0, 'best_params': None,
+              'test_rows': test_rows, 'signal': None, 'proba': None}
+    if len(test_rows) == 0 or len(np.unique(y_train)) < 2 or len(y_train) <= cv_splits:
+        return result
+
+    start = time.perf_counter()
+    search = GridSearchCV(make_model(model_name), param_grid, scoring=make_scorer(custom_recall_scorer),
+                          cv=TimeSeriesSplit(n_splits=cv_splits), n_jobs=1)
+    search.fit(X_train, y_train)
+    result['fit_s'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    result['signal'] = search.best_estimator_.predict(X_test)
+    result['proba'] = search.best_estimator_.predict_proba(X_test)[:, 1]
+    result['predict_s'] = time.perf_counter() - start
+    result['best_params'] = search.best_params_
+    return result
+
+
+def run_walk_forward(df, first_test_start, last_test_end=None, models=('random_forest', 'logistic_regression'),
+                     param_grids=None, features=FEATURES, target=TARGET, test_months=3, train_months=None,
+                     mode='expanding', cv_splits=3, n_jobs=1, cache_dir=None, backtest_params=None):
+    """
+    Walk-forward train-and-backtest: every fold of walk_forward_windows is fit for every
+    model (GridSearchCV with TimeSeriesSplit and the notebook's recall scorer), the test
+    predictions are stitched into one out-of-sample signal panel per model, and that panel
+    goes straight into simulate_trades_panel_enhanced.
+
+    Parameters:
+        df: final_df (or a sector subset of it) from preprocess().
+        models: Names from PARAM_GRIDS ('xgboost' needs the xgboost package).
+        param_grids: Optional overrides of PARAM_GRIDS by model name.
+        n_jobs: Worker processes; each holds one fold/model fit at a time and memory-maps
+            the fold matrices, so memory grows with n_jobs rather than with the number of folds.
+        cache_dir: Where fold matrices are kept between runs; None uses a temporary directory.
+        backtest_params: Overrides of BACKTEST_PARAMS.
+
+    Returns:
+        A tuple of:
+          - The out-of-sample signal panel: symbol_stock, accepted_date, Adj Close, ROE, target,
+            model, fold, predicted_signal and predicted_proba.
+          - Per fold and model: window, train/test sizes, matrix build, fit and predict times,
+            whether the matrices were cached, and the best parameters.
+          - The enhanced backtest ledger of each model's signals, with a model column.
+    """
+    param_grids = {**PARAM_GRIDS, **(param_grids or {})}
+    backtest_params = {**BACKTEST_PARAMS, **(backtest_params or {})}
+    frame = _model_frame(df, list(features), target)
+    windows = walk_forward_windows(frame['accepted_date'], first_test_start, last_test_end,
+                                   test_months=test_months, train_months=train_months, mode=mode)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        folds = build_fold_matrices(frame, windows, list(features), target, cache_dir or tmp_dir)
+        tasks = [(fold, name, param_grids[name], cv_splits) for fold in folds for name in models]
+        if n_jobs == 1:
+            results = list(map(_fit_fold, tasks))
+        else:
+            with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+                results = list(pool.map(_fit_fold, tasks))
+
+    fold_info = {fold['fold']: fold for fold in folds}
+    signal_parts, timing = [], []
+    for result in results:
+        fold = fold_info[result['fold']]
+        timing.append({
+            **{key: fold[key] for key in ('fold', 'train_start', 'train_end', 'test_start', 'test_end',
+                                          'n_train', 'n_test', 'cached', 'build_s')},
+            'model': result['model'], 'fit_s': result['fit_s'], 'predict_s': result['predict_s'],
+            'best_params': result['best_params'],
+        })
+        if result['signal'] is not None:
+            part = frame.iloc[result['test_rows']][_PANEL_COLUMNS + [target]].copy()
+            part['model'] = result['model']
+            part['fold'] = result['fold']
+            part['predicted_signal'] = result['signal']
+            part['predicted_proba'] = result['proba']
+            signal_parts.append(part)
+
+    signals = pd.concat(signal_parts, ignore_index=True) if signal_parts else pd.DataFrame(
+        columns=_PANEL_COLUMNS + [target, 'model', 'fold', 'predicted_signal', 'predicted_proba'])
+
+    ledgers = []
+    for name, panel in signals.groupby('model', sort=False):
+        trades = simulate_trades_panel_enhanced(panel, **backtest_params)
+        trades.insert(0, 'model', name)
+        ledgers.append(trades)
+    trades = pd.concat(ledgers, ignore_index=True) if ledgers else pd.DataFrame(columns=['model'])
+    return signals, pd.DataFrame(timing), trades